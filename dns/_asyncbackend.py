@@ -65,6 +65,25 @@ class StreamSocket(Socket):  # pragma: no cover
         raise NotImplementedError
 
 
+class TaskGroup:  # pragma: no cover
+    """A group of background tasks, which are cancelled when the group is
+    exited.  The group must be used as an asynchronous context manager.
+    """
+
+    def start_soon(self, function, *args):
+        """Run ``function(*args)`` in a new task of the group.
+
+        Returns a callable which cancels the task.
+        """
+        raise NotImplementedError
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        raise NotImplementedError
+
+
 class NullTransport:
     async def connect_tcp(self, host, port, timeout, local_address):
         raise NotImplementedError
@@ -98,3 +117,12 @@ class Backend:  # pragma: no cover
 
     async def wait_for(self, awaitable, timeout):
         raise NotImplementedError
+
+    def make_lock(self):
+        raise NotImplementedError
+
+    def make_event(self):
+        raise NotImplementedError
+
+    def task_group(self):
+        raise NotImplementedError
@@ -212,6 +212,23 @@ else:
     _HTTPTransport = dns._asyncbackend.NullTransport  # type: ignore
 
 
+class TaskGroup(dns._asyncbackend.TaskGroup):
+    def __init__(self):
+        self.tasks = set()
+
+    def start_soon(self, function, *args):
+        task = asyncio.create_task(function(*args))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task.cancel
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
 class Backend(dns._asyncbackend.Backend):
     def name(self):
         return "asyncio"
@@ -274,3 +291,12 @@ class Backend(dns._asyncbackend.Backend):
 
     async def wait_for(self, awaitable, timeout):
         return await _maybe_wait_for(awaitable, timeout)
+
+    def make_lock(self):
+        return asyncio.Lock()
+
+    def make_event(self):
+        return asyncio.Event()
+
+    def task_group(self):
+        return TaskGroup()
@@ -189,6 +189,32 @@ else:
     _HTTPTransport = dns._asyncbackend.NullTransport  # type: ignore
 
 
+class TaskGroup(dns._asyncbackend.TaskGroup):
+    def __init__(self):
+        self.manager = trio.open_nursery()
+        self.nursery = None
+
+    async def __aenter__(self):
+        self.nursery = await self.manager.__aenter__()
+        return self
+
+    def start_soon(self, function, *args):
+        assert self.nursery is not None
+        scope = trio.CancelScope()
+
+        async def run():
+            with scope:
+                await function(*args)
+
+        self.nursery.start_soon(run)
+        return scope.cancel
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        assert self.nursery is not None
+        self.nursery.cancel_scope.cancel()
+        return await self.manager.__aexit__(exc_type, exc_value, traceback)
+
+
 class Backend(dns._asyncbackend.Backend):
     def name(self):
         return "trio"
@@ -253,3 +279,12 @@ class Backend(dns._asyncbackend.Backend):
         raise dns.exception.Timeout(
             timeout=timeout
         )  # pragma: no cover  lgtm[py/unreachable-statement]
+
+    def make_lock(self):
+        return trio.Lock()
+
+    def make_event(self):
+        return trio.Event()
+
+    def task_group(self):
+        return TaskGroup()
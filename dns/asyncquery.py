@@ -24,9 +24,10 @@ import socket
 import struct
 import time
 import urllib.parse
-from typing import Any, Dict, Optional, Tuple, Union, cast
+from typing import Any, Dict, List, Optional, Tuple, Union, cast
 
 import dns.asyncbackend
+import dns.entropy
 import dns.exception
 import dns.inet
 import dns.message
@@ -41,14 +42,21 @@ import dns.xfr
 from dns._asyncbackend import NullContext
 from dns.query import (
     BadResponse,
+    HTTPCache,
+    HTTPCacheKey,
     HTTPVersion,
     NoDOH,
     NoDOQ,
+    TraceCallback,
+    TracePhase,
     UDPMode,
+    _cached_https_response,
     _check_status,
     _compute_times,
+    _header_value,
     _make_dot_ssl_context,
     _matches_destination,
+    _query_and_wire,
     _remaining,
     have_doh,
     ssl,
@@ -128,6 +136,7 @@ async def receive_udp(
     raise_on_truncation: bool = False,
     ignore_errors: bool = False,
     query: Optional[dns.message.Message] = None,
+    trace: Optional[TraceCallback] = None,
 ) -> Any:
     """Read a DNS message from a UDP socket.
 
@@ -148,6 +157,8 @@ async def receive_udp(
         ):
             continue
         received_time = time.time()
+        if trace:
+            trace(TracePhase.RECEIVED, time.perf_counter())
         try:
             r = dns.message.from_wire(
                 wire,
@@ -174,11 +185,13 @@ async def receive_udp(
                 raise
         if ignore_errors and query is not None and not query.is_response(r):
             continue
+        if trace:
+            trace(TracePhase.PARSED, time.perf_counter())
         return (r, received_time, from_address)
 
 
 async def udp(
-    q: dns.message.Message,
+    q: Union[dns.message.Message, dns.message.QueryTemplate],
     where: str,
     timeout: Optional[float] = None,
     port: int = 53,
@@ -191,6 +204,7 @@ async def udp(
     sock: Optional[dns.asyncbackend.DatagramSocket] = None,
     backend: Optional[dns.asyncbackend.Backend] = None,
     ignore_errors: bool = False,
+    trace: Optional[TraceCallback] = None,
 ) -> dns.message.Message:
     """Return the response obtained after sending a query via UDP.
 
@@ -205,7 +219,9 @@ async def udp(
     See :py:func:`dns.query.udp()` for the documentation of the other
     parameters, exceptions, and return type of this method.
     """
-    wire = q.to_wire()
+    if trace:
+        trace(TracePhase.START, time.perf_counter())
+    (q, wire) = _query_and_wire(q)
     (begin_time, expiration) = _compute_times(timeout)
     af = dns.inet.af_for_address(where)
     destination = _lltuple((where, port), af)
@@ -221,7 +237,11 @@ async def udp(
             dtuple = None
         cm = await backend.make_socket(af, socket.SOCK_DGRAM, 0, stuple, dtuple)
     async with cm as s:
+        if trace and not sock:
+            trace(TracePhase.SOCKET, time.perf_counter())
         await send_udp(s, wire, destination, expiration)  # pyright: ignore
+        if trace:
+            trace(TracePhase.SENT, time.perf_counter())
         (r, received_time, _) = await receive_udp(
             s,  # pyright: ignore
             destination,
@@ -234,6 +254,7 @@ async def udp(
             raise_on_truncation,
             ignore_errors,
             q,
+            trace,
         )
         r.time = received_time - begin_time
         # We don't need to check q.is_response() if we are in ignore_errors mode
@@ -244,7 +265,7 @@ async def udp(
 
 
 async def udp_with_fallback(
-    q: dns.message.Message,
+    q: Union[dns.message.Message, dns.message.QueryTemplate],
     where: str,
     timeout: Optional[float] = None,
     port: int = 53,
@@ -257,6 +278,8 @@ async def udp_with_fallback(
     tcp_sock: Optional[dns.asyncbackend.StreamSocket] = None,
     backend: Optional[dns.asyncbackend.Backend] = None,
     ignore_errors: bool = False,
+    capabilities: Optional["dns.nameserver.CapabilityCache"] = None,  # pyright: ignore
+    trace: Optional[TraceCallback] = None,
 ) -> Tuple[dns.message.Message, bool]:
     """Return the response to the query, trying UDP first and falling back
     to TCP if UDP results in a truncated response.
@@ -278,37 +301,48 @@ async def udp_with_fallback(
     of the other parameters, exceptions, and return type of this
     method.
     """
-    try:
-        response = await udp(
-            q,
-            where,
-            timeout,
-            port,
-            source,
-            source_port,
-            ignore_unexpected,
-            one_rr_per_rrset,
-            ignore_trailing,
-            True,
-            udp_sock,
-            backend,
-            ignore_errors,
-        )
-        return (response, False)
-    except dns.message.Truncated:
-        response = await tcp(
-            q,
-            where,
-            timeout,
-            port,
-            source,
-            source_port,
-            one_rr_per_rrset,
-            ignore_trailing,
-            tcp_sock,
-            backend,
-        )
-        return (response, True)
+    key = (where, port)
+    caps = None
+    if capabilities is not None:
+        caps = capabilities.get(key)
+    if caps is None or not caps.tcp_only:
+        try:
+            response = await udp(
+                q,
+                where,
+                timeout,
+                port,
+                source,
+                source_port,
+                ignore_unexpected,
+                one_rr_per_rrset,
+                ignore_trailing,
+                True,
+                udp_sock,
+                backend,
+                ignore_errors,
+                trace,
+            )
+            if capabilities is not None:
+                capabilities.note_udp_response(key, response.opt is not None)
+            return (response, False)
+        except dns.message.Truncated:
+            if capabilities is not None:
+                capabilities.note_truncation(key)
+    response = await tcp(
+        q,
+        where,
+        timeout,
+        port,
+        source,
+        source_port,
+        one_rr_per_rrset,
+        ignore_trailing,
+        tcp_sock,
+        backend,
+        trace,
+    )
+    return (response, True)
 
 
 async def send_tcp(
@@ -340,14 +374,16 @@ async def _read_exactly(sock, count, expiration):
     """Read the specified number of bytes from stream.  Keep trying until we
     either get the desired amount, or we hit EOF.
     """
-    s = b""
+    chunks = []
     while count > 0:
         n = await sock.recv(count, _timeout(expiration))
         if n == b"":
             raise EOFError("EOF")
         count = count - len(n)
-        s = s + n
-    return s
+        chunks.append(n)
+    if len(chunks) == 1:
+        return chunks[0]
+    return b"".join(chunks)
 
 
 async def receive_tcp(
@@ -357,6 +393,7 @@ async def receive_tcp(
     keyring: Optional[Dict[dns.name.Name, dns.tsig.Key]] = None,
     request_mac: Optional[bytes] = b"",
     ignore_trailing: bool = False,
+    trace: Optional[TraceCallback] = None,
 ) -> Tuple[dns.message.Message, float]:
     """Read a DNS message from a TCP socket.
 
@@ -367,9 +404,13 @@ async def receive_tcp(
     """
 
     ldata = await _read_exactly(sock, 2, expiration)
+    if trace:
+        trace(TracePhase.FIRST_BYTE, time.perf_counter())
     (l,) = struct.unpack("!H", ldata)
     wire = await _read_exactly(sock, l, expiration)
     received_time = time.time()
+    if trace:
+        trace(TracePhase.RECEIVED, time.perf_counter())
     r = dns.message.from_wire(
         wire,
         keyring=keyring,
@@ -377,11 +418,13 @@ async def receive_tcp(
         one_rr_per_rrset=one_rr_per_rrset,
         ignore_trailing=ignore_trailing,
     )
+    if trace:
+        trace(TracePhase.PARSED, time.perf_counter())
     return (r, received_time)
 
 
 async def tcp(
-    q: dns.message.Message,
+    q: Union[dns.message.Message, dns.message.QueryTemplate],
     where: str,
     timeout: Optional[float] = None,
     port: int = 53,
@@ -391,6 +434,7 @@ async def tcp(
     ignore_trailing: bool = False,
     sock: Optional[dns.asyncbackend.StreamSocket] = None,
     backend: Optional[dns.asyncbackend.Backend] = None,
+    trace: Optional[TraceCallback] = None,
 ) -> dns.message.Message:
     """Return the response obtained after sending a query via TCP.
 
@@ -406,7 +450,9 @@ async def tcp(
     parameters, exceptions, and return type of this method.
     """
 
-    wire = q.to_wire()
+    if trace:
+        trace(TracePhase.START, time.perf_counter())
+    (q, wire) = _query_and_wire(q)
     (begin_time, expiration) = _compute_times(timeout)
     if sock:
         # Verify that the socket is connected, as if it's not connected,
@@ -425,8 +471,12 @@ async def tcp(
         cm = await backend.make_socket(
             af, socket.SOCK_STREAM, 0, stuple, dtuple, timeout
         )
+        if trace:
+            trace(TracePhase.CONNECTED, time.perf_counter())
     async with cm as s:
         await send_tcp(s, wire, expiration)  # pyright: ignore
+        if trace:
+            trace(TracePhase.SENT, time.perf_counter())
         (r, received_time) = await receive_tcp(
             s,  # pyright: ignore
             expiration,
@@ -434,6 +484,7 @@ async def tcp(
             q.keyring,
             q.mac,
             ignore_trailing,
+            trace,
         )
         r.time = received_time - begin_time
         if not q.is_response(r):
@@ -442,7 +493,7 @@ async def tcp(
 
 
 async def tls(
-    q: dns.message.Message,
+    q: Union[dns.message.Message, dns.message.QueryTemplate],
     where: str,
     timeout: Optional[float] = None,
     port: int = 853,
@@ -455,6 +506,7 @@ async def tls(
     ssl_context: Optional[ssl.SSLContext] = None,
     server_hostname: Optional[str] = None,
     verify: Union[bool, str] = True,
+    trace: Optional[TraceCallback] = None,
 ) -> dns.message.Message:
     """Return the response obtained after sending a query via TLS.
 
@@ -471,6 +523,9 @@ async def tls(
     See :py:func:`dns.query.tls()` for the documentation of the other
     parameters, exceptions, and return type of this method.
     """
+    if trace:
+        trace(TracePhase.START, time.perf_counter())
+    (q, wire) = _query_and_wire(q)
     (begin_time, expiration) = _compute_times(timeout)
     if sock:
         cm: contextlib.AbstractAsyncContextManager = NullContext(sock)
@@ -494,9 +549,357 @@ async def tls(
             ssl_context,
             server_hostname,
         )
+        if trace:
+            trace(TracePhase.HANDSHAKE, time.perf_counter())
     async with cm as s:
-        timeout = _timeout(expiration)
-        response = await tcp(
+        await send_tcp(s, wire, expiration)  # pyright: ignore
+        if trace:
+            trace(TracePhase.SENT, time.perf_counter())
+        (r, received_time) = await receive_tcp(
+            s,  # pyright: ignore
+            expiration,
+            one_rr_per_rrset,
+            q.keyring,
+            q.mac,
+            ignore_trailing,
+            trace,
+        )
+        r.time = received_time - begin_time
+        if not q.is_response(r):
+            raise BadResponse
+        return r
+
+
+class _PendingResponse:
+    """A query sent on a pooled connection, awaiting its response."""
+
+    __slots__ = ["event", "wire", "received_time", "error"]
+
+    def __init__(self, event):
+        self.event = event
+        self.wire: Optional[bytes] = None
+        self.received_time = 0.0
+        self.error: Optional[Exception] = None
+
+
+class _PooledConnection:
+    """A TCP or TLS connection in a ``ConnectionPool``.
+
+    Queries are pipelined on the connection, and a reader task dispatches
+    each response to the query with the same ID.
+    """
+
+    def __init__(self, sock, pool):
+        self.sock = sock
+        self.pool = pool
+        self.send_lock = pool.backend.make_lock()
+        self.pending: Dict[int, _PendingResponse] = {}
+        self.closed = False
+        self.cancel: Optional[Any] = None
+
+    def in_flight(self) -> int:
+        return len(self.pending)
+
+    def register(self, id: int) -> _PendingResponse:
+        pending = _PendingResponse(self.pool.backend.make_event())
+        self.pending[id] = pending
+        return pending
+
+    async def reader(self) -> None:
+        error: Exception = EOFError("EOF")
+        try:
+            while True:
+                ldata = await _read_exactly(self.sock, 2, None)
+                (l,) = struct.unpack("!H", ldata)
+                wire = await _read_exactly(self.sock, l, None)
+                if len(wire) < 2:
+                    continue
+                # Responses to queries which have timed out are ignored.
+                pending = self.pending.pop(struct.unpack("!H", wire[:2])[0], None)
+                if pending is not None:
+                    pending.wire = wire
+                    pending.received_time = time.time()
+                    pending.event.set()
+        except Exception as e:
+            error = e
+            self.closed = True
+            # The connection has failed or been closed by the server.
+            with contextlib.suppress(Exception):
+                await self.sock.close()
+        finally:
+            self.closed = True
+            self._fail(error)
+
+    def _fail(self, error: Exception) -> None:
+        pending = self.pending
+        self.pending = {}
+        for p in pending.values():
+            p.error = error
+            p.event.set()
+
+    async def close(self) -> None:
+        if self.cancel is not None:
+            self.cancel()
+            self.cancel = None
+        self.closed = True
+        self._fail(EOFError("connection closed"))
+        await self.sock.close()
+
+
+class ConnectionPool:
+    """A pool of TCP and TLS connections for ``dns.asyncquery``.
+
+    Connections are made on demand, one set per server, and reused for later
+    queries.  Many queries may be in flight on a connection at once; a
+    background reader task receives the responses and sends each of them to the
+    waiting query with the same ID.  If the ID of a query is already in use on
+    the connection, the query is sent with a new ID, and the response is given
+    the query's ID back, so the query itself is not changed.
+
+    The pool uses the locks, events, and task groups of its backend, so it
+    works with both the asyncio and trio backends.  It must be used as an
+    asynchronous context manager, which closes all of the connections on
+    exit::
+
+        async with dns.asyncquery.ConnectionPool() as pool:
+            response = await pool.tls(q, "1.1.1.1", server_hostname="one.one.one.one")
+
+    If a connection is closed by the server or fails, the queries in flight on
+    it fail with the error, and a new connection is made for the next query.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[dns.asyncbackend.Backend] = None,
+        max_connections: int = 1,
+        max_in_flight: int = 100,
+        ssl_context: Optional[ssl.SSLContext] = None,
+        verify: Union[bool, str] = True,
+        poll_interval: float = 0.005,
+    ):
+        """*backend*, a ``dns.asyncbackend.Backend``, or ``None``.  If ``None``,
+        the default, then dnspython will use the default backend.
+
+        *max_connections*, an ``int``, the maximum number of connections to each
+        server.  The default is 1.
+
+        *max_in_flight*, an ``int``, the maximum number of queries in flight on
+        a connection.  When every connection to a server is at this limit, a new
+        connection is made if *max_connections* allows, and otherwise the query
+        waits.  The default is 100.
+
+        *ssl_context*, an ``ssl.SSLContext``, the context to use when making TLS
+        connections.  If ``None``, the default, a context is made for each
+        connection as ``dns.asyncquery.tls()`` would, using *verify*.
+
+        *verify*, a ``bool`` or ``str``, as for ``dns.asyncquery.tls()``.
+
+        *poll_interval*, a ``float``, the number of seconds between checks for a
+        free slot when a query must wait.
+        """
+        if max_connections < 1:
+            raise ValueError("max_connections must be at least 1")
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        if not backend:
+            backend = dns.asyncbackend.get_default_backend()
+        self.backend = backend
+        self.max_connections = max_connections
+        self.max_in_flight = max_in_flight
+        self.ssl_context = ssl_context
+        self.verify = verify
+        self.poll_interval = poll_interval
+        self._connections: Dict[Tuple, List[_PooledConnection]] = {}
+        self._connecting: Dict[Tuple, int] = {}
+        self._tasks: Optional[Any] = None
+
+    async def __aenter__(self):
+        self._tasks = await self.backend.task_group().__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        try:
+            await self.close()
+        finally:
+            tasks = self._tasks
+            self._tasks = None
+            if tasks is not None:
+                await tasks.__aexit__(exc_type, exc_val, exc_tb)
+        return False
+
+    async def close(self) -> None:
+        """Close all of the connections in the pool."""
+        connections = self._connections
+        self._connections = {}
+        for server_connections in connections.values():
+            for connection in server_connections:
+                await connection.close()
+
+    def connections(self) -> int:
+        """Return the number of open connections in the pool."""
+        return sum(
+            len([c for c in server_connections if not c.closed])
+            for server_connections in self._connections.values()
+        )
+
+    def _start_reader(self, connection: _PooledConnection) -> None:
+        assert self._tasks is not None
+        connection.cancel = self._tasks.start_soon(connection.reader)
+
+    async def _connection(self, key, expiration, tls):
+        (where, port, source, source_port, server_hostname) = key[1:]
+        while True:
+            connections = [c for c in self._connections.get(key, []) if not c.closed]
+            self._connections[key] = connections
+            best = min(connections, key=lambda c: c.in_flight(), default=None)
+            if best is not None and best.in_flight() < self.max_in_flight:
+                return best
+            connecting = self._connecting.get(key, 0)
+            if len(connections) + connecting < self.max_connections:
+                break
+            timeout = _timeout(expiration)
+            if timeout is not None and timeout <= 0:
+                raise dns.exception.Timeout
+            await self.backend.sleep(
+                self.poll_interval
+                if timeout is None
+                else min(self.poll_interval, timeout)
+            )
+        af = dns.inet.af_for_address(where)
+        stuple = _source_tuple(af, source, source_port)
+        ssl_context = None
+        if tls:
+            ssl_context = self.ssl_context
+            if ssl_context is None:
+                ssl_context = _make_dot_ssl_context(server_hostname, self.verify)
+        self._connecting[key] = connecting + 1
+        try:
+            sock = await self.backend.make_socket(
+                af,
+                socket.SOCK_STREAM,
+                0,
+                stuple,
+                (where, port),
+                _timeout(expiration),
+                ssl_context,
+                server_hostname,
+            )
+        finally:
+            self._connecting[key] -= 1
+        connection = _PooledConnection(sock, self)
+        self._start_reader(connection)
+        self._connections.setdefault(key, []).append(connection)
+        return connection
+
+    async def _query(
+        self,
+        tls: bool,
+        q: Union[dns.message.Message, dns.message.QueryTemplate],
+        where: str,
+        timeout: Optional[float],
+        port: int,
+        source: Optional[str],
+        source_port: int,
+        one_rr_per_rrset: bool,
+        ignore_trailing: bool,
+        server_hostname: Optional[str],
+    ) -> dns.message.Message:
+        if self._tasks is None:
+            raise RuntimeError("the pool must be used as an async context manager")
+        (begin_time, expiration) = _compute_times(timeout)
+        key = (tls, where, port, source, source_port, server_hostname)
+        connection = await self._connection(key, expiration, tls)
+        (q, wire) = _query_and_wire(q)
+        id = q.id
+        if id in connection.pending:
+            # The ID is in use, so the query is sent with a fresh one.  TSIG
+            # signatures cover the original ID rather than the one sent, so the
+            # ID can just be patched.
+            while id in connection.pending:
+                id = dns.entropy.random_16()
+            wire = id.to_bytes(2, "big") + wire[2:]
+        pending = connection.register(id)
+        try:
+            try:
+                async with connection.send_lock:
+                    await send_tcp(connection.sock, wire, expiration)
+            except Exception:
+                # A partial write leaves the stream unusable.
+                await connection.close()
+                raise
+            await self.backend.wait_for(pending.event.wait(), _timeout(expiration))
+        finally:
+            if connection.pending.get(id) is pending:
+                del connection.pending[id]
+        if pending.error is not None:
+            raise pending.error
+        assert pending.wire is not None
+        wire = pending.wire
+        if id != q.id:
+            wire = q.id.to_bytes(2, "big") + wire[2:]
+        r = dns.message.from_wire(
+            wire,
+            keyring=q.keyring,
+            request_mac=q.mac,
+            one_rr_per_rrset=one_rr_per_rrset,
+            ignore_trailing=ignore_trailing,
+        )
+        r.time = pending.received_time - begin_time
+        if not q.is_response(r):
+            raise BadResponse
+        return r
+
+    async def tcp(
+        self,
+        q: Union[dns.message.Message, dns.message.QueryTemplate],
+        where: str,
+        timeout: Optional[float] = None,
+        port: int = 53,
+        source: Optional[str] = None,
+        source_port: int = 0,
+        one_rr_per_rrset: bool = False,
+        ignore_trailing: bool = False,
+    ) -> dns.message.Message:
+        """Return the response obtained after sending a query via TCP on a
+        pooled connection.
+
+        See :py:func:`dns.asyncquery.tcp()` for the documentation of the
+        parameters, exceptions, and return type of this method.
+        """
+        return await self._query(
+            False,
+            q,
+            where,
+            timeout,
+            port,
+            source,
+            source_port,
+            one_rr_per_rrset,
+            ignore_trailing,
+            None,
+        )
+
+    async def tls(
+        self,
+        q: Union[dns.message.Message, dns.message.QueryTemplate],
+        where: str,
+        timeout: Optional[float] = None,
+        port: int = 853,
+        source: Optional[str] = None,
+        source_port: int = 0,
+        one_rr_per_rrset: bool = False,
+        ignore_trailing: bool = False,
+        server_hostname: Optional[str] = None,
+    ) -> dns.message.Message:
+        """Return the response obtained after sending a query via TLS on a
+        pooled connection.
+
+        See :py:func:`dns.asyncquery.tls()` for the documentation of the
+        parameters, exceptions, and return type of this method.  The SSL context
+        is taken from the pool.
+        """
+        return await self._query(
+            True,
             q,
             where,
             timeout,
@@ -505,12 +908,8 @@ async def tls(
             source_port,
             one_rr_per_rrset,
             ignore_trailing,
-            s,
-            backend,
+            server_hostname,
         )
-        end_time = time.time()
-        response.time = end_time - begin_time
-        return response
 
 
 def _maybe_get_resolver(
@@ -528,7 +927,7 @@ def _maybe_get_resolver(
 
 
 async def https(
-    q: dns.message.Message,
+    q: Union[dns.message.Message, dns.message.QueryTemplate],
     where: str,
     timeout: Optional[float] = None,
     port: int = 443,
@@ -544,6 +943,8 @@ async def https(
     resolver: Optional["dns.asyncresolver.Resolver"] = None,  # pyright: ignore
     family: int = socket.AF_UNSPEC,
     http_version: HTTPVersion = HTTPVersion.DEFAULT,
+    trace: Optional[TraceCallback] = None,
+    http_cache: Optional[HTTPCache] = None,
 ) -> dns.message.Message:
     """Return the response obtained after sending a query via DNS-over-HTTPS.
 
@@ -557,6 +958,8 @@ async def https(
     parameters, exceptions, and return type of this method.
     """
 
+    if trace:
+        trace(TracePhase.START, time.perf_counter())
     try:
         af = dns.inet.af_for_address(where)
     except ValueError:
@@ -581,9 +984,23 @@ async def https(
         if parsed.port is not None:
             port = parsed.port
 
-    if http_version == HTTPVersion.H3 or (
+    # DNS-over-HTTP3 queries use ID 0, so pick the transport first and render
+    # the query once for both the cache key and the request.
+    h3 = http_version == HTTPVersion.H3 or (
         http_version == HTTPVersion.DEFAULT and not have_doh
-    ):
+    )
+    (q, wire) = _query_and_wire(q, 0 if h3 else None)
+    cache_key = None
+    if http_cache is not None:
+        cache_key = http_cache.key(url, q, wire)
+        if cache_key is not None:
+            r = _cached_https_response(
+                http_cache, cache_key, q, one_rr_per_rrset, ignore_trailing
+            )
+            if r is not None:
+                return r
+
+    if h3:
         if bootstrap_address is None:
             resolver = _maybe_get_resolver(resolver)
             assert parsed.hostname is not None  # pyright: ignore
@@ -603,6 +1020,10 @@ async def https(
             ignore_trailing,
             verify=verify,
             post=post,
+            trace=trace,
+            http_cache=http_cache,
+            cache_key=cache_key,
+            wire=wire,
         )
 
     if not have_doh:
@@ -612,7 +1033,6 @@ async def https(
         raise ValueError("session parameter must be an httpx.AsyncClient")
     # pylint: enable=possibly-used-before-assignment
 
-    wire = q.to_wire()
     headers = {"accept": "application/dns-message"}
 
     h1 = http_version in (HTTPVersion.H1, HTTPVersion.DEFAULT)
@@ -677,6 +1097,8 @@ async def https(
                 timeout,
             )
 
+    if trace:
+        trace(TracePhase.RECEIVED, time.perf_counter())
     # see https://tools.ietf.org/html/rfc8484#section-4.2.1 for info about DoH
     # status codes
     if response.status_code < 200 or response.status_code > 299:
@@ -691,14 +1113,24 @@ async def https(
         one_rr_per_rrset=one_rr_per_rrset,
         ignore_trailing=ignore_trailing,
     )
+    if trace:
+        trace(TracePhase.PARSED, time.perf_counter())
     r.time = response.elapsed.total_seconds()
     if not q.is_response(r):
         raise BadResponse
+    if cache_key is not None:
+        assert http_cache is not None
+        http_cache.put(
+            cache_key,
+            response.content,
+            response.headers.get("cache-control"),
+            response.headers.get("age"),
+        )
     return r
 
 
 async def _http3(
-    q: dns.message.Message,
+    q: Union[dns.message.Message, dns.message.QueryTemplate],
     where: str,
     url: str,
     timeout: Optional[float] = None,
@@ -711,6 +1143,10 @@ async def _http3(
     backend: Optional[dns.asyncbackend.Backend] = None,
     hostname: Optional[str] = None,
     post: bool = True,
+    trace: Optional[TraceCallback] = None,
+    http_cache: Optional[HTTPCache] = None,
+    cache_key: Optional[HTTPCacheKey] = None,
+    wire: Optional[bytes] = None,
 ) -> dns.message.Message:
     if not dns.quic.have_quic:
         raise NoDOH("DNS-over-HTTP3 is not available.")  # pragma: no cover
@@ -720,8 +1156,8 @@ async def _http3(
     if url_parts.port is not None:
         port = url_parts.port
 
-    q.id = 0
-    wire = q.to_wire()
+    if wire is None:
+        (q, wire) = _query_and_wire(q, 0)
     (cfactory, mfactory) = dns.quic.factories_for_backend(backend)
 
     async with cfactory() as context:
@@ -731,11 +1167,18 @@ async def _http3(
             the_connection = the_manager.connect(where, port, source, source_port)
             (start, expiration) = _compute_times(timeout)
             stream = await the_connection.make_stream(timeout)
+            if trace:
+                trace(TracePhase.HANDSHAKE, time.perf_counter())
             async with stream:
                 # note that send_h3() does not need await
                 stream.send_h3(url, wire, post)
+                if trace:
+                    trace(TracePhase.SENT, time.perf_counter())
                 wire = await stream.receive(_remaining(expiration))
+                if trace:
+                    trace(TracePhase.RECEIVED, time.perf_counter())
                 _check_status(stream.headers(), where, wire)
+                headers = stream.headers()
             finish = time.time()
         r = dns.message.from_wire(
             wire,
@@ -744,14 +1187,24 @@ async def _http3(
             one_rr_per_rrset=one_rr_per_rrset,
             ignore_trailing=ignore_trailing,
         )
+        if trace:
+            trace(TracePhase.PARSED, time.perf_counter())
     r.time = max(finish - start, 0.0)
     if not q.is_response(r):
         raise BadResponse
+    if cache_key is not None:
+        assert http_cache is not None
+        http_cache.put(
+            cache_key,
+            wire,
+            _header_value(headers, b"cache-control"),
+            _header_value(headers, b"age"),
+        )
     return r
 
 
 async def quic(
-    q: dns.message.Message,
+    q: Union[dns.message.Message, dns.message.QueryTemplate],
     where: str,
     timeout: Optional[float] = None,
     port: int = 853,
@@ -764,6 +1217,7 @@ async def quic(
     backend: Optional[dns.asyncbackend.Backend] = None,
     hostname: Optional[str] = None,
     server_hostname: Optional[str] = None,
+    trace: Optional[TraceCallback] = None,
 ) -> dns.message.Message:
     """Return the response obtained after sending an asynchronous query via
     DNS-over-QUIC.
@@ -778,11 +1232,12 @@ async def quic(
     if not dns.quic.have_quic:
         raise NoDOQ("DNS-over-QUIC is not available.")  # pragma: no cover
 
+    if trace:
+        trace(TracePhase.START, time.perf_counter())
     if server_hostname is not None and hostname is None:
         hostname = server_hostname
 
-    q.id = 0
-    wire = q.to_wire()
+    (q, wire) = _query_and_wire(q, 0)
     the_connection: dns.quic.AsyncQuicConnection
     if connection:
         cfactory = dns.quic.null_factory
@@ -803,9 +1258,15 @@ async def quic(
                 )
             (start, expiration) = _compute_times(timeout)
             stream = await the_connection.make_stream(timeout)  # pyright: ignore
+            if trace:
+                trace(TracePhase.HANDSHAKE, time.perf_counter())
             async with stream:
                 await stream.send(wire, True)
+                if trace:
+                    trace(TracePhase.SENT, time.perf_counter())
                 wire = await stream.receive(_remaining(expiration))
+                if trace:
+                    trace(TracePhase.RECEIVED, time.perf_counter())
             finish = time.time()
         r = dns.message.from_wire(
             wire,
@@ -814,6 +1275,8 @@ async def quic(
             one_rr_per_rrset=one_rr_per_rrset,
             ignore_trailing=ignore_trailing,
         )
+        if trace:
+            trace(TracePhase.PARSED, time.perf_counter())
     r.time = max(finish - start, 0.0)
     if not q.is_response(r):
         raise BadResponse
@@ -90,9 +90,20 @@ class Resolver(dns.resolver.BaseResolver):
                 if backoff:
                     await backend.sleep(backoff)
                 timeout = self._compute_timeout(start, lifetime, resolution.errors)
+                limiter = self.rate_limiter
+                if limiter is not None:
+                    # Wait for the nameserver to have capacity for another query.
+                    (key, wait) = self._rate_limit_wait(nameserver, start, lifetime)
+                    waited = await limiter.async_acquire(key, backend, wait)
+                    if waited is None:
+                        raise dns.resolver.LifetimeTimeout(
+                            timeout=time.time() - start, errors=resolution.errors
+                        )
+                    timeout = min(timeout, wait - waited)
+                assert resolution.nameserver_request is not None
                 try:
                     response = await nameserver.async_query(
-                        request,
+                        resolution.nameserver_request,
                         timeout=timeout,
                         source=source,
                         source_port=source_port,
@@ -102,6 +113,9 @@ class Resolver(dns.resolver.BaseResolver):
                 except Exception as ex:
                     (_, done) = resolution.query_result(None, ex)
                     continue
+                finally:
+                    if limiter is not None:
+                        limiter.release(key)  # pyright: ignore
                 (answer, done) = resolution.query_result(response, None)
                 # Note we need to say "if answer is not None" and not just
                 # "if answer" because answer implements __len__, and python
@@ -17,26 +17,37 @@
 
 """DNS Messages"""
 
+import collections
+import concurrent.futures
 import contextlib
+import copy
 import enum
 import io
+import os
+import struct
 import time
-from typing import Any, Dict, List, Optional, Tuple, Union, cast
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union, cast
 
 import dns.edns
 import dns.entropy
 import dns.enum
 import dns.exception
 import dns.flags
+import dns.ipv4
+import dns.ipv6
 import dns.name
 import dns.opcode
 import dns.rcode
 import dns.rdata
 import dns.rdataclass
 import dns.rdatatype
+import dns.rdtypes.ANY.CNAME
+import dns.rdtypes.ANY.NS
 import dns.rdtypes.ANY.OPT
 import dns.rdtypes.ANY.SOA
 import dns.rdtypes.ANY.TSIG
+import dns.rdtypes.IN.A
+import dns.rdtypes.IN.AAAA
 import dns.renderer
 import dns.rrset
 import dns.tokenizer
@@ -151,7 +162,9 @@ class Message:
         else:
             self.id = id
         self.flags = 0
-        self.sections: List[List[dns.rrset.RRset]] = [[], [], [], []]
+        self._lazy_reader: Optional["_WireReader"] = None
+        self.index: IndexType = {}
+        self.sections = [[], [], [], []]
         self.opt: Optional[dns.rrset.RRset] = None
         self.request_payload = 0
         self.pad = 0
@@ -161,19 +174,61 @@ class Message:
         self.xfr = False
         self.origin: Optional[dns.name.Name] = None
         self.tsig_ctx: Optional[Any] = None
-        self.index: IndexType = {}
         self.errors: List[MessageError] = []
         self.time = 0.0
         self.wire: Optional[bytes] = None
+        self._wire_cache: Optional[Tuple[Any, bytes]] = None
+
+    @property
+    def sections(self) -> List[List[dns.rrset.RRset]]:
+        """The list of sections, each a list of ``dns.rrset.RRset``."""
+        if self._lazy_reader is not None:
+            self._lazy_reader.read_lazy_sections()
+        return self._sections
+
+    @sections.setter
+    def sections(self, v: List[List[dns.rrset.RRset]]) -> None:
+        self._lazy_reader = None
+        self._sections = v
+        if self.index is not None:
+            self.index = {}
+            for number in range(len(v)):
+                self._index_section(number)
+
+    def _index_section(self, number: int) -> None:
+        """Make the index entries for section *number* match its contents."""
+        index = {key: rrset for key, rrset in self.index.items() if key[0] != number}
+        for rrset in self._sections[number]:
+            key = (
+                number,
+                rrset.name,
+                rrset.rdclass,
+                rrset.rdtype,
+                rrset.covers,
+                rrset.deleting,
+            )
+            # Like an unindexed search, find the first matching RRset.
+            index.setdefault(key, rrset)
+        self.index = index
+
+    def _set_section(self, number: int, v: List[dns.rrset.RRset]) -> None:
+        """Replace section *number* with *v*, keeping the index consistent."""
+        if number != 0 and self._lazy_reader is not None:
+            # Make sure a lazy read doesn't overwrite the new section later.
+            self._lazy_reader.read_lazy_sections()
+        self._sections[number] = v
+        if self.index is not None:
+            self._index_section(number)
 
     @property
     def question(self) -> List[dns.rrset.RRset]:
         """The question section."""
-        return self.sections[0]
+        # The question section is never read lazily.
+        return self._sections[0]
 
     @question.setter
     def question(self, v):
-        self.sections[0] = v
+        self._set_section(0, v)
 
     @property
     def answer(self) -> List[dns.rrset.RRset]:
@@ -182,7 +237,7 @@ class Message:
 
     @answer.setter
     def answer(self, v):
-        self.sections[1] = v
+        self._set_section(1, v)
 
     @property
     def authority(self) -> List[dns.rrset.RRset]:
@@ -191,7 +246,7 @@ class Message:
 
     @authority.setter
     def authority(self, v):
-        self.sections[2] = v
+        self._set_section(2, v)
 
     @property
     def additional(self) -> List[dns.rrset.RRset]:
@@ -200,7 +255,16 @@ class Message:
 
     @additional.setter
     def additional(self, v):
-        self.sections[3] = v
+        self._set_section(3, v)
+
+    def __copy__(self):
+        # The lazy reader reads into the message it was made for, so read the
+        # deferred sections before the copy shares them.
+        if self._lazy_reader is not None:
+            self._lazy_reader.read_lazy_sections()
+        new = self.__class__.__new__(self.__class__)
+        new.__dict__.update(self.__dict__)
+        return new
 
     def __repr__(self):
         return "<DNS message, ID " + repr(self.id) + ">"
@@ -593,6 +657,15 @@ class Message:
         maximum length.  If the truncation occurs before the additional section,
         the TC bit will be set.
 
+        If the message is not signed with TSIG and is rendered more than once,
+        the wire format is cached, and later calls with the same arguments
+        return it, with the ID changed if the message's ID has changed, as long
+        as nothing else that would be rendered has changed.  Names and rdatas
+        are compared by identity, so replacing one with an equal one, e.g. a
+        name differing only in case, renders the message afresh.  RRsets are
+        shuffled each time they are rendered, so a message with an RRset of more
+        than one rdata is only cached if ``want_shuffle=False`` is passed.
+
         Raises ``dns.exception.TooBig`` if *max_size* was exceeded.
 
         Returns a ``bytes``.
@@ -609,6 +682,116 @@ class Message:
             max_size = 512
         elif max_size > 65535:
             max_size = 65535
+        if self.tsig is None:
+            # Only messages which are rendered more than once are fingerprinted,
+            # so a single call doesn't pay for it.
+            cached = self._wire_cache
+            fingerprint = None
+            wire = None
+            if cached is not None:
+                fingerprint = self._wire_fingerprint(
+                    origin, max_size, prefer_truncation, kw
+                )
+                if (
+                    fingerprint is not None
+                    and cached[0] is not None
+                    and cached[0][0] == fingerprint[0]
+                ):
+                    wire = cached[1]
+                    if int.from_bytes(wire[:2], "big") != self.id:
+                        wire = self.id.to_bytes(2, "big") + wire[2:]
+            if wire is None:
+                wire = self._render(origin, max_size, prefer_truncation, kw).get_wire()
+            self._wire_cache = (fingerprint, wire)
+            self.wire = wire
+            if prepend_length:
+                wire = len(wire).to_bytes(2, "big") + wire
+            return wire
+        self._wire_cache = None
+        r = self._render(origin, max_size, prefer_truncation, kw)
+        if self.tsig is not None:
+            (new_tsig, ctx) = dns.tsig.sign(
+                r.get_wire(),
+                self.keyring,
+                self.tsig[0],
+                int(time.time()),
+                self.request_mac,
+                tsig_ctx,
+                multi,
+            )
+            self.tsig.clear()
+            self.tsig.add(new_tsig)
+            r.add_rrset(dns.renderer.ADDITIONAL, self.tsig)
+            r.write_header()
+            if multi:
+                self.tsig_ctx = ctx
+        wire = r.get_wire()
+        self.wire = wire
+        if prepend_length:
+            wire = len(wire).to_bytes(2, "big") + wire
+        return wire
+
+    def _wire_fingerprint(
+        self,
+        origin: Optional[dns.name.Name],
+        max_size: int,
+        prefer_truncation: bool,
+        kw: Dict[str, Any],
+    ) -> Optional[Tuple[Any, List[Any]]]:
+        # Everything other than the ID and TSIG record which the wire format
+        # depends on.  The sections and RRsets are mutable, so their contents
+        # are included.  Names and rdatas are immutable, but compare without
+        # regard to case, so they are included by identity.  Returns the
+        # fingerprint and a list of the objects whose ids it contains, which
+        # must be kept so that the ids aren't reused, or None if the wire
+        # format can't be reused because RRsets are shuffled.
+        shuffle = kw.get("want_shuffle", True)
+        objects: List[Any] = [origin]
+        sections = []
+        for section in self.sections:
+            rrsets = []
+            for rrset in section:
+                if shuffle and len(rrset) > 1:
+                    return None
+                objects.append(rrset.name)
+                objects.extend(rrset)
+                rrsets.append(
+                    (
+                        id(rrset.name),
+                        rrset.rdclass,
+                        rrset.rdtype,
+                        rrset.covers,
+                        rrset.deleting,
+                        rrset.ttl,
+                        tuple(map(id, rrset)),
+                    )
+                )
+            sections.append(tuple(rrsets))
+        opt = self.opt
+        if opt is not None:
+            objects.extend(opt)
+            opt = (opt.rdclass, opt.ttl, tuple(map(id, opt)))
+        fingerprint = (
+            self.flags,
+            id(origin),
+            max_size,
+            prefer_truncation,
+            kw,
+            self.pad,
+            opt,
+            tuple(sections),
+        )
+        return (fingerprint, objects)
+
+    def _render(
+        self,
+        origin: Optional[dns.name.Name],
+        max_size: int,
+        prefer_truncation: bool,
+        kw: Dict[str, Any],
+    ) -> dns.renderer.Renderer:
+        # Render everything except the TSIG record, reserving space for it,
+        # and write the header.
         r = dns.renderer.Renderer(self.id, self.flags, max_size, origin)
         opt_reserve = self._compute_opt_reserve()
         r.reserve(opt_reserve)
@@ -633,27 +816,7 @@ class Message:
         if self.opt is not None:
             r.add_opt(self.opt, self.pad, opt_reserve, tsig_reserve)
         r.write_header()
-        if self.tsig is not None:
-            (new_tsig, ctx) = dns.tsig.sign(
-                r.get_wire(),
-                self.keyring,
-                self.tsig[0],
-                int(time.time()),
-                self.request_mac,
-                tsig_ctx,
-                multi,
-            )
-            self.tsig.clear()
-            self.tsig.add(new_tsig)
-            r.add_rrset(dns.renderer.ADDITIONAL, self.tsig)
-            r.write_header()
-            if multi:
-                self.tsig_ctx = ctx
-        wire = r.get_wire()
-        self.wire = wire
-        if prepend_length:
-            wire = len(wire).to_bytes(2, "big") + wire
-        return wire
+        return r
 
     @staticmethod
     def _make_tsig(
@@ -699,7 +862,9 @@ class Message:
         keyname when a ``dict`` keyring is used, unless they know the keyring
         contains only one key.  If a ``callable`` keyring is specified, the
         callable will be called with the message and the keyname, and is
-        expected to return a key.
+        expected to return a key.  A ``dns.tsig.GSSTSigAdapter`` is called with
+        ``None`` instead of the message, so signing a TKEY response doesn't step
+        the GSSAPI context.
 
         *keyname*, a ``dns.name.Name``, ``str`` or ``None``, the name of
         this TSIG key to use; defaults to ``None``.  If *keyring* is a
@@ -722,6 +887,10 @@ class Message:
         if isinstance(keyring, dns.tsig.Key):
             key = keyring
             keyname = key.name
+        elif isinstance(keyring, dns.tsig.GSSTSigAdapter):
+            # The adapter steps the GSSAPI context with a TKEY answer in the
+            # message it is given, which is only wanted for received messages.
+            key = keyring(None, keyname)
         elif callable(keyring):
             key = keyring(self, keyname)
         else:
@@ -1105,6 +1274,60 @@ def _message_factory_from_opcode(opcode):
         return Message
 
 
+def _make_common_rdata(cls, rdtype, field, value):
+    # Make an rdata of one of the common types without the validation done by
+    # its constructor, as the value has already been decoded from wire format.
+    rd = object.__new__(cls)
+    object.__setattr__(rd, "rdclass", dns.rdataclass.IN)
+    object.__setattr__(rd, "rdtype", rdtype)
+    object.__setattr__(rd, "rdcomment", None)
+    object.__setattr__(rd, field, value)
+    return rd
+
+
+def _a_from_wire(parser, rdlen, origin):
+    if rdlen != 4:
+        return None
+    address = dns.ipv4.inet_ntoa(parser.get_bytes(4))
+    return _make_common_rdata(dns.rdtypes.IN.A.A, dns.rdatatype.A, "address", address)
+
+
+def _aaaa_from_wire(parser, rdlen, origin):
+    if rdlen != 16:
+        return None
+    address = dns.ipv6.inet_ntoa(parser.get_bytes(16))
+    return _make_common_rdata(
+        dns.rdtypes.IN.AAAA.AAAA, dns.rdatatype.AAAA, "address", address
+    )
+
+
+def _target_from_wire(cls, rdtype):
+    def from_wire(parser, rdlen, origin):
+        start = parser.current
+        target = parser.get_name(origin)
+        if parser.current != start + rdlen:
+            parser.seek(start)
+            parser.furthest = start
+            return None
+        return _make_common_rdata(cls, rdtype, "target", target)
+
+    return from_wire
+
+
+# Decoders for the class IN types which make up most responses, which avoid the
+# generic rdata dispatch and constructor validation.  They take the parser, the
+# rdata length, and the origin, and return an instance of the usual class, or
+# None if the rdata is malformed, leaving the generic code to report the error.
+_common_rdata_from_wire = {
+    dns.rdatatype.A: _a_from_wire,
+    dns.rdatatype.AAAA: _aaaa_from_wire,
+    dns.rdatatype.CNAME: _target_from_wire(
+        dns.rdtypes.ANY.CNAME.CNAME, dns.rdatatype.CNAME
+    ),
+    dns.rdatatype.NS: _target_from_wire(dns.rdtypes.ANY.NS.NS, dns.rdatatype.NS),
+}
+
+
 class _WireReader:
     """Wire format reader.
 
@@ -1120,6 +1343,8 @@ class _WireReader:
     continue_on_error: try to extract as much information as possible from
     the message, accumulating MessageErrors in the *errors* attribute instead of
     raising them.
+    lazy: Defer reading the answer, authority, and additional sections until
+    they are first used?
     """
 
     def __init__(
@@ -1132,6 +1357,7 @@ class _WireReader:
         keyring=None,
         multi=False,
         continue_on_error=False,
+        lazy=False,
     ):
         self.parser = dns.wire.Parser(wire)
         self.message = None
@@ -1142,7 +1368,10 @@ class _WireReader:
         self.keyring = keyring
         self.multi = multi
         self.continue_on_error = continue_on_error
+        self.lazy = lazy
         self.errors = []
+        self.lazy_start = 0
+        self.counts = (0, 0, 0)
 
     def _get_question(self, section_number, qcount):
         """Read the next *qcount* records from the wire data and add them to
@@ -1202,13 +1431,22 @@ class _WireReader:
                     rd = None
                     covers = dns.rdatatype.NONE
                 else:
-                    with self.parser.restrict_to(rdlen):
-                        rd = dns.rdata.from_wire_parser(
-                            rdclass,  # pyright: ignore
-                            rdtype,
-                            self.parser,
-                            self.message.origin,
+                    rd = None
+                    if (
+                        rdclass == dns.rdataclass.IN
+                        and rdtype in _common_rdata_from_wire
+                    ):
+                        rd = _common_rdata_from_wire[rdtype](
+                            self.parser, rdlen, self.message.origin
                         )
+                    if rd is None:
+                        with self.parser.restrict_to(rdlen):
+                            rd = dns.rdata.from_wire_parser(
+                                rdclass,  # pyright: ignore
+                                rdtype,
+                                self.parser,
+                                self.message.origin,
+                            )
                     covers = rd.covers()
                 if self.message.xfr and rdtype == dns.rdatatype.SOA:
                     force_unique = True
@@ -1264,6 +1502,96 @@ class _WireReader:
                 else:
                     raise
 
+    def _jump(self, where):
+        """Move the parser to *where*, which is not inside a name."""
+        self.parser.seek(where)
+        # Name decompression returns to the furthest point read, so it must
+        # follow the jump.
+        self.parser.furthest = where
+
+    def _skip_name(self):
+        """Skip over a possibly compressed name without decoding it."""
+        parser = self.parser
+        wire = parser.wire
+        current = parser.current
+        while True:
+            if current >= parser.end:
+                raise dns.exception.FormError
+            count = wire[current]
+            if count == 0:
+                current += 1
+                break
+            elif count >= 192:
+                current += 2
+                break
+            elif count >= 64:
+                raise dns.name.BadLabelType
+            current += count + 1
+        self._jump(current)
+
+    def _skim_sections(self, counts):
+        """Walk over the records of the answer, authority, and additional
+        sections, checking their framing and reading the OPT record.
+
+        Returns ``False`` if the message has a TSIG record, in which case it must
+        be read eagerly, and ``True`` otherwise.
+        """
+        assert self.message is not None
+        sections = (
+            MessageSection.ANSWER,
+            MessageSection.AUTHORITY,
+            MessageSection.ADDITIONAL,
+        )
+        for section_number, count in zip(sections, counts):
+            for _ in range(count):
+                rr_start = self.parser.current
+                self._skip_name()
+                (rdtype, _, _, rdlen) = self.parser.get_struct("!HHIH")
+                if rdlen > self.parser.remaining():
+                    raise dns.exception.FormError
+                if rdtype == dns.rdatatype.TSIG:
+                    return False
+                if (
+                    rdtype == dns.rdatatype.OPT
+                    and section_number == MessageSection.ADDITIONAL
+                    and self.message.opt is None
+                ):
+                    # The OPT record is needed for the rcode and EDNS settings,
+                    # so it is read now.
+                    self._jump(rr_start)
+                    self._get_section(section_number, 1)
+                else:
+                    self._jump(self.parser.current + rdlen)
+        return True
+
+    def read_lazy_sections(self):
+        """Read the sections which were deferred by a lazy read."""
+        assert self.message is not None
+        message = self.message
+        opt = message.opt
+        question = message._sections[0]
+        message._lazy_reader = None
+        # The OPT record is read again along with the rest of the additional
+        # section.
+        message.opt = None
+        self._jump(self.lazy_start)
+        try:
+            self._get_section(MessageSection.ANSWER, self.counts[0])
+            self._get_section(MessageSection.AUTHORITY, self.counts[1])
+            self._get_section(MessageSection.ADDITIONAL, self.counts[2])
+        except Exception:
+            # Leave the message as it was, so the error is raised again on the
+            # next use of the sections.
+            message._sections = [question, [], [], []]
+            message.index = {
+                key: rrset
+                for key, rrset in message.index.items()
+                if key[0] == MessageSection.QUESTION
+            }
+            message.opt = opt
+            message._lazy_reader = self
+            raise
+
     def read(self):
         """Read a wire format DNS message and build a dns.message.Message
         object."""
@@ -1285,6 +1613,21 @@ class _WireReader:
             self._get_question(MessageSection.QUESTION, qcount)
             if self.question_only:
                 return self.message
+            if (
+                self.lazy
+                and not self.continue_on_error
+                and not self.multi
+                and self.message.tsig_ctx is None
+            ):
+                self.lazy_start = self.parser.current
+                self.counts = (ancount, aucount, adcount)
+                if self._skim_sections(self.counts):
+                    if not self.ignore_trailing and self.parser.remaining() != 0:
+                        raise TrailingJunk
+                    self.message._lazy_reader = self
+                    return self.message
+                self.message.opt = None
+                self._jump(self.lazy_start)
             self._get_section(MessageSection.ANSWER, ancount)
             self._get_section(MessageSection.AUTHORITY, aucount)
             self._get_section(MessageSection.ADDITIONAL, adcount)
@@ -1313,9 +1656,13 @@ def from_wire(
     ignore_trailing: bool = False,
     raise_on_truncation: bool = False,
     continue_on_error: bool = False,
+    lazy: bool = False,
 ) -> Message:
     """Convert a DNS wire format message into a message object.
 
+    *wire*, a ``bytes`` or other bytes-like object such as a ``bytearray`` or
+    ``memoryview``, the wire format message.
+
     *keyring*, a ``dns.tsig.Key``, ``dict``, ``bool``, or ``None``, the key or keyring
     to use if the message is signed.  If ``None`` or ``True``, then trying to decode
     a message with a TSIG will fail as it cannot be validated.  If ``False``, then
@@ -1354,6 +1701,15 @@ def from_wire(
     recommended only for DNS analysis tools, or for use in a server as part of an error
     handling path.  The default is ``False``.
 
+    *lazy*, a ``bool``.  If ``True``, only the header, the question section, and the
+    OPT record are decoded right away, and the answer, authority, and additional
+    sections are decoded when they are first used.  This saves time for callers
+    which only look at the rcode or at part of a large response.  The framing of all
+    records is still checked up front, but errors in the rdata are raised when the
+    sections are first used.  Messages with a TSIG record, and messages read with
+    *multi*, *tsig_ctx*, or *continue_on_error*, are always decoded right away.  The
+    default is ``False``.
+
     Raises ``dns.message.ShortHeader`` if the message is less than 12 octets long.
 
     Raises ``dns.message.TrailingJunk`` if there were octets in the message past the end
@@ -1375,6 +1731,12 @@ def from_wire(
     if request_mac is None:
         request_mac = b""
 
+    # A bytearray or memoryview could change after we return, so we make a
+    # single immutable copy, which the message also keeps.  The receive paths
+    # in dns.query pass bytes, so they are not copied.
+    if not isinstance(wire, bytes):
+        wire = bytes(wire)
+
     def initialize_message(message):
         message.request_mac = request_mac
         message.xfr = xfr
@@ -1390,6 +1752,7 @@ def from_wire(
         keyring,
         multi,
         continue_on_error,
+        lazy,
     )
     try:
         m = reader.read()
@@ -1412,6 +1775,197 @@ def from_wire(
     return m
 
 
+#: The type of the records yielded by ``dns.message.records_from_wire()``.
+WireRecord = Tuple[
+    MessageSection,
+    dns.name.Name,
+    int,
+    int,
+    int,
+    Union[None, dns.rdata.Rdata, memoryview],
+]
+
+
+def records_from_wire(
+    wire: bytes, raw_rdata: bool = False, ignore_trailing: bool = False
+) -> Iterator[WireRecord]:
+    """Generate the records of a DNS wire format message one at a time,
+    without building a ``dns.message.Message``.
+
+    This is much cheaper than ``dns.message.from_wire()`` when only the records
+    themselves are wanted, e.g. when scanning captured traffic, as no RRsets are
+    made and nothing is merged.
+
+    *wire*, a ``bytes`` or other bytes-like object, the wire format message.
+
+    *raw_rdata*, a ``bool``.  If ``True``, the rdata of each record is not decoded,
+    and is yielded as a ``memoryview`` of *wire* instead.  Note that names in the
+    rdata of older types, e.g. ``NS``, ``CNAME``, and ``MX``, may be compressed, in
+    which case they can only be decoded with the whole message, e.g. with
+    ``dns.rdata.from_wire()``.  The default is ``False``.
+
+    *ignore_trailing*, a ``bool``.  If ``True``, ignore trailing junk at end of the
+    message.
+
+    Yields ``(section, name, rdtype, rdclass, ttl, rdata)`` tuples, where *section*
+    is a ``dns.message.MessageSection``, *name* is a ``dns.name.Name``, and
+    *rdtype*, *rdclass*, and *ttl* are ``int`` values.  The records of the question
+    section have a TTL of 0 and an rdata of ``None``.  OPT and TSIG records are
+    yielded like any other record, so the class of an OPT record is its payload
+    size.
+
+    Raises ``dns.message.ShortHeader`` if the message is less than 12 octets long,
+    ``dns.exception.FormError`` if the message is malformed, and
+    ``dns.message.TrailingJunk`` if there were octets in the message past the end
+    of the records and *ignore_trailing* is ``False``.
+    """
+    # Unlike from_wire(), the wire is parsed in place rather than copied, as
+    # nothing keeps it once the records have been generated, other than any raw
+    # rdata, which are views of it.
+    if len(wire) < 12:
+        raise ShortHeader
+    parser = dns.wire.Parser(wire)
+    view = memoryview(parser.wire)
+    counts = struct.unpack_from("!4H", wire, 4)
+    parser.seek(12)
+    for _ in range(counts[0]):
+        name = parser.get_name()
+        (rdtype, rdclass) = parser.get_struct("!HH")
+        yield (MessageSection.QUESTION, name, rdtype, rdclass, 0, None)
+    for section_number in (
+        MessageSection.ANSWER,
+        MessageSection.AUTHORITY,
+        MessageSection.ADDITIONAL,
+    ):
+        for _ in range(counts[section_number]):
+            name = parser.get_name()
+            (rdtype, rdclass, ttl, rdlen) = parser.get_struct("!HHIH")
+            if rdlen > parser.remaining():
+                raise dns.exception.FormError
+            rdata: Union[dns.rdata.Rdata, memoryview]
+            if raw_rdata:
+                current = parser.current
+                rdata = view[current : current + rdlen]
+                parser.seek(current + rdlen)
+                parser.furthest = parser.current
+            else:
+                rd = None
+                if rdclass == dns.rdataclass.IN and rdtype in _common_rdata_from_wire:
+                    rd = _common_rdata_from_wire[rdtype](parser, rdlen, None)
+                if rd is None:
+                    with parser.restrict_to(rdlen):
+                        rd = dns.rdata.from_wire_parser(rdclass, rdtype, parser)
+                rdata = rd
+            yield (section_number, name, rdtype, rdclass, ttl, rdata)
+    if not ignore_trailing and parser.remaining() != 0:
+        raise TrailingJunk
+
+
+def _from_wire_chunk(
+    wires: List[bytes], records: bool, raw_rdata: bool, kwargs: Dict[str, Any]
+) -> List[Any]:
+    # Decode a chunk of messages for from_wire_batch().  This runs in a worker
+    # process, so everything returned must be picklable.
+    results: List[Any] = []
+    for wire in wires:
+        try:
+            if records:
+                result: Any = []
+                for record in records_from_wire(
+                    wire, raw_rdata, kwargs.get("ignore_trailing", False)
+                ):
+                    if raw_rdata and record[0] != MessageSection.QUESTION:
+                        # memoryviews cannot be pickled.
+                        record = record[:5] + (bytes(record[5]),)
+                    result.append(record)
+            else:
+                result = from_wire(wire, **kwargs)
+        except Exception as e:
+            result = e
+        results.append(result)
+    return results
+
+
+def from_wire_batch(
+    wires: Iterable[bytes],
+    records: bool = False,
+    raw_rdata: bool = False,
+    executor: Optional[concurrent.futures.Executor] = None,
+    processes: Optional[int] = None,
+    chunksize: int = 256,
+    **kwargs: Any,
+) -> Iterator[Union[Message, List[WireRecord], Exception]]:
+    """Decode many DNS wire format messages in parallel, using a pool of
+    processes.
+
+    The messages are sent to the worker processes in chunks, and the results are
+    generated in the same order as *wires*.  Only a few chunks are in flight at a
+    time, so *wires* may be a very large iterable, e.g. the messages read from a
+    capture file.
+
+    *wires*, an iterable of ``bytes``, the wire format messages.
+
+    *records*, a ``bool``.  If ``False``, the default, each message is decoded
+    with ``dns.message.from_wire()``.  If ``True``, each message is decoded into a
+    list of the tuples generated by ``dns.message.records_from_wire()``, which is
+    cheaper to decode and to send back from the worker processes.
+
+    *raw_rdata*, a ``bool``.  If ``True`` and *records* is ``True``, the rdata of
+    each record is not decoded, and is returned as ``bytes``.
+
+    *executor*, a ``concurrent.futures.Executor`` or ``None``.  The executor to
+    decode the chunks with.  If ``None``, the default, a
+    ``concurrent.futures.ProcessPoolExecutor`` is made for the batch and shut
+    down afterwards.
+
+    *processes*, an ``int`` or ``None``.  The number of worker processes to start
+    if *executor* is ``None``.  If ``None``, the number of processors is used.
+
+    *chunksize*, an ``int``, the number of messages to send to a worker at a time.
+    The default is 256.
+
+    Any other keyword arguments, e.g. *continue_on_error* or *ignore_trailing*,
+    are passed to ``dns.message.from_wire()``.  If *records* is ``True``, only
+    *ignore_trailing* is used.  The arguments must be picklable.  *lazy* may not
+    be ``True``, as lazily decoded messages can't be sent back from the worker
+    processes.
+
+    Generates, for each message, a ``dns.message.Message``, a list of records if
+    *records* is ``True``, or the exception raised while decoding the message.
+    With *continue_on_error*, errors in individual records are reported in the
+    message's ``errors`` attribute as usual.
+    """
+    if chunksize < 1:
+        raise ValueError("chunksize must be at least 1")
+    if kwargs.get("lazy"):
+        raise ValueError("lazy decoding is not supported")
+    if executor is None:
+        with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+            yield from from_wire_batch(
+                wires, records, raw_rdata, pool, processes, chunksize, **kwargs
+            )
+        return
+    # Keep enough chunks in flight to keep the workers busy.
+    in_flight = 2 * (processes or os.cpu_count() or 1)
+    pending: collections.deque = collections.deque()
+    chunk: List[bytes] = []
+    for wire in wires:
+        chunk.append(bytes(wire))
+        if len(chunk) == chunksize:
+            pending.append(
+                executor.submit(_from_wire_chunk, chunk, records, raw_rdata, kwargs)
+            )
+            chunk = []
+            while len(pending) >= in_flight:
+                yield from pending.popleft().result()
+    if chunk:
+        pending.append(
+            executor.submit(_from_wire_chunk, chunk, records, raw_rdata, kwargs)
+        )
+    while pending:
+        yield from pending.popleft().result()
+
+
 class _TextReader:
     """Text format reader.
 
@@ -1841,6 +2395,129 @@ def make_query(
     return m
 
 
+class QueryTemplate:
+    """A query which is rendered to wire format once, and then sent many times.
+
+    Each use of the template makes a copy of the rendered query with a new ID
+    patched into it, which is much cheaper than making a new query with
+    ``dns.message.make_query()`` and rendering it.  If the query is signed with
+    TSIG, the TSIG record is computed afresh for each use, as it covers the ID
+    and the time.
+
+    Templates may be passed to the query functions in ``dns.query`` and
+    ``dns.asyncquery`` wherever a query message is expected.
+    """
+
+    def __init__(self, query: QueryMessage) -> None:
+        """*query*, a ``dns.message.QueryMessage``, the query.  It should not
+        be modified after the template is made.
+        """
+        self.query = query
+        # The ID will be patched, and the TSIG record appended, when the
+        # template is instantiated.
+        r = query._render(query.origin, 65535, False, {})
+        self.wire = r.get_wire()
+
+    @property
+    def question(self) -> List[dns.rrset.RRset]:
+        """The question section of the query."""
+        return self.query.question
+
+    def with_options(self, options: List[dns.edns.Option]) -> "QueryTemplate":
+        """Return a template of the query with the EDNS options *options*
+        added, replacing any existing options of the same types.  This template
+        is not modified.
+
+        Unless the query is padded, the options are spliced into the rendered
+        query, which is much cheaper than making a new template.
+
+        Raises ``ValueError`` if the query does not use EDNS.
+        """
+        query = self.query
+        if query.opt is None:
+            raise ValueError("the query does not use EDNS")
+        message = _query_with_options(query, options)
+        if message.pad:
+            # The padding depends on the size of everything else.
+            return QueryTemplate(message)
+        assert message.opt is not None
+        # The OPT record is the last record rendered, so its rdata ends the wire.
+        old_rdata = query.opt[0].to_wire()
+        new_rdata = message.opt[0].to_wire()
+        assert old_rdata is not None and new_rdata is not None
+        end = len(self.wire) - len(old_rdata) - 2
+        template = copy.copy(self)
+        template.query = message
+        template.wire = self.wire[:end] + len(new_rdata).to_bytes(2, "big") + new_rdata
+        return template
+
+    def instantiate(self, id: Optional[int] = None) -> Tuple[QueryMessage, bytes]:
+        """Make a query from the template.
+
+        *id*, an ``int`` or ``None``, the query ID.  If ``None``, the default, a
+        random ID is used.
+
+        Returns a ``(dns.message.QueryMessage, bytes)`` tuple of the query,
+        which can be used to check and validate a response, and its wire format.
+        """
+        if id is None:
+            id = dns.entropy.random_16()
+        query = self.query
+        wire = id.to_bytes(2, "big") + self.wire[2:]
+        message = QueryMessage(id=id)
+        message.flags = query.flags
+        message.sections = [list(section) for section in query.sections]
+        message.opt = query.opt
+        message.request_payload = query.request_payload
+        message.pad = query.pad
+        if query.tsig is not None:
+            (tsig, _) = dns.tsig.sign(
+                wire,
+                query.keyring,
+                query.tsig[0].replace(original_id=id),
+                int(time.time()),
+            )
+            message.keyring = query.keyring
+            message.tsig = dns.rrset.from_rdata(query.tsig.name, 0, tsig)
+            output = io.BytesIO()
+            output.write(wire)
+            message.tsig.to_wire(output)
+            (adcount,) = struct.unpack_from("!H", wire, 10)
+            output.seek(10)
+            output.write(struct.pack("!H", adcount + 1))
+            wire = output.getvalue()
+        message.wire = wire
+        return (message, wire)
+
+
+def _query_with_options(
+    query: QueryMessage, options: List[dns.edns.Option]
+) -> QueryMessage:
+    # Return a copy of *query*, which uses EDNS, with the EDNS options
+    # *options* added, replacing any existing options of the same types.
+    assert query.opt is not None
+    otypes = {option.otype for option in options}
+    message = QueryMessage(id=query.id)
+    message.flags = query.flags
+    message.sections = [list(section) for section in query.sections]
+    message.origin = query.origin
+    message.use_edns(
+        query.edns,
+        query.ednsflags,
+        query.payload,
+        query.request_payload,
+        [option for option in query.options if option.otype not in otypes]
+        + list(options),
+        query.pad,
+    )
+    if query.tsig is not None:
+        # Signing changes the TSIG RRset, so it isn't shared.
+        message.keyring = query.keyring
+        message.tsig = dns.rrset.from_rdata(query.tsig.name, 0, query.tsig[0])
+        message.request_mac = query.request_mac
+    return message
+
+
 class CopyMode(enum.Enum):
     """
     How should sections be copied when making an update response?
@@ -1940,6 +2617,75 @@ def make_response(
     return response
 
 
+def _question_wire(query: Message) -> Optional[Tuple[dns.name.Name, bytes]]:
+    # Return the name and wire format of the query's question if it can be
+    # copied from the query's wire format, i.e. there is one question, it is
+    # uncompressed, and it is what the query was read from or rendered to.
+    wire = query.wire
+    if wire is None or len(query.question) != 1:
+        return None
+    rrset = query.question[0]
+    qname = rrset.name
+    if query.origin is not None:
+        qname = qname.derelativize(query.origin)
+    pos = 12
+    for label in qname.labels:
+        end = pos + len(label) + 1
+        if wire[pos : pos + 1] != bytes((len(label),)) or wire[pos + 1 : end] != label:
+            return None
+        pos = end
+    end = pos + 4
+    if wire[pos:end] != struct.pack("!HH", rrset.rdtype, rrset.rdclass):
+        return None
+    return (qname, wire[12:end])
+
+
+def make_response_renderer(
+    query: Message, recursion_available: bool = False, max_size: int = 65535
+) -> dns.renderer.Renderer:
+    """Make a renderer for a response to the specified query, which is the fast
+    way for a server to respond.
+
+    The renderer has the response's header flags set as ``make_response()``
+    sets them, and the query's question added.  If the query was read from wire
+    format, the question is copied from it instead of being rendered again, and
+    compression of names in the response uses it.  The caller adds the other
+    sections, any EDNS and TSIG records, and writes the header.  For example::
+
+        q = dns.message.from_wire(wire)
+        r = dns.message.make_response_renderer(q)
+        r.add_rrsets(dns.renderer.ANSWER, answer_rrsets)
+        if q.edns >= 0:
+            r.add_edns(0, 0, 1232)
+        r.write_header()
+        response_wire = r.get_wire()
+
+    *query*, a ``dns.message.Message``, the query to respond to.
+
+    *recursion_available*, a ``bool``, should RA be set in the response?
+
+    *max_size*, an ``int``, the maximum size of the response.  The default is
+    65535.
+
+    Returns a ``dns.renderer.Renderer``.
+    """
+
+    if query.flags & dns.flags.QR:
+        raise dns.exception.FormError("specified query message is not a query")
+    flags = dns.flags.QR | (query.flags & dns.flags.RD)
+    if recursion_available:
+        flags |= dns.flags.RA
+    flags |= dns.opcode.to_flags(query.opcode())
+    r = dns.renderer.Renderer(query.id, flags, max_size, query.origin)
+    question = _question_wire(query)
+    if question is not None:
+        r.add_question_wire(*question)
+    else:
+        for rrset in query.question:
+            r.add_question(rrset.name, rrset.rdtype, rrset.rdclass)
+    return r
+
+
 ### BEGIN generated MessageSection constants
 
 QUESTION = MessageSection.QUESTION
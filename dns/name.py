@@ -18,11 +18,13 @@
 """DNS Names.
 """
 
+import collections
 import copy
 import encodings.idna  # type: ignore
 import functools
 import struct
-from typing import Any, Callable, Dict, Iterable, Optional, Tuple, Union
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 import dns._features
 import dns.enum
@@ -43,7 +45,21 @@ else:  # pragma: no cover
     have_idna_2008 = False
 
 
-CompressType = Dict["Name", int]
+#: A compression table, mapping the lowercased labels of the names written so
+#: far, and of their suffixes, to their offsets.  Before dnspython 2.8 the keys
+#: were names; tables with name keys are still accepted, and are converted.
+CompressType = Dict[Tuple[bytes, ...], int]
+
+
+def _convert_compress(compress: Dict[Any, int]) -> None:
+    # Convert the name keys of a compression table made for an older version
+    # to tuples of lowercased labels, keeping the order of the entries.
+    items = list(compress.items())
+    compress.clear()
+    for key, pos in items:
+        if isinstance(key, Name):
+            key = key._canonical_labels()
+        compress.setdefault(key, pos)
 
 
 class NameRelation(dns.enum.IntEnum):
@@ -370,7 +386,8 @@ class Name:
     of the class are immutable.
     """
 
-    __slots__ = ["labels"]
+    # _hash and _canonical are computed when first needed and are not pickled.
+    __slots__ = ["labels", "_hash", "_canonical"]
 
     def __init__(self, labels: Iterable[Union[bytes, str]]):
         """*labels* is any iterable whose values are ``str`` or ``bytes``."""
@@ -412,15 +429,27 @@ class Name:
     def __hash__(self) -> int:
         """Return a case-insensitive hash of the name.
 
+        The hash is computed the first time it is needed and remembered.
+
         Returns an ``int``.
         """
 
-        h = 0
-        for label in self.labels:
-            for c in label.lower():
-                h += (h << 3) + c
+        h = getattr(self, "_hash", None)
+        if h is not None:
+            return h
+        h = hash(self._canonical_labels())
+        object.__setattr__(self, "_hash", h)
         return h
 
+    def _canonical_labels(self) -> Tuple[bytes, ...]:
+        # The labels in DNSSEC canonical form, i.e. lowercased.
+        canonical = getattr(self, "_canonical", None)
+        if canonical is not None:
+            return canonical
+        canonical = tuple(map(bytes.lower, self.labels))
+        object.__setattr__(self, "_canonical", canonical)
+        return canonical
+
     def fullcompare(self, other: "Name") -> Tuple[NameRelation, int, int]:
         """Compare two names, returning a 3-tuple
         ``(relation, order, nlabels)``.
@@ -460,8 +489,10 @@ class Name:
                 return (NameRelation.NONE, 1, 0)
             else:
                 return (NameRelation.NONE, -1, 0)
-        l1 = len(self.labels)
-        l2 = len(other.labels)
+        slabels = self._canonical_labels()
+        olabels = other._canonical_labels()
+        l1 = len(slabels)
+        l2 = len(olabels)
         ldiff = l1 - l2
         if ldiff < 0:
             l = l1
@@ -475,8 +506,8 @@ class Name:
             l -= 1
             l1 -= 1
             l2 -= 1
-            label1 = self.labels[l1].lower()
-            label2 = other.labels[l2].lower()
+            label1 = slabels[l1]
+            label2 = olabels[l2]
             if label1 < label2:
                 order = -1
                 if nlabels > 0:
@@ -530,17 +561,17 @@ class Name:
         DNSSEC canonical form.
         """
 
-        return Name([x.lower() for x in self.labels])
+        return Name(self._canonical_labels())
 
     def __eq__(self, other):
         if isinstance(other, Name):
-            return self.fullcompare(other)[1] == 0
+            return self._canonical_labels() == other._canonical_labels()
         else:
             return False
 
     def __ne__(self, other):
         if isinstance(other, Name):
-            return self.fullcompare(other)[1] != 0
+            return self._canonical_labels() != other._canonical_labels()
         else:
             return True
 
@@ -661,11 +692,13 @@ class Name:
         io.BytesIO file).  If ``None`` (the default), a ``bytes``
         containing the wire name will be returned.
 
-        *compress*, a ``dict``, is the compression table to use.  If
-        ``None`` (the default), names will not be compressed.  Note that
+        *compress*, a ``dns.name.CompressType``, is the compression table to use.
+        If ``None`` (the default), names will not be compressed.  Note that
         the compression code assumes that compression offset 0 is the
         start of *file*, and thus compression will not be correct
-        if this is not the case.
+        if this is not the case.  The table is keyed by tuples of lowercased
+        labels.  If it is keyed by ``dns.name.Name`` objects, as it was before
+        dnspython 2.8, the keys are converted in place.
 
         *origin* is a ``dns.name.Name`` or ``None``.  If the name is
         relative and origin is not ``None``, then *origin* will be appended
@@ -700,39 +733,36 @@ class Name:
                         out += label
             return bytes(out)
 
-        labels: Iterable[bytes]
+        labels = self.labels
+        keys = self._canonical_labels()
         if not self.is_absolute():
             if origin is None or not origin.is_absolute():
                 raise NeedAbsoluteNameOrOrigin
-            labels = list(self.labels)
-            labels.extend(list(origin.labels))
-        else:
-            labels = self.labels
-        i = 0
-        for label in labels:
-            n = Name(labels[i:])
-            i += 1
-            if compress is not None:
-                pos = compress.get(n)
-            else:
-                pos = None
+            labels += origin.labels
+            keys += origin._canonical_labels()
+        if canonicalize:
+            labels = keys
+        if compress is None:
+            file.write(b"".join(bytes((len(label),)) + label for label in labels))
+            return None
+        # The compression table is keyed by the lowercased labels of each suffix,
+        # so that finding a suffix does not need a Name.
+        if compress and isinstance(next(iter(compress)), Name):
+            _convert_compress(compress)
+        last = len(labels) - 1
+        for i, label in enumerate(labels):
+            if i == last:
+                file.write(b"\x00")
+                break
+            key = keys[i:]
+            pos = compress.get(key)
             if pos is not None:
-                value = 0xC000 + pos
-                s = struct.pack("!H", value)
-                file.write(s)
+                file.write(struct.pack("!H", 0xC000 + pos))
                 break
-            else:
-                if compress is not None and len(n) > 1:
-                    pos = file.tell()
-                    if pos <= 0x3FFF:
-                        compress[n] = pos
-                l = len(label)
-                file.write(struct.pack("!B", l))
-                if l > 0:
-                    if canonicalize:
-                        file.write(label.lower())
-                    else:
-                        file.write(label)
+            pos = file.tell()
+            if pos <= 0x3FFF:
+                compress[key] = pos
+            file.write(bytes((len(label),)) + label)
         return None
 
     def __len__(self) -> int:
@@ -899,6 +929,119 @@ root = Name([b""])
 empty = Name([])
 
 
+class TextCache:
+    """Thread-safe, bounded, least-recently-used cache of the names made by
+    ``dns.name.from_text()`` and ``dns.name.from_unicode()``, keyed by the text,
+    origin, and IDNA codec.
+
+    Applications which convert the same names from text over and over, e.g. by
+    passing them as strings to the resolver, can save the work by giving the
+    cache used by those functions, ``dns.name.text_cache``, a maximum size.  It
+    is disabled, with a maximum size of 0, by default.
+    """
+
+    def __init__(self, max_size: int = 0) -> None:
+        """*max_size*, an ``int``, is the maximum number of names to cache.  If
+        0, nothing is cached.
+        """
+
+        self.lock = threading.Lock()
+        self.data: "collections.OrderedDict[Any, Name]" = collections.OrderedDict()
+        self.max_size = 0
+        self._hits = 0
+        self._misses = 0
+        self.set_max_size(max_size)
+
+    def set_max_size(self, max_size: int) -> None:
+        """Set the maximum number of names to cache, discarding the least
+        recently used names if there are more.  If *max_size* is 0, nothing is
+        cached.
+        """
+
+        if max_size < 0:
+            raise ValueError("max_size must be non-negative")
+        with self.lock:
+            self.max_size = max_size
+            while len(self.data) > max_size:
+                self.data.popitem(last=False)
+
+    def get(self, key: Any) -> Optional[Name]:
+        """Get the name cached for *key*, or ``None`` if there isn't one."""
+
+        with self.lock:
+            name = self.data.get(key)
+            if name is None:
+                self._misses += 1
+            else:
+                self.data.move_to_end(key)
+                self._hits += 1
+            return name
+
+    def put(self, key: Any, name: Name) -> None:
+        """Cache *name* for *key*."""
+
+        with self.lock:
+            if self.max_size == 0:
+                return
+            self.data[key] = name
+            self.data.move_to_end(key)
+            if len(self.data) > self.max_size:
+                self.data.popitem(last=False)
+
+    def flush(self) -> None:
+        """Flush the cache."""
+
+        with self.lock:
+            self.data.clear()
+
+    def hits(self) -> int:
+        """How many hits has the cache had?"""
+        with self.lock:
+            return self._hits
+
+    def misses(self) -> int:
+        """How many misses has the cache had?"""
+        with self.lock:
+            return self._misses
+
+    def reset_statistics(self) -> None:
+        """Reset all statistics to zero."""
+        with self.lock:
+            self._hits = 0
+            self._misses = 0
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.data)
+
+
+#: The cache used by ``dns.name.from_text()`` and ``dns.name.from_unicode()``.
+text_cache = TextCache()
+
+
+def _convert_cached(
+    convert: Callable[[Any, Optional[Name], Optional[IDNACodec]], Name],
+    text: Any,
+    origin: Optional[Name],
+    idna_codec: Optional[IDNACodec],
+) -> Name:
+    # Convert text to a name with *convert*, using the text cache if enabled.
+    if text_cache.max_size == 0 or not (origin is None or isinstance(origin, Name)):
+        return convert(text, origin, idna_codec)
+    # Names compare without regard to case, so the origin's labels are used,
+    # as the result has the origin's case.
+    key = (convert, text, origin if origin is None else origin.labels, idna_codec)
+    try:
+        name = text_cache.get(key)
+    except TypeError:
+        # An unhashable argument, which the conversion will reject.
+        return convert(text, origin, idna_codec)
+    if name is None:
+        name = convert(text, origin, idna_codec)
+        text_cache.put(key, name)
+    return name
+
+
 def from_unicode(
     text: str, origin: Optional[Name] = root, idna_codec: Optional[IDNACodec] = None
 ) -> Name:
@@ -916,9 +1059,18 @@ def from_unicode(
     encoder/decoder.  If ``None``, the default IDNA 2003 encoder/decoder
     is used.
 
+    If ``dns.name.text_cache`` has been given a maximum size, the name may be
+    returned from it.
+
     Returns a ``dns.name.Name``.
     """
 
+    return _convert_cached(_from_unicode, text, origin, idna_codec)
+
+
+def _from_unicode(
+    text: str, origin: Optional[Name], idna_codec: Optional[IDNACodec]
+) -> Name:
     if not isinstance(text, str):
         raise ValueError("input to from_unicode() must be a unicode string")
     if not (origin is None or isinstance(origin, Name)):
@@ -999,13 +1151,22 @@ def from_text(
     encoder/decoder.  If ``None``, the default IDNA 2003 encoder/decoder
     is used.
 
+    If ``dns.name.text_cache`` has been given a maximum size, the name may be
+    returned from it.
+
     Returns a ``dns.name.Name``.
     """
 
+    return _convert_cached(_from_text, text, origin, idna_codec)
+
+
+def _from_text(
+    text: Union[bytes, str], origin: Optional[Name], idna_codec: Optional[IDNACodec]
+) -> Name:
     if isinstance(text, str):
         if not is_all_ascii(text):
             # Some codepoint in the input text is > 127, so IDNA applies.
-            return from_unicode(text, origin, idna_codec)
+            return _from_unicode(text, origin, idna_codec)
         # The input is all ASCII, so treat this like an ordinary non-IDNA
         # domain name.  Note that "all ASCII" is about the input text,
         # not the codepoints in the domain name.  E.g. if text has value
@@ -1086,8 +1247,12 @@ def from_wire_parser(parser: "dns.wire.Parser") -> Name:
     Returns a ``dns.name.Name``
     """
 
-    labels = []
+    labels: List[bytes] = []
+    # The offsets at which we started decoding, and the number of labels we had
+    # at the time, so we can remember the names found there.
+    starts = [(parser.current, 0)]
     biggest_pointer = parser.current
+    names = parser.names
     with parser.restore_furthest():
         count = parser.get_uint8()
         while count != 0:
@@ -1098,12 +1263,28 @@ def from_wire_parser(parser: "dns.wire.Parser") -> Name:
                 if current >= biggest_pointer:
                     raise BadPointer
                 biggest_pointer = current
+                known = names.get(current)
+                if known is not None:
+                    if not labels:
+                        name = known
+                        break
+                    labels.extend(known.labels)
+                    name = Name(labels)
+                    break
+                starts.append((current, len(labels)))
                 parser.seek(current)
             else:
                 raise BadLabelType
             count = parser.get_uint8()
-        labels.append(b"")
-    return Name(labels)
+        else:
+            labels.append(b"")
+            name = Name(labels)
+    for offset, index in starts:
+        if index == 0:
+            names[offset] = name
+        else:
+            names[offset] = Name(labels[index:])
+    return name
 
 
 def from_wire(message: bytes, current: int) -> Tuple[Name, int]:
@@ -1,11 +1,425 @@
-from typing import Optional, Union
+import hashlib
+import math
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple, Union, cast
 from urllib.parse import urlparse
 
 import dns.asyncbackend
 import dns.asyncquery
+import dns.edns
 import dns.inet
 import dns.message
 import dns.query
+import dns.rcode
+
+CapabilityKey = Tuple[str, int]
+
+
+class Capabilities:
+    """What has been learned about the EDNS and transport support of a
+    nameserver.
+
+    *edns* is ``True`` if the server has answered with an OPT record,
+    ``False`` if it has rejected EDNS, and ``None`` if nothing is known yet.
+
+    *payload*, an ``int`` or ``None``, is the largest EDNS UDP payload size
+    that should be advertised to the server.  ``None`` means no limit has
+    been learned.
+
+    *truncations*, an ``int``, is the number of consecutive truncated UDP
+    responses received from the server.
+
+    *tcp_only*, a ``bool``, is ``True`` if the server truncates so
+    consistently that queries should go straight to TCP.
+
+    *expiration*, a ``float``, is the time after which this information is
+    forgotten.
+    """
+
+    def __init__(self, expiration: float) -> None:
+        self.edns: Optional[bool] = None
+        self.payload: Optional[int] = None
+        self.truncations = 0
+        self.tcp_only = False
+        self.expiration = expiration
+
+
+class CapabilityCache:
+    """Simple thread-safe cache of nameserver capabilities.
+
+    The cache is keyed by an ``(address, port)`` tuple.  Each entry is
+    forgotten *ttl* seconds after it was made, or after the server was last
+    found to need a downgrade (no EDNS, a smaller payload, or TCP only), so
+    that a server which is fixed (or replaced) is probed again even while it
+    is in use.
+    """
+
+    def __init__(self, ttl: float = 300.0, truncation_limit: int = 3) -> None:
+        """*ttl*, a ``float``, is the number of seconds learned capabilities
+        are remembered.
+
+        *truncation_limit*, an ``int``, is the number of consecutive truncated
+        UDP responses after which the server is only queried over TCP.
+        """
+        self.lock = threading.Lock()
+        self.data: Dict[CapabilityKey, Capabilities] = {}
+        self.ttl = ttl
+        self.truncation_limit = truncation_limit
+
+    def _entry(self, key: CapabilityKey) -> Capabilities:
+        # Return the entry for *key*, creating it if needed.  Routine updates
+        # don't extend its lifetime.  The caller must hold the lock.
+        now = time.time()
+        caps = self.data.get(key)
+        if caps is None or caps.expiration <= now:
+            caps = Capabilities(now + self.ttl)
+            self.data[key] = caps
+        return caps
+
+    def get(self, key: CapabilityKey) -> Optional[Capabilities]:
+        """Get the capabilities associated with *key*.
+
+        Returns a ``dns.nameserver.Capabilities`` object, or ``None`` if
+        nothing is known about the server.
+        """
+        with self.lock:
+            caps = self.data.get(key)
+            if caps is not None and caps.expiration <= time.time():
+                del self.data[key]
+                caps = None
+            return caps
+
+    def note_truncation(self, key: CapabilityKey) -> None:
+        """Record that the server sent a truncated UDP response."""
+        with self.lock:
+            caps = self._entry(key)
+            caps.truncations += 1
+            if caps.truncations >= self.truncation_limit and not caps.tcp_only:
+                caps.tcp_only = True
+                caps.expiration = time.time() + self.ttl
+
+    def note_udp_response(self, key: CapabilityKey, edns: bool) -> None:
+        """Record that the server sent a complete UDP response.
+
+        *edns*, a ``bool``, is ``True`` if the response had an OPT record.
+        """
+        with self.lock:
+            caps = self.data.get(key)
+            if caps is None and not edns:
+                # Nothing worth remembering.
+                return
+            caps = self._entry(key)
+            caps.truncations = 0
+            if edns:
+                caps.edns = True
+
+    def note_no_edns(self, key: CapabilityKey) -> None:
+        """Record that the server rejected a query with EDNS."""
+        with self.lock:
+            caps = self._entry(key)
+            if caps.edns is not False:
+                caps.edns = False
+                caps.expiration = time.time() + self.ttl
+
+    def note_timeout(self, key: CapabilityKey, payload: int) -> None:
+        """Record that a UDP query advertising *payload* timed out.
+
+        If the payload is bigger than ``dns.message.DEFAULT_EDNS_PAYLOAD``
+        then fragmented responses may be getting lost, so the advertised
+        payload is reduced to the default.
+        """
+        if payload <= dns.message.DEFAULT_EDNS_PAYLOAD:
+            return
+        with self.lock:
+            caps = self._entry(key)
+            if caps.payload is None:
+                caps.payload = dns.message.DEFAULT_EDNS_PAYLOAD
+                caps.expiration = time.time() + self.ttl
+
+    def flush(self, key: Optional[CapabilityKey] = None) -> None:
+        """Flush the cache.
+
+        If *key* is not ``None``, only that server is flushed.  Otherwise
+        the entire cache is flushed.
+        """
+        with self.lock:
+            if key is not None:
+                self.data.pop(key, None)
+            else:
+                self.data = {}
+
+
+class CookieJar:
+    """Thread-safe store of DNS cookies (RFC 7873).
+
+    The jar makes a client cookie for each server, keyed by an
+    ``(address, port)`` tuple, from a secret, and remembers the server
+    cookie each server last returned so that it can be sent with later
+    queries.  A server which sees its cookie come back can then tell that
+    the query is not spoofed, and answer it over UDP even when it is rate
+    limiting or under attack.
+
+    Cookies are only sent in queries which use EDNS.
+    """
+
+    def __init__(self, secret: Optional[bytes] = None, ttl: float = 3600.0) -> None:
+        """*secret*, a ``bytes`` or ``None``, the secret from which client
+        cookies are made.  If ``None``, the default, a random secret is
+        generated.
+
+        *ttl*, a ``float``, the number of seconds a server cookie is remembered
+        after it was last received.
+        """
+        if secret is None:
+            secret = os.urandom(16)
+        self.lock = threading.Lock()
+        self.secret = secret
+        self.ttl = ttl
+        self.data: Dict[CapabilityKey, Tuple[bytes, float]] = {}
+
+    def client_cookie(self, key: CapabilityKey) -> bytes:
+        """Return the 8 byte client cookie for the server *key*."""
+        (address, port) = key
+        return hashlib.blake2b(
+            f"{address}|{port}".encode(), key=self.secret[:64], digest_size=8
+        ).digest()
+
+    def server_cookie(self, key: CapabilityKey) -> bytes:
+        """Return the server cookie last received from the server *key*, or
+        an empty ``bytes`` if there is none.
+        """
+        with self.lock:
+            value = self.data.get(key)
+            if value is None:
+                return b""
+            (cookie, expiration) = value
+            if expiration <= time.time():
+                del self.data[key]
+                return b""
+            return cookie
+
+    def attach(
+        self,
+        key: CapabilityKey,
+        request: Union[dns.message.QueryMessage, dns.message.QueryTemplate],
+    ) -> Optional[Union[dns.message.QueryMessage, dns.message.QueryTemplate]]:
+        """Return a copy of *request*, a query message or template for the
+        server *key*, with its COOKIE option set, replacing any existing COOKIE
+        option.  *request* is not modified.
+
+        A template is copied with ``dns.message.QueryTemplate.with_options()``,
+        so it keeps the benefit of having been rendered already.
+
+        Returns ``None`` if *request* does not use EDNS.
+        """
+        if isinstance(request, dns.message.QueryTemplate):
+            query = request.query
+        else:
+            query = request
+        if query.edns < 0:
+            return None
+        cookie = dns.edns.CookieOption(self.client_cookie(key), self.server_cookie(key))
+        if isinstance(request, dns.message.QueryTemplate):
+            return request.with_options([cookie])
+        return dns.message._query_with_options(request, [cookie])
+
+    def note_response(self, key: CapabilityKey, response: dns.message.Message) -> bool:
+        """Process the COOKIE option of *response*, a response from the server
+        *key* to a query with a cookie, remembering its server cookie.
+
+        Returns ``False`` if the response has a client cookie which is not the
+        one sent, in which case it should be discarded, and ``True`` otherwise.
+        """
+        for option in response.get_options(dns.edns.OptionType.COOKIE):
+            cookie = cast(dns.edns.CookieOption, option)
+            if cookie.client != self.client_cookie(key):
+                return False
+            if cookie.server:
+                with self.lock:
+                    self.data[key] = (cookie.server, time.time() + self.ttl)
+        return True
+
+    def flush(self, key: Optional[CapabilityKey] = None) -> None:
+        """Forget server cookies.
+
+        If *key* is not ``None``, only the cookie of that server is forgotten.
+        Otherwise all of them are.
+        """
+        with self.lock:
+            if key is not None:
+                self.data.pop(key, None)
+            else:
+                self.data = {}
+
+
+class _Bucket:
+    # The rate limiting state of one nameserver.
+    __slots__ = ["tokens", "updated", "in_flight"]
+
+    def __init__(self, tokens: float, updated: float) -> None:
+        self.tokens = tokens
+        self.updated = updated
+        self.in_flight = 0
+
+
+class RateLimiter:
+    """Thread-safe per-nameserver query rate limiter and concurrency governor.
+
+    Each nameserver, identified by an ``(address, port)`` tuple, gets a token
+    bucket which refills at *rate* queries per second up to *burst* tokens, and
+    may have at most *max_in_flight* queries outstanding.  A query which would
+    exceed either limit waits for capacity instead of failing.
+
+    The limiter also keeps statistics about how long queries were held back:
+    *acquired* is the number of queries let through, *delayed* the number of
+    those which had to wait, and *queue_time* and *max_queue_time* are the
+    total and the longest time, in seconds, spent waiting.
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        burst: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        poll_interval: float = 0.005,
+    ) -> None:
+        """*rate*, a ``float`` or ``None``, the number of queries per second
+        each nameserver may be sent.  If ``None``, the rate is not limited.
+
+        *burst*, an ``int`` or ``None``, the number of queries which may be
+        sent at once after a quiet period.  If ``None``, it is *rate* rounded
+        up, and at least 1.
+
+        *max_in_flight*, an ``int`` or ``None``, the maximum number of
+        outstanding queries to each nameserver.  If ``None``, the number is not
+        limited.
+
+        *poll_interval*, a ``float``, the number of seconds an asynchronous
+        query waiting for an outstanding query to finish sleeps before checking
+        again.
+        """
+        if rate is not None and rate <= 0:
+            raise ValueError("rate must be positive")
+        if max_in_flight is not None and max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        if burst is None:
+            burst = max(math.ceil(rate), 1) if rate is not None else 1
+        elif burst < 1:
+            raise ValueError("burst must be at least 1")
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.poll_interval = poll_interval
+        self.condition = threading.Condition()
+        self.buckets: Dict[CapabilityKey, _Bucket] = {}
+        self.acquired = 0
+        self.delayed = 0
+        self.queue_time = 0.0
+        self.max_queue_time = 0.0
+
+    def _try_acquire(self, key: CapabilityKey) -> Optional[float]:
+        # Try to take a slot for *key*.  Returns 0.0 if the slot was taken,
+        # the number of seconds until a token is available if the rate limit
+        # was hit, or None if there are too many queries in flight.  The
+        # caller must hold the lock.
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = _Bucket(self.burst, now)
+            self.buckets[key] = bucket
+        if self.max_in_flight is not None and bucket.in_flight >= self.max_in_flight:
+            return None
+        if self.rate is not None:
+            bucket.tokens = min(
+                bucket.tokens + (now - bucket.updated) * self.rate, self.burst
+            )
+            bucket.updated = now
+            if bucket.tokens < 1.0:
+                return (1.0 - bucket.tokens) / self.rate
+            bucket.tokens -= 1.0
+        bucket.in_flight += 1
+        return 0.0
+
+    def _note_acquired(self, waited: float) -> None:
+        # The caller must hold the lock.
+        self.acquired += 1
+        if waited > 0:
+            self.delayed += 1
+            self.queue_time += waited
+            self.max_queue_time = max(self.max_queue_time, waited)
+
+    def acquire(
+        self, key: CapabilityKey, timeout: Optional[float] = None
+    ) -> Optional[float]:
+        """Wait until a query may be sent to the nameserver *key*, and take a
+        slot for it.  The slot must be given back with ``release()`` when the
+        query is done.
+
+        *timeout*, a ``float`` or ``None``, the maximum number of seconds to
+        wait.  If ``None``, wait forever.
+
+        Returns the number of seconds spent waiting, or ``None`` if no slot
+        became available within *timeout* seconds.
+        """
+        start = time.monotonic()
+        waited = 0.0
+        with self.condition:
+            while True:
+                delay = self._try_acquire(key)
+                if delay == 0.0:
+                    self._note_acquired(waited)
+                    return waited
+                if timeout is not None:
+                    if waited >= timeout:
+                        return None
+                    if delay is None or delay > timeout - waited:
+                        delay = timeout - waited
+                self.condition.wait(delay)
+                waited = time.monotonic() - start
+
+    async def async_acquire(
+        self,
+        key: CapabilityKey,
+        backend: dns.asyncbackend.Backend,
+        timeout: Optional[float] = None,
+    ) -> Optional[float]:
+        """Wait until a query may be sent to the nameserver *key*, and take a
+        slot for it, using *backend* to sleep.
+
+        See ``acquire()`` for the meaning of *timeout* and the return value.
+        """
+        start = time.monotonic()
+        waited = 0.0
+        while True:
+            with self.condition:
+                delay = self._try_acquire(key)
+                if delay == 0.0:
+                    self._note_acquired(waited)
+                    return waited
+            if delay is None:
+                delay = self.poll_interval
+            if timeout is not None:
+                if waited >= timeout:
+                    return None
+                delay = min(delay, timeout - waited)
+            await backend.sleep(delay)
+            waited = time.monotonic() - start
+
+    def release(self, key: CapabilityKey) -> None:
+        """Give back the slot taken for a query to the nameserver *key*."""
+        with self.condition:
+            bucket = self.buckets.get(key)
+            if bucket is not None and bucket.in_flight > 0:
+                bucket.in_flight -= 1
+                self.condition.notify_all()
+
+    def in_flight(self, key: CapabilityKey) -> int:
+        """Return the number of outstanding queries to the nameserver *key*."""
+        with self.condition:
+            bucket = self.buckets.get(key)
+            return bucket.in_flight if bucket is not None else 0
 
 
 class Nameserver:
@@ -29,19 +443,20 @@ class Nameserver:
 
     def query(
         self,
-        request: dns.message.QueryMessage,
+        request: Union[dns.message.QueryMessage, dns.message.QueryTemplate],
         timeout: float,
         source: Optional[str],
         source_port: int,
         max_size: bool,
         one_rr_per_rrset: bool = False,
         ignore_trailing: bool = False,
+        trace: Optional[dns.query.TraceCallback] = None,
     ) -> dns.message.Message:
         raise NotImplementedError
 
     async def async_query(
         self,
-        request: dns.message.QueryMessage,
+        request: Union[dns.message.QueryMessage, dns.message.QueryTemplate],
         timeout: float,
         source: Optional[str],
         source_port: int,
@@ -49,6 +464,7 @@ class Nameserver:
         backend: dns.asyncbackend.Backend,
         one_rr_per_rrset: bool = False,
         ignore_trailing: bool = False,
+        trace: Optional[dns.query.TraceCallback] = None,
     ) -> dns.message.Message:
         raise NotImplementedError
 
@@ -77,21 +493,34 @@ class AddressAndPortNameserver(Nameserver):
 
 
 class Do53Nameserver(AddressAndPortNameserver):
-    def __init__(self, address: str, port: int = 53):
+    def __init__(
+        self, address: str, port: int = 53, cookies: Optional[CookieJar] = None
+    ):
+        """*address*, a ``str``, the address of the server.
+
+        *port*, an ``int``, the port of the server.  The default is 53.
+
+        *cookies*, a ``dns.nameserver.CookieJar`` or ``None``.  If not ``None``,
+        queries which use EDNS are sent with a DNS cookie from the jar, the
+        server cookie in the response is remembered, and a query answered with
+        ``BADCOOKIE`` is sent again once with the new server cookie.
+        """
         super().__init__(address, port)
+        self.cookies = cookies
 
     def kind(self):
         return "Do53"
 
-    def query(
+    def _query(
         self,
-        request: dns.message.QueryMessage,
+        request: Union[dns.message.QueryMessage, dns.message.QueryTemplate],
         timeout: float,
         source: Optional[str],
         source_port: int,
         max_size: bool,
         one_rr_per_rrset: bool = False,
         ignore_trailing: bool = False,
+        trace: Optional[dns.query.TraceCallback] = None,
     ) -> dns.message.Message:
         if max_size:
             response = dns.query.tcp(
@@ -103,6 +532,7 @@ class Do53Nameserver(AddressAndPortNameserver):
                 source_port=source_port,
                 one_rr_per_rrset=one_rr_per_rrset,
                 ignore_trailing=ignore_trailing,
+                trace=trace,
             )
         else:
             response = dns.query.udp(
@@ -115,14 +545,15 @@ class Do53Nameserver(AddressAndPortNameserver):
                 raise_on_truncation=True,
                 one_rr_per_rrset=one_rr_per_rrset,
                 ignore_trailing=ignore_trailing,
+                trace=trace,
                 ignore_errors=True,
                 ignore_unexpected=True,
             )
         return response
 
-    async def async_query(
+    async def _async_query(
         self,
-        request: dns.message.QueryMessage,
+        request: Union[dns.message.QueryMessage, dns.message.QueryTemplate],
         timeout: float,
         source: Optional[str],
         source_port: int,
@@ -130,6 +561,7 @@ class Do53Nameserver(AddressAndPortNameserver):
         backend: dns.asyncbackend.Backend,
         one_rr_per_rrset: bool = False,
         ignore_trailing: bool = False,
+        trace: Optional[dns.query.TraceCallback] = None,
     ) -> dns.message.Message:
         if max_size:
             response = await dns.asyncquery.tcp(
@@ -142,6 +574,7 @@ class Do53Nameserver(AddressAndPortNameserver):
                 backend=backend,
                 one_rr_per_rrset=one_rr_per_rrset,
                 ignore_trailing=ignore_trailing,
+                trace=trace,
             )
         else:
             response = await dns.asyncquery.udp(
@@ -155,11 +588,110 @@ class Do53Nameserver(AddressAndPortNameserver):
                 backend=backend,
                 one_rr_per_rrset=one_rr_per_rrset,
                 ignore_trailing=ignore_trailing,
+                trace=trace,
                 ignore_errors=True,
                 ignore_unexpected=True,
             )
         return response
 
+    def _with_cookie(
+        self, request: Union[dns.message.QueryMessage, dns.message.QueryTemplate]
+    ) -> Optional[Union[dns.message.QueryMessage, dns.message.QueryTemplate]]:
+        # Return a copy of the request with our cookie, or None if cookies are
+        # not in use.
+        if self.cookies is None:
+            return None
+        return self.cookies.attach((self.address, self.port), request)
+
+    def _retry_for_cookie(self, response: dns.message.Message) -> bool:
+        # Process the cookie in the response, returning True if the query
+        # should be sent again with the server cookie just learned.
+        assert self.cookies is not None
+        if not self.cookies.note_response((self.address, self.port), response):
+            raise dns.query.BadResponse
+        return response.rcode() == dns.rcode.BADCOOKIE
+
+    def query(
+        self,
+        request: Union[dns.message.QueryMessage, dns.message.QueryTemplate],
+        timeout: float,
+        source: Optional[str],
+        source_port: int,
+        max_size: bool,
+        one_rr_per_rrset: bool = False,
+        ignore_trailing: bool = False,
+        trace: Optional[dns.query.TraceCallback] = None,
+    ) -> dns.message.Message:
+        cookie_request = self._with_cookie(request)
+        expiration = time.time() + timeout
+        response = self._query(
+            request if cookie_request is None else cookie_request,
+            timeout,
+            source,
+            source_port,
+            max_size,
+            one_rr_per_rrset,
+            ignore_trailing,
+            trace,
+        )
+        if cookie_request is not None and self._retry_for_cookie(response):
+            cookie_request = self._with_cookie(request)
+            assert cookie_request is not None
+            response = self._query(
+                cookie_request,
+                dns.query._remaining(expiration),
+                source,
+                source_port,
+                max_size,
+                one_rr_per_rrset,
+                ignore_trailing,
+                trace,
+            )
+            self._retry_for_cookie(response)
+        return response
+
+    async def async_query(
+        self,
+        request: Union[dns.message.QueryMessage, dns.message.QueryTemplate],
+        timeout: float,
+        source: Optional[str],
+        source_port: int,
+        max_size: bool,
+        backend: dns.asyncbackend.Backend,
+        one_rr_per_rrset: bool = False,
+        ignore_trailing: bool = False,
+        trace: Optional[dns.query.TraceCallback] = None,
+    ) -> dns.message.Message:
+        cookie_request = self._with_cookie(request)
+        expiration = time.time() + timeout
+        response = await self._async_query(
+            request if cookie_request is None else cookie_request,
+            timeout,
+            source,
+            source_port,
+            max_size,
+            backend,
+            one_rr_per_rrset,
+            ignore_trailing,
+            trace,
+        )
+        if cookie_request is not None and self._retry_for_cookie(response):
+            cookie_request = self._with_cookie(request)
+            assert cookie_request is not None
+            response = await self._async_query(
+                cookie_request,
+                dns.query._remaining(expiration),
+                source,
+                source_port,
+                max_size,
+                backend,
+                one_rr_per_rrset,
+                ignore_trailing,
+                trace,
+            )
+            self._retry_for_cookie(response)
+        return response
+
 
 class DoHNameserver(Nameserver):
     def __init__(
@@ -169,6 +701,7 @@ class DoHNameserver(Nameserver):
         verify: Union[bool, str] = True,
         want_get: bool = False,
         http_version: dns.query.HTTPVersion = dns.query.HTTPVersion.DEFAULT,
+        http_cache: Optional[dns.query.HTTPCache] = None,
     ):
         super().__init__()
         self.url = url
@@ -176,6 +709,7 @@ class DoHNameserver(Nameserver):
         self.verify = verify
         self.want_get = want_get
         self.http_version = http_version
+        self.http_cache = http_cache
 
     def kind(self):
         return "DoH"
@@ -197,13 +731,14 @@ class DoHNameserver(Nameserver):
 
     def query(
         self,
-        request: dns.message.QueryMessage,
+        request: Union[dns.message.QueryMessage, dns.message.QueryTemplate],
         timeout: float,
         source: Optional[str],
         source_port: int,
         max_size: bool = False,
         one_rr_per_rrset: bool = False,
         ignore_trailing: bool = False,
+        trace: Optional[dns.query.TraceCallback] = None,
     ) -> dns.message.Message:
         return dns.query.https(
             request,
@@ -214,14 +749,16 @@ class DoHNameserver(Nameserver):
             bootstrap_address=self.bootstrap_address,
             one_rr_per_rrset=one_rr_per_rrset,
             ignore_trailing=ignore_trailing,
+            trace=trace,
             verify=self.verify,
             post=(not self.want_get),
             http_version=self.http_version,
+            http_cache=self.http_cache,
         )
 
     async def async_query(
         self,
-        request: dns.message.QueryMessage,
+        request: Union[dns.message.QueryMessage, dns.message.QueryTemplate],
         timeout: float,
         source: Optional[str],
         source_port: int,
@@ -229,6 +766,7 @@ class DoHNameserver(Nameserver):
         backend: dns.asyncbackend.Backend,
         one_rr_per_rrset: bool = False,
         ignore_trailing: bool = False,
+        trace: Optional[dns.query.TraceCallback] = None,
     ) -> dns.message.Message:
         return await dns.asyncquery.https(
             request,
@@ -239,9 +777,11 @@ class DoHNameserver(Nameserver):
             bootstrap_address=self.bootstrap_address,
             one_rr_per_rrset=one_rr_per_rrset,
             ignore_trailing=ignore_trailing,
+            trace=trace,
             verify=self.verify,
             post=(not self.want_get),
             http_version=self.http_version,
+            http_cache=self.http_cache,
         )
 
 
@@ -262,13 +802,14 @@ class DoTNameserver(AddressAndPortNameserver):
 
     def query(
         self,
-        request: dns.message.QueryMessage,
+        request: Union[dns.message.QueryMessage, dns.message.QueryTemplate],
         timeout: float,
         source: Optional[str],
         source_port: int,
         max_size: bool = False,
         one_rr_per_rrset: bool = False,
         ignore_trailing: bool = False,
+        trace: Optional[dns.query.TraceCallback] = None,
     ) -> dns.message.Message:
         return dns.query.tls(
             request,
@@ -277,13 +818,14 @@ class DoTNameserver(AddressAndPortNameserver):
             timeout=timeout,
             one_rr_per_rrset=one_rr_per_rrset,
             ignore_trailing=ignore_trailing,
+            trace=trace,
             server_hostname=self.hostname,
             verify=self.verify,
         )
 
     async def async_query(
         self,
-        request: dns.message.QueryMessage,
+        request: Union[dns.message.QueryMessage, dns.message.QueryTemplate],
         timeout: float,
         source: Optional[str],
         source_port: int,
@@ -291,6 +833,7 @@ class DoTNameserver(AddressAndPortNameserver):
         backend: dns.asyncbackend.Backend,
         one_rr_per_rrset: bool = False,
         ignore_trailing: bool = False,
+        trace: Optional[dns.query.TraceCallback] = None,
     ) -> dns.message.Message:
         return await dns.asyncquery.tls(
             request,
@@ -299,6 +842,7 @@ class DoTNameserver(AddressAndPortNameserver):
             timeout=timeout,
             one_rr_per_rrset=one_rr_per_rrset,
             ignore_trailing=ignore_trailing,
+            trace=trace,
             server_hostname=self.hostname,
             verify=self.verify,
         )
@@ -321,13 +865,14 @@ class DoQNameserver(AddressAndPortNameserver):
 
     def query(
         self,
-        request: dns.message.QueryMessage,
+        request: Union[dns.message.QueryMessage, dns.message.QueryTemplate],
         timeout: float,
         source: Optional[str],
         source_port: int,
         max_size: bool = False,
         one_rr_per_rrset: bool = False,
         ignore_trailing: bool = False,
+        trace: Optional[dns.query.TraceCallback] = None,
     ) -> dns.message.Message:
         return dns.query.quic(
             request,
@@ -336,13 +881,14 @@ class DoQNameserver(AddressAndPortNameserver):
             timeout=timeout,
             one_rr_per_rrset=one_rr_per_rrset,
             ignore_trailing=ignore_trailing,
+            trace=trace,
             verify=self.verify,
             server_hostname=self.server_hostname,
         )
 
     async def async_query(
         self,
-        request: dns.message.QueryMessage,
+        request: Union[dns.message.QueryMessage, dns.message.QueryTemplate],
         timeout: float,
         source: Optional[str],
         source_port: int,
@@ -350,6 +896,7 @@ class DoQNameserver(AddressAndPortNameserver):
         backend: dns.asyncbackend.Backend,
         one_rr_per_rrset: bool = False,
         ignore_trailing: bool = False,
+        trace: Optional[dns.query.TraceCallback] = None,
     ) -> dns.message.Message:
         return await dns.asyncquery.quic(
             request,
@@ -358,6 +905,7 @@ class DoQNameserver(AddressAndPortNameserver):
             timeout=timeout,
             one_rr_per_rrset=one_rr_per_rrset,
             ignore_trailing=ignore_trailing,
+            trace=trace,
             verify=self.verify,
             server_hostname=self.server_hostname,
         )
@@ -0,0 +1,560 @@
+# Copyright (C) Dnspython Contributors, see LICENSE for text of ISC license
+
+"""DNS messages in packet captures.
+
+The ``dns.pcap`` module reads the DNS messages carried over UDP and TCP in pcap
+and pcapng capture files, reassembling TCP streams as needed, and writes DNS
+messages to pcap files, e.g. for replay or benchmarking.
+"""
+
+import mmap
+import socket
+import struct
+import time
+from typing import Any, BinaryIO, Collection, Dict, Iterator, Optional, Tuple, Union
+
+import dns.exception
+import dns.inet
+import dns.ipv4
+import dns.ipv6
+
+#: The type of the messages generated by ``dns.pcap.read()``, a
+#: ``(timestamp, transport, source, destination, wire)`` tuple.
+CapturedMessage = Tuple[float, str, Tuple[str, int], Tuple[str, int], bytes]
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+# Some platforms use other values for raw IP.
+_raw_linktypes = {LINKTYPE_RAW, 12, 14, LINKTYPE_IPV4, LINKTYPE_IPV6}
+
+_PCAP_MAGICS = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e9),
+}
+_PCAPNG_SHB = b"\x0a\x0d\x0d\x0a"
+
+_ETHERTYPE_IPV4 = 0x0800
+_ETHERTYPE_IPV6 = 0x86DD
+_ETHERTYPE_VLANS = (0x8100, 0x88A8, 0x9100)
+
+_PROTO_TCP = 6
+_PROTO_UDP = 17
+# IPv6 extension headers which may precede the transport header.
+_IPV6_EXTENSIONS = (0, 43, 60)
+_IPV6_FRAGMENT = 44
+
+_TCP_FIN = 0x01
+_TCP_SYN = 0x02
+_TCP_RST = 0x04
+_TCP_PSH = 0x08
+_TCP_ACK = 0x10
+
+# The most out of order TCP segments kept for a stream before giving up on it.
+_MAX_PENDING_SEGMENTS = 256
+# The most data put in one TCP segment by the writer.
+_MAX_SEGMENT = 1460
+
+
+class BadCapture(dns.exception.DNSException):
+    """The capture file is malformed."""
+
+
+def _pcap_frames(data: Any) -> Iterator[Tuple[float, int, bytes]]:
+    # Generate the (timestamp, linktype, frame) tuples of a pcap file.
+    (endian, units) = _PCAP_MAGICS[bytes(data[0:4])]
+    if len(data) < 24:
+        raise BadCapture("the pcap file header is truncated")
+    # The upper bits of the link type are used for FCS information.
+    linktype = struct.unpack_from(endian + "I", data, 20)[0] & 0x0FFFFFFF
+    header = struct.Struct(endian + "IIII")
+    offset = 24
+    end = len(data)
+    while offset + 16 <= end:
+        (seconds, fraction, caplen, _) = header.unpack_from(data, offset)
+        offset += 16
+        if offset + caplen > end:
+            # The capture was interrupted while writing this packet.
+            break
+        yield (seconds + fraction / units, linktype, data[offset : offset + caplen])
+        offset += caplen
+
+
+def _pcapng_frames(data: Any) -> Iterator[Tuple[float, int, bytes]]:
+    # Generate the (timestamp, linktype, frame) tuples of a pcapng file.
+    endian = "<"
+    interfaces = []
+    offset = 0
+    end = len(data)
+    while offset + 12 <= end:
+        if data[offset : offset + 4] == _PCAPNG_SHB:
+            magic = bytes(data[offset + 8 : offset + 12])
+            if magic == b"\x4d\x3c\x2b\x1a":
+                endian = "<"
+            elif magic == b"\x1a\x2b\x3c\x4d":
+                endian = ">"
+            else:
+                raise BadCapture("bad pcapng byte-order magic")
+            interfaces = []
+        (block_type, length) = struct.unpack_from(endian + "II", data, offset)
+        if length < 12 or length % 4 != 0:
+            raise BadCapture("bad pcapng block length")
+        if offset + length > end:
+            # The capture was interrupted while writing this block.
+            break
+        body = offset + 8
+        if block_type == 1:
+            # Interface Description Block
+            linktype = struct.unpack_from(endian + "H", data, body)[0]
+            units = 1e6
+            option = body + 8
+            option_end = offset + length - 4
+            while option + 4 <= option_end:
+                (code, option_length) = struct.unpack_from(endian + "HH", data, option)
+                if code == 0:
+                    break
+                if code == 9 and option_length == 1:
+                    # if_tsresol
+                    resolution = data[option + 4]
+                    if resolution & 0x80:
+                        units = float(2 ** (resolution & 0x7F))
+                    else:
+                        units = float(10**resolution)
+                option += 4 + (option_length + 3) // 4 * 4
+            interfaces.append((linktype, units))
+        elif block_type == 6:
+            # Enhanced Packet Block
+            (interface, high, low, caplen, _) = struct.unpack_from(
+                endian + "IIIII", data, body
+            )
+            if interface >= len(interfaces) or 20 + caplen > length - 12:
+                raise BadCapture("bad pcapng enhanced packet block")
+            (linktype, units) = interfaces[interface]
+            start = body + 20
+            yield (((high << 32) | low) / units, linktype, data[start : start + caplen])
+        elif block_type == 3:
+            # Simple Packet Block, which has no timestamp
+            if not interfaces:
+                raise BadCapture("pcapng simple packet block without an interface")
+            original_length = struct.unpack_from(endian + "I", data, body)[0]
+            caplen = min(original_length, length - 16)
+            start = body + 4
+            yield (0.0, interfaces[0][0], data[start : start + caplen])
+        offset += length
+
+
+def _network_packet(linktype: int, frame: memoryview) -> Optional[memoryview]:
+    # Return the IP packet in *frame*, or None if there isn't one.
+    if linktype == LINKTYPE_ETHERNET:
+        if len(frame) < 14:
+            return None
+        ethertype = (frame[12] << 8) | frame[13]
+        offset = 14
+        while ethertype in _ETHERTYPE_VLANS and len(frame) >= offset + 4:
+            ethertype = (frame[offset + 2] << 8) | frame[offset + 3]
+            offset += 4
+        if ethertype not in (_ETHERTYPE_IPV4, _ETHERTYPE_IPV6):
+            return None
+        return frame[offset:]
+    elif linktype in _raw_linktypes:
+        return frame
+    elif linktype in (LINKTYPE_NULL, LINKTYPE_LOOP):
+        # The address family, which is in host byte order for NULL and network
+        # byte order for LOOP; IPv6 has several values depending on the OS.
+        return frame[4:]
+    elif linktype == LINKTYPE_LINUX_SLL:
+        return frame[16:]
+    elif linktype == LINKTYPE_LINUX_SLL2:
+        return frame[20:]
+    return None
+
+
+def _transport_segment(
+    packet: memoryview,
+) -> Optional[Tuple[int, str, str, memoryview, bool]]:
+    # Return (protocol, source address, destination address, segment, complete)
+    # for the packet, or None if it is not an unfragmented UDP or TCP packet.
+    # *complete* is False if the packet was truncated by the capture.
+    if len(packet) < 20:
+        return None
+    version = packet[0] >> 4
+    if version == 4:
+        header_length = (packet[0] & 0x0F) * 4
+        (total_length, fragment) = struct.unpack_from("!H2xH", packet, 2)
+        if fragment & 0x3FFF:
+            # A fragment, other than an atomic one.
+            return None
+        protocol = packet[9]
+        source = dns.ipv4.inet_ntoa(bytes(packet[12:16]))
+        destination = dns.ipv4.inet_ntoa(bytes(packet[16:20]))
+        # Ethernet may pad short frames, so use the IP length.
+        end = total_length
+        offset = header_length
+    elif version == 6:
+        if len(packet) < 40:
+            return None
+        payload_length = (packet[4] << 8) | packet[5]
+        protocol = packet[6]
+        source = dns.ipv6.inet_ntoa(bytes(packet[8:24]))
+        destination = dns.ipv6.inet_ntoa(bytes(packet[24:40]))
+        end = 40 + payload_length
+        offset = 40
+        while protocol in _IPV6_EXTENSIONS and len(packet) >= offset + 8:
+            protocol = packet[offset]
+            offset += (packet[offset + 1] + 1) * 8
+        if protocol == _IPV6_FRAGMENT:
+            return None
+    else:
+        return None
+    if protocol not in (_PROTO_TCP, _PROTO_UDP):
+        return None
+    complete = end <= len(packet)
+    return (protocol, source, destination, packet[offset:end], complete)
+
+
+class _TCPStream:
+    # The reassembly state of one direction of a TCP connection.
+
+    __slots__ = ["next_seq", "buffer", "pending"]
+
+    def __init__(self) -> None:
+        self.next_seq: Optional[int] = None
+        self.buffer = bytearray()
+        self.pending: Dict[int, bytes] = {}
+
+    def add(self, seq: int, data: bytes) -> bool:
+        # Add a segment, returning False if the stream can't be reassembled.
+        if self.next_seq is None:
+            self.next_seq = seq
+        offset = (seq - self.next_seq) & 0xFFFFFFFF
+        if offset >= 0x80000000:
+            # The segment starts before the data we have, i.e. it is a
+            # retransmission.  Keep any new data at its end.
+            overlap = (self.next_seq - seq) & 0xFFFFFFFF
+            if overlap >= len(data):
+                return True
+            data = data[overlap:]
+            seq = self.next_seq
+        elif offset > 0:
+            if len(self.pending) >= _MAX_PENDING_SEGMENTS:
+                return False
+            self.pending.setdefault(seq, data)
+            return True
+        self.buffer += data
+        self.next_seq = (seq + len(data)) & 0xFFFFFFFF
+        while self.pending:
+            # Use any out of order segments which are now in sequence.
+            for pending_seq in list(self.pending):
+                offset = (pending_seq - self.next_seq) & 0xFFFFFFFF
+                if offset == 0 or offset >= 0x80000000:
+                    break
+            else:
+                break
+            pending_data = self.pending.pop(pending_seq)
+            overlap = (self.next_seq - pending_seq) & 0xFFFFFFFF
+            if overlap < len(pending_data):
+                self.buffer += pending_data[overlap:]
+                self.next_seq = (pending_seq + len(pending_data)) & 0xFFFFFFFF
+        return True
+
+    def messages(self) -> Iterator[bytes]:
+        # Generate the complete length-prefixed messages in the buffer.
+        buffer = self.buffer
+        while len(buffer) >= 2:
+            length = (buffer[0] << 8) | buffer[1]
+            if len(buffer) < length + 2:
+                break
+            yield bytes(buffer[2 : length + 2])
+            del buffer[: length + 2]
+
+
+def _frames(data: Any) -> Iterator[Tuple[float, int, bytes]]:
+    magic = bytes(data[0:4])
+    if magic in _PCAP_MAGICS:
+        return _pcap_frames(data)
+    elif magic == _PCAPNG_SHB:
+        return _pcapng_frames(data)
+    else:
+        raise BadCapture("not a pcap or pcapng file")
+
+
+def _read(data: Any, ports: Collection[int]) -> Iterator[CapturedMessage]:
+    streams: Dict[Tuple[str, int, str, int], _TCPStream] = {}
+    for timestamp, linktype, frame in _frames(data):
+        packet = _network_packet(linktype, memoryview(frame))
+        if packet is None:
+            continue
+        transport = _transport_segment(packet)
+        if transport is None:
+            continue
+        (protocol, source, destination, segment, complete) = transport
+        if len(segment) < 8:
+            continue
+        (source_port, destination_port) = struct.unpack_from("!HH", segment)
+        if source_port not in ports and destination_port not in ports:
+            continue
+        if protocol == _PROTO_UDP:
+            length = (segment[4] << 8) | segment[5]
+            if not complete or length > len(segment) or length < 8:
+                continue
+            yield (
+                timestamp,
+                "udp",
+                (source, source_port),
+                (destination, destination_port),
+                bytes(segment[8:length]),
+            )
+            continue
+        if len(segment) < 20:
+            continue
+        key = (source, source_port, destination, destination_port)
+        (seq, offset, flags) = struct.unpack_from("!4xI4xBB", segment)
+        data = bytes(segment[(offset >> 4) * 4 :])
+        if flags & _TCP_SYN:
+            # A new connection; forget anything left of an old one.
+            stream = _TCPStream()
+            stream.next_seq = (seq + 1) & 0xFFFFFFFF
+            streams[key] = stream
+            seq = stream.next_seq
+        else:
+            stream = streams.get(key)  # type: ignore
+            if stream is None:
+                # We joined a connection part way through.
+                stream = _TCPStream()
+                streams[key] = stream
+        if data:
+            if not complete or not stream.add(seq, data):
+                # We've lost data, so the rest of the stream is unusable.
+                del streams[key]
+                continue
+            for wire in stream.messages():
+                yield (
+                    timestamp,
+                    "tcp",
+                    (source, source_port),
+                    (destination, destination_port),
+                    wire,
+                )
+        if flags & (_TCP_FIN | _TCP_RST):
+            streams.pop(key, None)
+
+
+def read(
+    f: Union[str, BinaryIO], ports: Collection[int] = (53,)
+) -> Iterator[CapturedMessage]:
+    """Read the DNS messages in a pcap or pcapng capture file.
+
+    *f*, a ``str`` or a binary file.  If a ``str``, it is the name of the file to
+    open.  Files on disk are memory-mapped rather than read, so very large
+    captures may be read.
+
+    *ports*, a collection of ``int``, the ports which carry DNS.  UDP datagrams
+    and TCP segments to or from any of them are assumed to be DNS.  The default
+    is ``(53,)``.
+
+    TCP streams are reassembled, including segments which arrive out of order or
+    are retransmitted, and split into messages using their two-octet length
+    prefixes.  A stream which cannot be reassembled, e.g. because the capture
+    lost some of its data, is abandoned.  Fragmented IP packets are ignored, as
+    is the last packet of a capture which was interrupted while writing it.
+
+    Ethernet (with or without VLAN tags), Linux cooked (v1 and v2), BSD
+    loopback, and raw IP captures are supported.
+
+    Raises ``dns.pcap.BadCapture`` if the file is not a pcap or pcapng file, or
+    is malformed.
+
+    Generates ``(timestamp, transport, source, destination, wire)`` tuples, where
+    *timestamp* is a ``float``, the time the packet which completed the message
+    was captured, *transport* is ``"udp"`` or ``"tcp"``, *source* and
+    *destination* are ``(address, port)`` tuples, and *wire* is a ``bytes``
+    containing the message, ready for ``dns.message.from_wire()``.  Messages
+    from simple packet blocks, which have no timestamp, have a timestamp of 0.
+    """
+    if isinstance(f, str):
+        with open(f, "rb") as fp:
+            yield from read(fp, ports)
+        return
+    try:
+        fileno = f.fileno()
+    except (AttributeError, OSError):
+        fileno = None
+    if fileno is not None:
+        try:
+            data = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # The file is empty.
+            raise BadCapture("not a pcap or pcapng file")
+        with data:
+            yield from _read(data, ports)
+    else:
+        yield from _read(f.read(), ports)
+
+
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    while total > 0xFFFF:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+
+class Writer:
+    """Write DNS messages to a pcap capture file.
+
+    Each message is written as an Ethernet frame carrying an IPv4 or IPv6
+    packet, and a UDP datagram or TCP segments.  Messages sent over TCP are
+    prefixed with their length and split into segments as needed, with
+    sequence numbers that follow on from the previous message in the same
+    direction, but no connection setup or teardown is written.
+
+    *f*, a ``str`` or a binary file.  If a ``str``, it is the name of the file to
+    create, which is closed when the writer is closed.
+
+    The writer may be used as a context manager, which closes it on exit.
+    """
+
+    def __init__(self, f: Union[str, BinaryIO]):
+        if isinstance(f, str):
+            self.file: BinaryIO = open(f, "wb")
+            self.close_file = True
+        else:
+            self.file = f
+            self.close_file = False
+        self.sequences: Dict[Tuple[str, int, str, int], int] = {}
+        self.file.write(
+            struct.pack("!IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, LINKTYPE_ETHERNET)
+        )
+
+    def __enter__(self) -> "Writer":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def close(self) -> None:
+        """Close the writer, and the file if the writer opened it."""
+        if self.close_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+    def write(
+        self,
+        wire: bytes,
+        source: Tuple[str, int],
+        destination: Tuple[str, int],
+        timestamp: Optional[float] = None,
+        tcp: bool = False,
+    ) -> None:
+        """Write a DNS message.
+
+        *wire*, a ``bytes``, the wire format message.
+
+        *source* and *destination*, ``(address, port)`` tuples, the endpoints.
+        Both addresses must be of the same family.
+
+        *timestamp*, a ``float`` or ``None``, the time of the packet.  If ``None``,
+        the default, the current time is used.
+
+        *tcp*, a ``bool``.  If ``True``, the message is written as sent over TCP,
+        otherwise over UDP.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        family = dns.inet.af_for_address(source[0])
+        if dns.inet.af_for_address(destination[0]) != family:
+            raise ValueError("the source and destination families differ")
+        if not tcp:
+            self._write_packet(timestamp, source, destination, _PROTO_UDP, wire, 0)
+            return
+        data = len(wire).to_bytes(2, "big") + wire
+        key = (source[0], source[1], destination[0], destination[1])
+        seq = self.sequences.get(key, 1)
+        for start in range(0, len(data), _MAX_SEGMENT):
+            segment = data[start : start + _MAX_SEGMENT]
+            self._write_packet(timestamp, source, destination, _PROTO_TCP, segment, seq)
+            seq = (seq + len(segment)) & 0xFFFFFFFF
+        self.sequences[key] = seq
+
+    def _write_packet(self, timestamp, source, destination, protocol, data, seq):
+        family = dns.inet.af_for_address(source[0])
+        source_address = dns.inet.inet_pton(family, source[0])
+        destination_address = dns.inet.inet_pton(family, destination[0])
+        if protocol == _PROTO_UDP:
+            header = struct.pack("!HHHH", source[1], destination[1], len(data) + 8, 0)
+        else:
+            header = struct.pack(
+                "!HHIIBBHHH",
+                source[1],
+                destination[1],
+                seq,
+                0,
+                5 << 4,
+                _TCP_PSH | _TCP_ACK,
+                65535,
+                0,
+                0,
+            )
+        segment = header + data
+        pseudo_header = source_address + destination_address
+        if family == socket.AF_INET:
+            pseudo_header += struct.pack("!BBH", 0, protocol, len(segment))
+        else:
+            pseudo_header += struct.pack("!I3xB", len(segment), protocol)
+        checksum = _checksum(pseudo_header + segment)
+        if protocol == _PROTO_UDP:
+            # A computed checksum of zero is sent as all ones.
+            checksum = checksum or 0xFFFF
+            offset = 6
+        else:
+            offset = 16
+        segment = segment[:offset] + struct.pack("!H", checksum) + segment[offset + 2 :]
+        if family == socket.AF_INET:
+            if len(segment) + 20 > 65535:
+                raise ValueError("message too big")
+            ip = struct.pack(
+                "!BBHHHBBH4s4s",
+                0x45,
+                0,
+                len(segment) + 20,
+                0,
+                0x4000,
+                64,
+                protocol,
+                0,
+                source_address,
+                destination_address,
+            )
+            ip = ip[:10] + struct.pack("!H", _checksum(ip)) + ip[12:]
+            ethertype = _ETHERTYPE_IPV4
+        else:
+            if len(segment) > 65535:
+                raise ValueError("message too big")
+            ip = struct.pack(
+                "!IHBB16s16s",
+                6 << 28,
+                len(segment),
+                protocol,
+                64,
+                source_address,
+                destination_address,
+            )
+            ethertype = _ETHERTYPE_IPV6
+        frame = b"\x00" * 12 + struct.pack("!H", ethertype) + ip + segment
+        seconds = int(timestamp)
+        microseconds = min(int(round((timestamp - seconds) * 1e6)), 999999)
+        self.file.write(
+            struct.pack("!IIII", seconds, microseconds, len(frame), len(frame))
+        )
+        self.file.write(frame)
@@ -0,0 +1,408 @@
+# Copyright (C) Dnspython Contributors, see LICENSE for text of ISC license
+
+"""DNS performance testing, in the style of dnsperf.
+
+The ``dns.perf`` module sends queries from a query list to a server using the
+``dns.asyncquery`` functions, at a target rate or with a fixed number of
+queries in flight, and reports the query rate, latencies, timeouts, and the
+distribution of response codes.
+
+It may also be run from the command line with ``python -m dns.perf``.
+"""
+
+import argparse
+import asyncio
+import math
+import sys
+import time
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+    Union,
+)
+
+import dns.asyncbackend
+import dns.asyncquery
+import dns.exception
+import dns.message
+import dns.name
+import dns.query
+import dns.rcode
+import dns.rdatatype
+
+if dns.query.have_doh:
+    import httpx
+
+QueryList = List[Tuple[dns.name.Name, dns.rdatatype.RdataType]]
+
+_default_ports = {"udp": 53, "tcp": 53, "tls": 853, "quic": 853, "https": 443}
+
+protocols = tuple(_default_ports.keys())
+
+# Timeouts are counted apart from errors whichever layer reports them, so a
+# slow network doesn't show up as failing servers.  DNS-over-HTTPS timeouts
+# may come from httpx or the operating system rather than from dnspython.
+_timeout_exceptions: Tuple[type, ...] = (dns.exception.Timeout, TimeoutError)
+if dns.query.have_doh:
+    _timeout_exceptions += (httpx.TimeoutException,)  # pyright: ignore
+
+
+class Statistics:
+    """The results of a performance test run."""
+
+    def __init__(self) -> None:
+        #: The number of queries sent.
+        self.sent = 0
+        #: The number of queries which got a response.
+        self.completed = 0
+        #: The number of queries which timed out.
+        self.timeouts = 0
+        #: The number of queries which failed for reasons other than a timeout,
+        #: indexed by exception class name.
+        self.errors: Dict[str, int] = {}
+        #: The number of responses with each rcode.
+        self.rcodes: Dict[dns.rcode.Rcode, int] = {}
+        #: The latencies, in seconds, of the completed queries.
+        self.latencies: List[float] = []
+        #: The time, in seconds, the run took.
+        self.elapsed = 0.0
+
+    def qps(self) -> float:
+        """The number of queries completed per second."""
+        if self.elapsed <= 0:
+            return 0.0
+        return self.completed / self.elapsed
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Return the *p*-th percentile latency, in seconds, using the nearest
+        rank method, or ``None`` if no queries completed.
+        """
+        if not self.latencies:
+            return None
+        latencies = sorted(self.latencies)
+        rank = max(math.ceil(p / 100.0 * len(latencies)), 1)
+        return latencies[min(rank, len(latencies)) - 1]
+
+    def to_text(self) -> str:
+        """Return a human-readable report of the statistics."""
+
+        def percent(n: int) -> str:
+            if self.sent == 0:
+                return "0.00%"
+            return f"{n * 100.0 / self.sent:.2f}%"
+
+        lines = ["Statistics:", ""]
+        lines.append(f"  Queries sent:         {self.sent}")
+        lines.append(
+            f"  Queries completed:    {self.completed} ({percent(self.completed)})"
+        )
+        lines.append(
+            f"  Queries timed out:    {self.timeouts} ({percent(self.timeouts)})"
+        )
+        for name, count in sorted(self.errors.items()):
+            lines.append(f"  Errors ({name}): {count} ({percent(count)})")
+        rcodes = ", ".join(
+            f"{dns.rcode.to_text(rcode)} {count}"
+            for rcode, count in sorted(self.rcodes.items())
+        )
+        lines.append(f"  Response codes:       {rcodes}")
+        lines.append(f"  Run time (s):         {self.elapsed:.6f}")
+        lines.append(f"  Queries per second:   {self.qps():.6f}")
+        if self.latencies:
+            average = sum(self.latencies) / len(self.latencies)
+            lines.append(
+                f"  Average latency (s):  {average:.6f} "
+                f"(min {min(self.latencies):.6f}, max {max(self.latencies):.6f})"
+            )
+            percentiles = ", ".join(
+                f"{p}th {self.percentile(p):.6f}" for p in (50, 90, 95, 99, 99.9)
+            )
+            lines.append(f"  Latency percentiles (s): {percentiles}")
+        return "\n".join(lines)
+
+
+def read_queries(f: Union[TextIO, str]) -> QueryList:
+    """Read a query list in dnsperf format.
+
+    *f*, a file or a ``str``.  If a ``str``, it is the name of the file to open.
+
+    Each line contains a query name and, optionally, a query type, which defaults
+    to ``A``.  Blank lines and lines starting with ``#`` or ``;`` are ignored.
+
+    Returns a list of ``(dns.name.Name, dns.rdatatype.RdataType)`` tuples.
+    """
+    if isinstance(f, str):
+        with open(f) as fp:
+            return read_queries(fp)
+    queries = []
+    for line in f:
+        tokens = line.split()
+        if len(tokens) == 0 or tokens[0][0] in "#;":
+            continue
+        if len(tokens) > 2:
+            raise dns.exception.SyntaxError(f"invalid query line: {line.strip()}")
+        qname = dns.name.from_text(tokens[0])
+        if len(tokens) == 2:
+            rdtype = dns.rdatatype.from_text(tokens[1])
+        else:
+            rdtype = dns.rdatatype.A
+        queries.append((qname, rdtype))
+    return queries
+
+
+async def _run_workers(
+    backend: dns.asyncbackend.Backend, worker: Callable[[], Awaitable[None]], count: int
+) -> None:
+    # Run *count* instances of *worker* concurrently, and wait for them all to
+    # finish.  If one fails, the others are cancelled and its exception raised.
+    done = backend.make_event()
+    running = count
+    failures: List[Exception] = []
+
+    async def run_worker():
+        nonlocal running
+        try:
+            await worker()
+        except Exception as e:
+            failures.append(e)
+            done.set()
+        finally:
+            running -= 1
+            if running == 0:
+                done.set()
+
+    async with backend.task_group() as tasks:
+        for _ in range(count):
+            tasks.start_soon(run_worker)
+        await done.wait()
+    if failures:
+        raise failures[0]
+
+
+async def run(
+    queries: QueryList,
+    where: str,
+    port: Optional[int] = None,
+    protocol: str = "udp",
+    concurrency: int = 10,
+    rate: Optional[float] = None,
+    runs: Optional[int] = None,
+    duration: Optional[float] = None,
+    timeout: float = 5.0,
+    edns: int = 0,
+    payload: int = dns.message.DEFAULT_EDNS_PAYLOAD,
+    backend: Optional[dns.asyncbackend.Backend] = None,
+    **kwargs: Any,
+) -> Statistics:
+    """Send the queries in *queries* to *where*, and return the statistics.
+
+    *queries*, a list of ``(dns.name.Name, dns.rdatatype.RdataType)`` tuples, such
+    as returned by ``dns.perf.read_queries()``.
+
+    *where*, a ``str``, the server IP address, or the URL if *protocol* is
+    ``"https"``.
+
+    *port*, an ``int`` or ``None``.  The port to send to.  If ``None``, the default,
+    the standard port for the protocol is used.
+
+    *protocol*, a ``str``, one of ``"udp"``, ``"tcp"``, ``"tls"``, ``"https"``, or
+    ``"quic"``.  The default is ``"udp"``.
+
+    *concurrency*, an ``int``, the maximum number of queries in flight.  The default
+    is 10.
+
+    *rate*, a ``float`` or ``None``, the maximum number of queries to send per
+    second.  If ``None``, the default, queries are sent as fast as responses come
+    back.
+
+    *runs*, an ``int`` or ``None``, the number of times to run through the query
+    list.  If ``None``, the default, the list is run through once, unless a
+    *duration* is given, in which case it is run through as often as needed.
+
+    *duration*, a ``float`` or ``None``, the number of seconds after which no more
+    queries are sent.
+
+    *timeout*, a ``float``, the number of seconds to wait for each response.
+
+    *edns*, an ``int``, the EDNS level to use, or -1 to disable EDNS.  The default
+    is 0.
+
+    *payload*, an ``int``, the EDNS payload size to advertise.
+
+    *backend*, a ``dns.asyncbackend.Backend``, or ``None``.  If ``None``, the
+    default, then dnspython will use the default backend.  For ``"https"``, only
+    the default backend may be given, as httpx always detects the asynchronous
+    I/O library itself.
+
+    Additional keyword arguments are passed to the ``dns.asyncquery`` function for
+    the protocol, e.g. *verify* for ``"tls"``.
+
+    Returns a ``dns.perf.Statistics``.
+    """
+    if protocol not in _default_ports:
+        raise ValueError(f"unknown protocol {protocol}")
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    if not queries:
+        raise ValueError("the query list is empty")
+    if not backend:
+        backend = dns.asyncbackend.get_default_backend()
+    elif protocol == "https" and backend is not dns.asyncbackend.get_default_backend():
+        raise ValueError("a backend cannot be given for https")
+    if port is None:
+        port = _default_ports[protocol]
+    if runs is None and duration is None:
+        runs = 1
+    kwargs["port"] = port
+    if protocol != "https":
+        kwargs["backend"] = backend
+    query_function = getattr(dns.asyncquery, protocol)
+
+    # Render each query once; every send just patches in a new ID.
+    templates = [
+        dns.message.QueryTemplate(
+            dns.message.make_query(qname, rdtype, use_edns=edns, payload=payload)
+        )
+        for qname, rdtype in queries
+    ]
+
+    def messages() -> Iterator[dns.message.QueryTemplate]:
+        run = 0
+        while runs is None or run < runs:
+            yield from templates
+            run += 1
+
+    statistics = Statistics()
+    pending = messages()
+    start = time.perf_counter()
+    end = start + duration if duration is not None else None
+    interval = 1.0 / rate if rate else 0.0
+    next_send = start
+
+    async def worker():
+        nonlocal next_send
+        while True:
+            now = time.perf_counter()
+            if end is not None and now >= end:
+                return
+            if interval:
+                # Claim the next send slot, and wait for it.
+                send_time = max(next_send, now)
+                if end is not None and send_time >= end:
+                    return
+                next_send = send_time + interval
+                if send_time > now:
+                    await backend.sleep(send_time - now)
+            q = next(pending, None)
+            if q is None:
+                return
+            statistics.sent += 1
+            sent = time.perf_counter()
+            try:
+                response = await query_function(q, where, timeout=timeout, **kwargs)
+            except _timeout_exceptions:
+                statistics.timeouts += 1
+                continue
+            except Exception as e:
+                name = e.__class__.__name__
+                statistics.errors[name] = statistics.errors.get(name, 0) + 1
+                continue
+            statistics.latencies.append(time.perf_counter() - sent)
+            statistics.completed += 1
+            rcode = response.rcode()
+            statistics.rcodes[rcode] = statistics.rcodes.get(rcode, 0) + 1
+
+    await _run_workers(backend, worker, concurrency)
+    statistics.elapsed = time.perf_counter() - start
+    return statistics
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    """Run a performance test as directed by the command line arguments *args*,
+    print the statistics, and return the exit status.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m dns.perf", description="DNS performance testing tool."
+    )
+    parser.add_argument(
+        "-s", "--server", default="127.0.0.1", help="the server address or URL"
+    )
+    parser.add_argument("-p", "--port", type=int, help="the server port")
+    parser.add_argument(
+        "-m",
+        "--mode",
+        choices=protocols,
+        default="udp",
+        help="the transport protocol (default udp)",
+    )
+    parser.add_argument(
+        "-d", "--datafile", default="-", help="the query list (default stdin)"
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=10,
+        help="the number of queries in flight (default 10)",
+    )
+    parser.add_argument(
+        "-Q", "--rate", type=float, help="the maximum number of queries per second"
+    )
+    parser.add_argument(
+        "-n", "--runs", type=int, help="the number of runs through the query list"
+    )
+    parser.add_argument(
+        "-l", "--duration", type=float, help="the number of seconds to run for"
+    )
+    parser.add_argument(
+        "-t",
+        "--timeout",
+        type=float,
+        default=5.0,
+        help="the query timeout in seconds (default 5)",
+    )
+    parser.add_argument(
+        "--no-edns", action="store_true", help="do not use EDNS in queries"
+    )
+    parser.add_argument(
+        "--no-verify",
+        action="store_true",
+        help="do not verify the server certificate (tls, https, quic)",
+    )
+    options = parser.parse_args(args)
+    if options.datafile == "-":
+        queries = read_queries(sys.stdin)
+    else:
+        queries = read_queries(options.datafile)
+    kwargs = {}
+    if options.no_verify:
+        kwargs["verify"] = False
+    statistics = asyncio.run(
+        run(
+            queries,
+            options.server,
+            port=options.port,
+            protocol=options.mode,
+            concurrency=options.concurrency,
+            rate=options.rate,
+            runs=options.runs,
+            duration=options.duration,
+            timeout=options.timeout,
+            edns=-1 if options.no_edns else 0,
+            backend=dns.asyncbackend.get_backend("asyncio"),
+            **kwargs,
+        )
+    )
+    print(statistics.to_text())
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(main())
@@ -27,9 +27,10 @@ import random
 import selectors
 import socket
 import struct
+import threading
 import time
 import urllib.parse
-from typing import Any, Dict, Optional, Tuple, Union, cast
+from typing import Any, Callable, Dict, Optional, Tuple, Union, cast
 
 import dns._features
 import dns.exception
@@ -222,6 +223,39 @@ class NoDOQ(dns.exception.DNSException):
 TransferError = dns.xfr.TransferError
 
 
+class TracePhase(enum.IntEnum):
+    """A phase of a query, as reported to a tracing callback.
+
+    A tracing callback is called with the phase and the value of
+    ``time.perf_counter()`` when the phase is reached.  Phases which do not
+    apply to a transport, e.g. ``HANDSHAKE`` for TCP, are not reported, and the
+    HTTPS transport only reports ``START``, ``RECEIVED``, and ``PARSED``.  If
+    ``dns.query.udp_with_fallback()`` falls back to TCP, the phases of the TCP
+    query are reported after those of the UDP query.
+    """
+
+    #: The query function was called.
+    START = 1
+    #: The socket was created.
+    SOCKET = 2
+    #: The connection to the server was established.
+    CONNECTED = 3
+    #: The TLS or QUIC handshake completed.
+    HANDSHAKE = 4
+    #: The query was sent.
+    SENT = 5
+    #: The first part of the response arrived.
+    FIRST_BYTE = 6
+    #: The whole response arrived.
+    RECEIVED = 7
+    #: The response was parsed.
+    PARSED = 8
+
+
+#: The type of a tracing callback.
+TraceCallback = Callable[[TracePhase, float], None]
+
+
 def _compute_times(timeout):
     now = time.time()
     if timeout is None:
@@ -358,6 +392,20 @@ def _make_socket(af, type, source, ssl_context=None, server_hostname=None):
         raise
 
 
+def _query_and_wire(q, id=None):
+    """Return a ``(dns.message.Message, bytes)`` tuple of the query to check the
+    response against and its wire format.
+
+    *q* may be a ``dns.message.Message`` or a ``dns.message.QueryTemplate``.
+    If *id* is not ``None``, the query ID is set to it.
+    """
+    if isinstance(q, dns.message.QueryTemplate):
+        return q.instantiate(id)
+    if id is not None:
+        q.id = id
+    return (q, q.to_wire())
+
+
 def _maybe_get_resolver(
     resolver: Optional["dns.resolver.Resolver"],  # pyright: ignore
 ) -> "dns.resolver.Resolver":  # pyright: ignore
@@ -388,8 +436,142 @@ class HTTPVersion(enum.IntEnum):
     H3 = 3
 
 
-def https(
+HTTPCacheKey = Tuple[str, bytes]
+
+
+class HTTPCache:
+    """A thread-safe cache of DNS-over-HTTPS responses.
+
+    Responses are keyed by URL and by the wire format of the query with its ID
+    set to zero, so a cached response answers any later query asking the same
+    question with the same options, whether it is sent with GET or POST.  A
+    response is kept for as long as the ``max-age`` directive of its
+    ``Cache-Control`` header allows, less its ``Age``.  Responses marked
+    ``no-store`` or ``no-cache``, responses without a ``max-age``, and responses
+    to TSIG-signed queries are not cached.
+
+    When a response is taken from the cache, the TTLs of its records are reduced
+    by the time it has been cached, as described in RFC 8484 section 5.1.
+    """
+
+    def __init__(self, max_size: int = 1000) -> None:
+        """*max_size*, an ``int``, the maximum number of responses to keep."""
+        self.max_size = max(max_size, 1)
+        self.lock = threading.Lock()
+        self.data: Dict[HTTPCacheKey, Tuple[float, float, bytes]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(url: str, q: dns.message.Message, wire: bytes) -> Optional[HTTPCacheKey]:
+        """Return the cache key for the query *q*, whose wire format is *wire*,
+        sent to *url*, or ``None`` if the response must not be cached.
+        """
+        if q.had_tsig or q.keyring:
+            return None
+        return (url, b"\x00\x00" + wire[2:])
+
+    @staticmethod
+    def freshness(cache_control: Optional[str], age: Optional[str]) -> float:
+        """Return the number of seconds a response with the specified
+        ``Cache-Control`` and ``Age`` header values may be cached for.
+        """
+        if not cache_control:
+            return 0.0
+        max_age = None
+        for directive in cache_control.lower().split(","):
+            (name, _, value) = directive.strip().partition("=")
+            if name in ("no-store", "no-cache"):
+                return 0.0
+            if name == "max-age":
+                try:
+                    max_age = int(value.strip().strip('"'))
+                except ValueError:
+                    return 0.0
+        if max_age is None:
+            return 0.0
+        if age:
+            try:
+                max_age -= int(age)
+            except ValueError:
+                pass
+        return float(max(max_age, 0))
+
+    def get(self, key: HTTPCacheKey) -> Optional[Tuple[bytes, float]]:
+        """Get the response cached for *key*.
+
+        Returns a ``(bytes, float)`` tuple of the response wire format and the
+        number of seconds it has been cached for, or ``None`` if there is no
+        fresh response.
+        """
+        with self.lock:
+            now = time.time()
+            value = self.data.get(key)
+            if value is None or value[0] <= now:
+                if value is not None:
+                    del self.data[key]
+                self.misses += 1
+                return None
+            self.hits += 1
+            return (value[2], now - value[1])
+
+    def put(
+        self,
+        key: HTTPCacheKey,
+        content: bytes,
+        cache_control: Optional[str],
+        age: Optional[str] = None,
+    ) -> None:
+        """Cache the response *content* for *key*, if the *cache_control* and
+        *age* header values allow it.
+        """
+        freshness = self.freshness(cache_control, age)
+        if freshness <= 0:
+            return
+        with self.lock:
+            now = time.time()
+            if len(self.data) >= self.max_size and key not in self.data:
+                for k in [k for (k, v) in self.data.items() if v[0] <= now]:
+                    del self.data[k]
+                if len(self.data) >= self.max_size:
+                    # Forget the oldest response.
+                    del self.data[next(iter(self.data))]
+            self.data[key] = (now + freshness, now, bytes(content))
+
+    def flush(self) -> None:
+        """Flush the cache."""
+        with self.lock:
+            self.data = {}
+
+
+def _cached_https_response(
+    http_cache: HTTPCache,
+    key: HTTPCacheKey,
     q: dns.message.Message,
+    one_rr_per_rrset: bool,
+    ignore_trailing: bool,
+) -> Optional[dns.message.Message]:
+    # Return the cached response to *q*, with its ID set to the query's and the
+    # TTLs aged, or None if there isn't one.
+    cached = http_cache.get(key)
+    if cached is None:
+        return None
+    (content, age) = cached
+    r = dns.message.from_wire(
+        content, one_rr_per_rrset=one_rr_per_rrset, ignore_trailing=ignore_trailing
+    )
+    r.id = q.id
+    elapsed = int(age)
+    if elapsed > 0:
+        for section in r.sections[1:]:
+            for rrset in section:
+                rrset.ttl = max(rrset.ttl - elapsed, 0)
+    r.time = 0.0
+    return r
+
+
+def https(
+    q: Union[dns.message.Message, dns.message.QueryTemplate],
     where: str,
     timeout: Optional[float] = None,
     port: int = 443,
@@ -405,10 +587,13 @@ def https(
     resolver: Optional["dns.resolver.Resolver"] = None,  # pyright: ignore
     family: int = socket.AF_UNSPEC,
     http_version: HTTPVersion = HTTPVersion.DEFAULT,
+    trace: Optional[TraceCallback] = None,
+    http_cache: Optional[HTTPCache] = None,
 ) -> dns.message.Message:
     """Return the response obtained after sending a query via DNS-over-HTTPS.
 
-    *q*, a ``dns.message.Message``, the query to send.
+    *q*, a ``dns.message.Message`` or ``dns.message.QueryTemplate``, the query to
+    send.
 
     *where*, a ``str``, the nameserver IP address or the full URL. If an IP address is
     given, the URL will be constructed using the following schema:
@@ -456,9 +641,20 @@ def https(
 
     *http_version*, a ``dns.query.HTTPVersion``, indicating which HTTP version to use.
 
+    *trace*, a callable or ``None``.  If not ``None``, it is called with a
+    ``dns.query.TracePhase`` and the value of ``time.perf_counter()`` as each
+    phase of the query is reached.
+
+    *http_cache*, a ``dns.query.HTTPCache`` or ``None``.  If not ``None``, a fresh
+    cached response to the same question is returned without sending the query,
+    and cacheable responses are added to the cache.
+
     Returns a ``dns.message.Message``.
     """
 
+    if trace:
+        trace(TracePhase.START, time.perf_counter())
+
     (af, _, the_source) = _destination_and_source(
         where, port, source, source_port, False
     )
@@ -482,9 +678,23 @@ def https(
         if parsed.port is not None:
             port = parsed.port
 
-    if http_version == HTTPVersion.H3 or (
+    # DNS-over-HTTP3 queries use ID 0, so pick the transport first and render
+    # the query once for both the cache key and the request.
+    h3 = http_version == HTTPVersion.H3 or (
         http_version == HTTPVersion.DEFAULT and not have_doh
-    ):
+    )
+    (q, wire) = _query_and_wire(q, 0 if h3 else None)
+    cache_key = None
+    if http_cache is not None:
+        cache_key = http_cache.key(url, q, wire)
+        if cache_key is not None:
+            r = _cached_https_response(
+                http_cache, cache_key, q, one_rr_per_rrset, ignore_trailing
+            )
+            if r is not None:
+                return r
+
+    if h3:
         if bootstrap_address is None:
             resolver = _maybe_get_resolver(resolver)
             assert parsed.hostname is not None  # pyright: ignore
@@ -502,6 +712,10 @@ def https(
             ignore_trailing,
             verify=verify,
             post=post,
+            trace=trace,
+            http_cache=http_cache,
+            cache_key=cache_key,
+            wire=wire,
         )
 
     if not have_doh:
@@ -509,7 +723,6 @@ def https(
     if session and not isinstance(session, httpx.Client):  # pyright: ignore
         raise ValueError("session parameter must be an httpx.Client")
 
-    wire = q.to_wire()
     headers = {"accept": "application/dns-message"}
 
     h1 = http_version in (HTTPVersion.H1, HTTPVersion.DEFAULT)
@@ -569,6 +782,8 @@ def https(
                 extensions=extensions,
             )
 
+    if trace:
+        trace(TracePhase.RECEIVED, time.perf_counter())
     # see https://tools.ietf.org/html/rfc8484#section-4.2.1 for info about DoH
     # status codes
     if response.status_code < 200 or response.status_code > 299:
@@ -583,9 +798,19 @@ def https(
         one_rr_per_rrset=one_rr_per_rrset,
         ignore_trailing=ignore_trailing,
     )
+    if trace:
+        trace(TracePhase.PARSED, time.perf_counter())
     r.time = response.elapsed.total_seconds()
     if not q.is_response(r):
         raise BadResponse
+    if cache_key is not None:
+        assert http_cache is not None
+        http_cache.put(
+            cache_key,
+            response.content,
+            response.headers.get("cache-control"),
+            response.headers.get("age"),
+        )
     return r
 
 
@@ -598,6 +823,13 @@ def _find_header(headers: dns.quic.Headers, name: bytes) -> bytes:
     raise KeyError
 
 
+def _header_value(headers: dns.quic.Headers, name: bytes) -> Optional[str]:
+    try:
+        return _find_header(headers, name).decode()
+    except (KeyError, UnicodeDecodeError):
+        return None
+
+
 def _check_status(headers: dns.quic.Headers, peer: str, wire: bytes) -> None:
     value = _find_header(headers, b":status")
     if value is None:
@@ -616,7 +848,7 @@ def _check_status(headers: dns.quic.Headers, peer: str, wire: bytes) -> None:
 
 
 def _http3(
-    q: dns.message.Message,
+    q: Union[dns.message.Message, dns.message.QueryTemplate],
     where: str,
     url: str,
     timeout: Optional[float] = None,
@@ -628,6 +860,10 @@ def _http3(
     verify: Union[bool, str] = True,
     hostname: Optional[str] = None,
     post: bool = True,
+    trace: Optional[TraceCallback] = None,
+    http_cache: Optional[HTTPCache] = None,
+    cache_key: Optional[HTTPCacheKey] = None,
+    wire: Optional[bytes] = None,
 ) -> dns.message.Message:
     if not dns.quic.have_quic:
         raise NoDOH("DNS-over-HTTP3 is not available.")  # pragma: no cover
@@ -637,8 +873,8 @@ def _http3(
     if url_parts.port is not None:
         port = url_parts.port
 
-    q.id = 0
-    wire = q.to_wire()
+    if wire is None:
+        (q, wire) = _query_and_wire(q, 0)
     manager = dns.quic.SyncQuicManager(
         verify_mode=verify, server_name=hostname, h3=True  # pyright: ignore
     )
@@ -647,9 +883,16 @@ def _http3(
         connection = manager.connect(where, port, source, source_port)
         (start, expiration) = _compute_times(timeout)
         with connection.make_stream(timeout) as stream:
+            if trace:
+                trace(TracePhase.HANDSHAKE, time.perf_counter())
             stream.send_h3(url, wire, post)
+            if trace:
+                trace(TracePhase.SENT, time.perf_counter())
             wire = stream.receive(_remaining(expiration))
+            if trace:
+                trace(TracePhase.RECEIVED, time.perf_counter())
             _check_status(stream.headers(), where, wire)
+            headers = stream.headers()
         finish = time.time()
     r = dns.message.from_wire(
         wire,
@@ -658,9 +901,19 @@ def _http3(
         one_rr_per_rrset=one_rr_per_rrset,
         ignore_trailing=ignore_trailing,
     )
+    if trace:
+        trace(TracePhase.PARSED, time.perf_counter())
     r.time = max(finish - start, 0.0)
     if not q.is_response(r):
         raise BadResponse
+    if cache_key is not None:
+        assert http_cache is not None
+        http_cache.put(
+            cache_key,
+            wire,
+            _header_value(headers, b"cache-control"),
+            _header_value(headers, b"age"),
+        )
     return r
 
 
@@ -732,6 +985,7 @@ def receive_udp(
     raise_on_truncation: bool = False,
     ignore_errors: bool = False,
     query: Optional[dns.message.Message] = None,
+    trace: Optional[TraceCallback] = None,
 ) -> Any:
     """Read a DNS message from a UDP socket.
 
@@ -780,6 +1034,11 @@ def receive_udp(
     *query*, a ``dns.message.Message`` or ``None``.  If not ``None`` and
     *ignore_errors* is ``True``, check that the received message is a response
     to this query, and if not keep listening for a valid response.
+
+    *trace*, a callable or ``None``.  If not ``None``, it is called with a
+    ``dns.query.TracePhase`` and the value of ``time.perf_counter()`` when a
+    datagram from the expected source is received and when the response has been
+    parsed.
     """
 
     wire = b""
@@ -790,6 +1049,8 @@ def receive_udp(
         ):
             continue
         received_time = time.time()
+        if trace:
+            trace(TracePhase.RECEIVED, time.perf_counter())
         try:
             r = dns.message.from_wire(
                 wire,
@@ -820,6 +1081,8 @@ def receive_udp(
                 raise
         if ignore_errors and query is not None and not query.is_response(r):
             continue
+        if trace:
+            trace(TracePhase.PARSED, time.perf_counter())
         if destination:
             return (r, received_time)
         else:
@@ -827,7 +1090,7 @@ def receive_udp(
 
 
 def udp(
-    q: dns.message.Message,
+    q: Union[dns.message.Message, dns.message.QueryTemplate],
     where: str,
     timeout: Optional[float] = None,
     port: int = 53,
@@ -839,10 +1102,12 @@ def udp(
     raise_on_truncation: bool = False,
     sock: Optional[Any] = None,
     ignore_errors: bool = False,
+    trace: Optional[TraceCallback] = None,
 ) -> dns.message.Message:
     """Return the response obtained after sending a query via UDP.
 
-    *q*, a ``dns.message.Message``, the query to send
+    *q*, a ``dns.message.Message`` or ``dns.message.QueryTemplate``, the query to
+    send
 
     *where*, a ``str`` containing an IPv4 or IPv6 address,  where
     to send the message.
@@ -879,10 +1144,16 @@ def udp(
     mismatches occur, ignore them and keep listening for a valid response.
     The default is ``False``.
 
+    *trace*, a callable or ``None``.  If not ``None``, it is called with a
+    ``dns.query.TracePhase`` and the value of ``time.perf_counter()`` as each
+    phase of the query is reached.
+
     Returns a ``dns.message.Message``.
     """
 
-    wire = q.to_wire()
+    if trace:
+        trace(TracePhase.START, time.perf_counter())
+    (q, wire) = _query_and_wire(q)
     (af, destination, source) = _destination_and_source(
         where, port, source, source_port
     )
@@ -892,7 +1163,11 @@ def udp(
     else:
         cm = _make_socket(af, socket.SOCK_DGRAM, source)
     with cm as s:
+        if trace and not sock:
+            trace(TracePhase.SOCKET, time.perf_counter())
         send_udp(s, wire, destination, expiration)
+        if trace:
+            trace(TracePhase.SENT, time.perf_counter())
         (r, received_time) = receive_udp(
             s,
             destination,
@@ -905,6 +1180,7 @@ def udp(
             raise_on_truncation,
             ignore_errors,
             q,
+            trace,
         )
         r.time = received_time - begin_time
         # We don't need to check q.is_response() if we are in ignore_errors mode
@@ -918,7 +1194,7 @@ def udp(
 
 
 def udp_with_fallback(
-    q: dns.message.Message,
+    q: Union[dns.message.Message, dns.message.QueryTemplate],
     where: str,
     timeout: Optional[float] = None,
     port: int = 53,
@@ -930,11 +1206,14 @@ def udp_with_fallback(
     udp_sock: Optional[Any] = None,
     tcp_sock: Optional[Any] = None,
     ignore_errors: bool = False,
+    capabilities: Optional["dns.nameserver.CapabilityCache"] = None,  # pyright: ignore
+    trace: Optional[TraceCallback] = None,
 ) -> Tuple[dns.message.Message, bool]:
     """Return the response to the query, trying UDP first and falling back
     to TCP if UDP results in a truncated response.
 
-    *q*, a ``dns.message.Message``, the query to send
+    *q*, a ``dns.message.Message`` or ``dns.message.QueryTemplate``, the query to
+    send
 
     *where*, a ``str`` containing an IPv4 or IPv6 address,  where to send the message.
 
@@ -971,38 +1250,57 @@ def udp_with_fallback(
     while listening for UDP, ignore them and keep listening for a valid response. The
     default is ``False``.
 
+    *capabilities*, a ``dns.nameserver.CapabilityCache`` or ``None``.  If not ``None``,
+    the truncation behavior of the server is recorded in the cache, and if the server
+    is known to always truncate, the query goes straight to TCP.
+
+    *trace*, a callable or ``None``.  If not ``None``, it is called with a
+    ``dns.query.TracePhase`` and the value of ``time.perf_counter()`` as each
+    phase of the query is reached.
+
     Returns a (``dns.message.Message``, tcp) tuple where tcp is ``True`` if and only if
     TCP was used.
     """
-    try:
-        response = udp(
-            q,
-            where,
-            timeout,
-            port,
-            source,
-            source_port,
-            ignore_unexpected,
-            one_rr_per_rrset,
-            ignore_trailing,
-            True,
-            udp_sock,
-            ignore_errors,
-        )
-        return (response, False)
-    except dns.message.Truncated:
-        response = tcp(
-            q,
-            where,
-            timeout,
-            port,
-            source,
-            source_port,
-            one_rr_per_rrset,
-            ignore_trailing,
-            tcp_sock,
-        )
-        return (response, True)
+    key = (where, port)
+    caps = None
+    if capabilities is not None:
+        caps = capabilities.get(key)
+    if caps is None or not caps.tcp_only:
+        try:
+            response = udp(
+                q,
+                where,
+                timeout,
+                port,
+                source,
+                source_port,
+                ignore_unexpected,
+                one_rr_per_rrset,
+                ignore_trailing,
+                True,
+                udp_sock,
+                ignore_errors,
+                trace,
+            )
+            if capabilities is not None:
+                capabilities.note_udp_response(key, response.opt is not None)
+            return (response, False)
+        except dns.message.Truncated:
+            if capabilities is not None:
+                capabilities.note_truncation(key)
+    response = tcp(
+        q,
+        where,
+        timeout,
+        port,
+        source,
+        source_port,
+        one_rr_per_rrset,
+        ignore_trailing,
+        tcp_sock,
+        trace,
+    )
+    return (response, True)
 
 
 def _net_read(sock, count, expiration):
@@ -1011,19 +1309,32 @@ def _net_read(sock, count, expiration):
     A Timeout exception will be raised if the operation is not completed
     by the expiration time.
     """
-    s = b""
-    while count > 0:
+    # Usually everything arrives at once, and the bytes received are returned
+    # as they are.  Otherwise the rest is received into a buffer, which is
+    # copied once, rather than concatenating the pieces.
+    if count == 0:
+        return b""
+    view = None
+    offset = 0
+    while offset < count:
         try:
-            n = sock.recv(count)
-            if n == b"":
+            if view is None:
+                data = sock.recv(count)
+                if len(data) == count:
+                    return data
+                view = memoryview(bytearray(count))
+                n = len(data)
+                view[:n] = data
+            else:
+                n = sock.recv_into(view[offset:])
+            if n == 0:
                 raise EOFError("EOF")
-            count -= len(n)
-            s += n
+            offset += n
         except (BlockingIOError, ssl.SSLWantReadError):
             _wait_for_readable(sock, expiration)
         except ssl.SSLWantWriteError:  # pragma: no cover
             _wait_for_writable(sock, expiration)
-    return s
+    return view.tobytes()
 
 
 def _net_write(sock, data, expiration):
@@ -1079,6 +1390,7 @@ def receive_tcp(
     keyring: Optional[Dict[dns.name.Name, dns.tsig.Key]] = None,
     request_mac: Optional[bytes] = b"",
     ignore_trailing: bool = False,
+    trace: Optional[TraceCallback] = None,
 ) -> Tuple[dns.message.Message, float]:
     """Read a DNS message from a TCP socket.
 
@@ -1098,6 +1410,11 @@ def receive_tcp(
     *ignore_trailing*, a ``bool``.  If ``True``, ignore trailing
     junk at end of the received message.
 
+    *trace*, a callable or ``None``.  If not ``None``, it is called with a
+    ``dns.query.TracePhase`` and the value of ``time.perf_counter()`` when the
+    length of the response has been read, when the whole response has been read,
+    and when it has been parsed.
+
     Raises if the message is malformed, if network errors occur, of if
     there is a timeout.
 
@@ -1106,9 +1423,13 @@ def receive_tcp(
     """
 
     ldata = _net_read(sock, 2, expiration)
+    if trace:
+        trace(TracePhase.FIRST_BYTE, time.perf_counter())
     (l,) = struct.unpack("!H", ldata)
     wire = _net_read(sock, l, expiration)
     received_time = time.time()
+    if trace:
+        trace(TracePhase.RECEIVED, time.perf_counter())
     r = dns.message.from_wire(
         wire,
         keyring=keyring,
@@ -1116,6 +1437,8 @@ def receive_tcp(
         one_rr_per_rrset=one_rr_per_rrset,
         ignore_trailing=ignore_trailing,
     )
+    if trace:
+        trace(TracePhase.PARSED, time.perf_counter())
     return (r, received_time)
 
 
@@ -1131,7 +1454,7 @@ def _connect(s, address, expiration):
 
 
 def tcp(
-    q: dns.message.Message,
+    q: Union[dns.message.Message, dns.message.QueryTemplate],
     where: str,
     timeout: Optional[float] = None,
     port: int = 53,
@@ -1140,10 +1463,12 @@ def tcp(
     one_rr_per_rrset: bool = False,
     ignore_trailing: bool = False,
     sock: Optional[Any] = None,
+    trace: Optional[TraceCallback] = None,
 ) -> dns.message.Message:
     """Return the response obtained after sending a query via TCP.
 
-    *q*, a ``dns.message.Message``, the query to send
+    *q*, a ``dns.message.Message`` or ``dns.message.QueryTemplate``, the query to
+    send
 
     *where*, a ``str`` containing an IPv4 or IPv6 address, where
     to send the message.
@@ -1170,10 +1495,16 @@ def tcp(
     if a socket is provided, it must be a nonblocking connected stream
     socket, and *where*, *port*, *source* and *source_port* are ignored.
 
+    *trace*, a callable or ``None``.  If not ``None``, it is called with a
+    ``dns.query.TracePhase`` and the value of ``time.perf_counter()`` as each
+    phase of the query is reached.
+
     Returns a ``dns.message.Message``.
     """
 
-    wire = q.to_wire()
+    if trace:
+        trace(TracePhase.START, time.perf_counter())
+    (q, wire) = _query_and_wire(q)
     (begin_time, expiration) = _compute_times(timeout)
     if sock:
         cm: contextlib.AbstractContextManager = contextlib.nullcontext(sock)
@@ -1184,11 +1515,17 @@ def tcp(
         cm = _make_socket(af, socket.SOCK_STREAM, source)
     with cm as s:
         if not sock:
+            if trace:
+                trace(TracePhase.SOCKET, time.perf_counter())
             # pylint: disable=possibly-used-before-assignment
             _connect(s, destination, expiration)  # pyright: ignore
+            if trace:
+                trace(TracePhase.CONNECTED, time.perf_counter())
         send_tcp(s, wire, expiration)
+        if trace:
+            trace(TracePhase.SENT, time.perf_counter())
         (r, received_time) = receive_tcp(
-            s, expiration, one_rr_per_rrset, q.keyring, q.mac, ignore_trailing
+            s, expiration, one_rr_per_rrset, q.keyring, q.mac, ignore_trailing, trace
         )
         r.time = received_time - begin_time
         if not q.is_response(r):
@@ -1233,7 +1570,7 @@ def _make_dot_ssl_context(
 
 
 def tls(
-    q: dns.message.Message,
+    q: Union[dns.message.Message, dns.message.QueryTemplate],
     where: str,
     timeout: Optional[float] = None,
     port: int = 853,
@@ -1245,10 +1582,12 @@ def tls(
     ssl_context: Optional[ssl.SSLContext] = None,
     server_hostname: Optional[str] = None,
     verify: Union[bool, str] = True,
+    trace: Optional[TraceCallback] = None,
 ) -> dns.message.Message:
     """Return the response obtained after sending a query via TLS.
 
-    *q*, a ``dns.message.Message``, the query to send
+    *q*, a ``dns.message.Message`` or ``dns.message.QueryTemplate``, the query to
+    send
 
     *where*, a ``str`` containing an IPv4 or IPv6 address,  where
     to send the message.
@@ -1289,6 +1628,10 @@ def tls(
     verification is done; if a `str` then it specifies the path to a certificate file or
     directory which will be used for verification.
 
+    *trace*, a callable or ``None``.  If not ``None``, it is called with a
+    ``dns.query.TracePhase`` and the value of ``time.perf_counter()`` as each
+    phase of the query is reached.
+
     Returns a ``dns.message.Message``.
 
     """
@@ -1307,9 +1650,13 @@ def tls(
             one_rr_per_rrset,
             ignore_trailing,
             sock,
+            trace,
         )
 
-    wire = q.to_wire()
+    if trace:
+        trace(TracePhase.START, time.perf_counter())
+
+    (q, wire) = _query_and_wire(q)
     (begin_time, expiration) = _compute_times(timeout)
     (af, destination, source) = _destination_and_source(
         where, port, source, source_port
@@ -1324,11 +1671,19 @@ def tls(
         ssl_context=ssl_context,
         server_hostname=server_hostname,
     ) as s:
+        if trace:
+            trace(TracePhase.SOCKET, time.perf_counter())
         _connect(s, destination, expiration)
+        if trace:
+            trace(TracePhase.CONNECTED, time.perf_counter())
         _tls_handshake(s, expiration)
+        if trace:
+            trace(TracePhase.HANDSHAKE, time.perf_counter())
         send_tcp(s, wire, expiration)
+        if trace:
+            trace(TracePhase.SENT, time.perf_counter())
         (r, received_time) = receive_tcp(
-            s, expiration, one_rr_per_rrset, q.keyring, q.mac, ignore_trailing
+            s, expiration, one_rr_per_rrset, q.keyring, q.mac, ignore_trailing, trace
         )
         r.time = received_time - begin_time
         if not q.is_response(r):
@@ -1340,7 +1695,7 @@ def tls(
 
 
 def quic(
-    q: dns.message.Message,
+    q: Union[dns.message.Message, dns.message.QueryTemplate],
     where: str,
     timeout: Optional[float] = None,
     port: int = 853,
@@ -1352,10 +1707,12 @@ def quic(
     verify: Union[bool, str] = True,
     hostname: Optional[str] = None,
     server_hostname: Optional[str] = None,
+    trace: Optional[TraceCallback] = None,
 ) -> dns.message.Message:
     """Return the response obtained after sending a query via DNS-over-QUIC.
 
-    *q*, a ``dns.message.Message``, the query to send.
+    *q*, a ``dns.message.Message`` or ``dns.message.QueryTemplate``, the query to
+    send.
 
     *where*, a ``str``, the nameserver IP address.
 
@@ -1391,17 +1748,22 @@ def quic(
     *server_hostname*, a ``str`` or ``None``.  This item is for backwards compatibility
     only, and has the same meaning as *hostname*.
 
+    *trace*, a callable or ``None``.  If not ``None``, it is called with a
+    ``dns.query.TracePhase`` and the value of ``time.perf_counter()`` as each
+    phase of the query is reached.
+
     Returns a ``dns.message.Message``.
     """
 
     if not dns.quic.have_quic:
         raise NoDOQ("DNS-over-QUIC is not available.")  # pragma: no cover
 
+    if trace:
+        trace(TracePhase.START, time.perf_counter())
     if server_hostname is not None and hostname is None:
         hostname = server_hostname
 
-    q.id = 0
-    wire = q.to_wire()
+    (q, wire) = _query_and_wire(q, 0)
     the_connection: dns.quic.SyncQuicConnection
     the_manager: dns.quic.SyncQuicManager
     if connection:
@@ -1420,8 +1782,14 @@ def quic(
             )
         (start, expiration) = _compute_times(timeout)
         with the_connection.make_stream(timeout) as stream:  # pyright: ignore
+            if trace:
+                trace(TracePhase.HANDSHAKE, time.perf_counter())
             stream.send(wire, True)
+            if trace:
+                trace(TracePhase.SENT, time.perf_counter())
             wire = stream.receive(_remaining(expiration))
+            if trace:
+                trace(TracePhase.RECEIVED, time.perf_counter())
         finish = time.time()
     r = dns.message.from_wire(
         wire,
@@ -1430,6 +1798,8 @@ def quic(
         one_rr_per_rrset=one_rr_per_rrset,
         ignore_trailing=ignore_trailing,
     )
+    if trace:
+        trace(TracePhase.PARSED, time.perf_counter())
     r.time = max(finish - start, 0.0)
     if not q.is_response(r):
         raise BadResponse
@@ -47,6 +47,9 @@ _chunksize = 32
 # tested with it.
 _allow_relative_comparisons = True
 
+# The Rdata slots which cache values computed from the others.
+_cached_slots = frozenset(("_canonical", "_digestable", "_hash"))
+
 
 class NoRelativeRdataOrdering(dns.exception.DNSException):
     """An attempt was made to do an ordered comparison of one or more
@@ -130,7 +133,9 @@ _constify = dns.immutable.constify
 class Rdata:
     """Base class for all DNS rdata types."""
 
-    __slots__ = ["rdclass", "rdtype", "rdcomment"]
+    # _canonical, _digestable, and _hash are computed when first needed and are
+    # not pickled.
+    __slots__ = ["rdclass", "rdtype", "rdcomment", "_canonical", "_digestable", "_hash"]
 
     def __init__(self, rdclass, rdtype):
         """Initialize an rdata.
@@ -160,6 +165,8 @@ class Rdata:
         # attributes, and would compare badly.
         state = {}
         for slot in self._get_all_slots():
+            if slot in _cached_slots:
+                continue
             state[slot] = getattr(self, slot)
         return state
 
@@ -254,10 +261,37 @@ class Rdata:
 
         Returns a ``bytes``.
         """
-        wire = self.to_wire(origin=origin, canonicalize=True)
-        assert wire is not None  # for mypy
+        (wire, relative) = self._canonical_form()
+        if relative and origin != dns.name.root:
+            if origin is None:
+                raise dns.name.NeedAbsoluteNameOrOrigin
+            # Remember the form for the last origin, as rdata in a zone are
+            # relative to the zone's origin.
+            digestable = getattr(self, "_digestable", None)
+            if digestable is not None and digestable[0] == origin:
+                return digestable[1]
+            wire = self.to_wire(origin=origin, canonicalize=True)
+            assert wire is not None  # for mypy
+            object.__setattr__(self, "_digestable", (origin, wire))
         return wire
 
+    def _canonical_form(self) -> Tuple[bytes, bool]:
+        # Return the digestable form of the rdata, with any relative names made
+        # relative to the root, and whether there were any relative names.  As
+        # rdata are immutable, this is computed once and remembered.
+        canonical = getattr(self, "_canonical", None)
+        if canonical is None:
+            try:
+                wire = self.to_wire(canonicalize=True)
+                relative = False
+            except dns.name.NeedAbsoluteNameOrOrigin:
+                wire = self.to_wire(origin=dns.name.root, canonicalize=True)
+                relative = True
+            assert wire is not None  # for mypy
+            canonical = (wire, relative)
+            object.__setattr__(self, "_canonical", canonical)
+        return canonical
+
     def __repr__(self):
         covers = self.covers()
         if covers == dns.rdatatype.NONE:
@@ -294,23 +328,8 @@ class Rdata:
             In the future, all ordering comparisons for rdata with
             relative names will be disallowed.
         """
-        # the next two lines are for type checkers, so they are bound
-        our = b""
-        their = b""
-        try:
-            our = self.to_digestable()
-            our_relative = False
-        except dns.name.NeedAbsoluteNameOrOrigin:
-            if _allow_relative_comparisons:
-                our = self.to_digestable(dns.name.root)
-            our_relative = True
-        try:
-            their = other.to_digestable()
-            their_relative = False
-        except dns.name.NeedAbsoluteNameOrOrigin:
-            if _allow_relative_comparisons:
-                their = other.to_digestable(dns.name.root)
-            their_relative = True
+        (our, our_relative) = self._canonical_form()
+        (their, their_relative) = other._canonical_form()
         if _allow_relative_comparisons:
             if our_relative != their_relative:
                 # For the purpose of comparison, all rdata with at least one
@@ -333,21 +352,7 @@ class Rdata:
             return False
         if self.rdclass != other.rdclass or self.rdtype != other.rdtype:
             return False
-        our_relative = False
-        their_relative = False
-        try:
-            our = self.to_digestable()
-        except dns.name.NeedAbsoluteNameOrOrigin:
-            our = self.to_digestable(dns.name.root)
-            our_relative = True
-        try:
-            their = other.to_digestable()
-        except dns.name.NeedAbsoluteNameOrOrigin:
-            their = other.to_digestable(dns.name.root)
-            their_relative = True
-        if our_relative != their_relative:
-            return False
-        return our == their
+        return self._canonical_form() == other._canonical_form()
 
     def __ne__(self, other):
         if not isinstance(other, Rdata):
@@ -393,7 +398,11 @@ class Rdata:
         return self._cmp(other) > 0
 
     def __hash__(self):
-        return hash(self.to_digestable(dns.name.root))
+        h = getattr(self, "_hash", None)
+        if h is None:
+            h = hash(self._canonical_form()[0])
+            object.__setattr__(self, "_hash", h)
+        return h
 
     @classmethod
     def from_text(
@@ -77,6 +77,10 @@ class Renderer:
         r.add_tsig(keyname, secret, 300, 1, 0, '', request_mac)
         wire = r.get_wire()
 
+    A renderer may be used for another message after calling reset(),
+    which saves reallocating its output buffer when many messages are
+    rendered, e.g. by a server.
+
     If padding is going to be used, then the OPT record MUST be
     written after everything else in the additional section except for
     the TSIG (if any).
@@ -104,19 +108,30 @@ class Renderer:
         """Initialize a new renderer."""
 
         self.output = io.BytesIO()
+        self.max_size = max_size
+        self.origin = origin
+        self.reserved = 0
+        self.reset(id, flags)
+
+    def reset(self, id=None, flags=0):
+        """Discard everything rendered so far, and start a new message with
+        the specified id and flags.
+
+        The maximum size, origin, and any reserved space are kept.
+        """
+
         if id is None:
             self.id = random.randint(0, 65535)
         else:
             self.id = id
         self.flags = flags
-        self.max_size = max_size
-        self.origin = origin
         self.compress = {}
         self.section = QUESTION
         self.counts = [0, 0, 0, 0]
+        self.output.seek(0)
         self.output.write(b"\x00" * 12)
+        self.output.truncate()
         self.mac = ""
-        self.reserved = 0
         self.was_padded = False
 
     def _rollback(self, where):
@@ -127,12 +142,13 @@ class Renderer:
 
         self.output.seek(where)
         self.output.truncate()
-        keys_to_delete = []
-        for k, v in self.compress.items():
-            if v >= where:
-                keys_to_delete.append(k)
-        for k in keys_to_delete:
-            del self.compress[k]
+        # Entries are added to the compression table as the output grows, so
+        # the ones to remove are the most recently added.
+        while self.compress:
+            (k, v) = self.compress.popitem()
+            if v < where:
+                self.compress[k] = v
+                break
 
     def _set_section(self, section):
         """Set the renderer's current section.
@@ -175,6 +191,32 @@ class Renderer:
             self.output.write(struct.pack("!HH", rdtype, rdclass))
         self.counts[QUESTION] += 1
 
+    def add_question_wire(self, qname, wire):
+        """Add a question which is already in wire format, e.g. one copied
+        from a query, to the message.
+
+        qname: the absolute name of the question
+
+        wire: the wire format of the question, i.e. qname uncompressed,
+        followed by the type and class
+
+        The name is added to the compression table just as add_question()
+        would add it, so later names are compressed against it.
+        """
+
+        self._set_section(QUESTION)
+        with self._track_size() as start:
+            self.output.write(wire)
+        labels = qname.labels
+        keys = qname._canonical_labels()
+        pos = start
+        for i in range(len(labels) - 1):
+            if pos > 0x3FFF:
+                break
+            self.compress.setdefault(keys[i:], pos)
+            pos += len(labels[i]) + 1
+        self.counts[QUESTION] += 1
+
     def add_rrset(self, section, rrset, **kw):
         """Add the rrset to the specified section.
 
@@ -187,6 +229,26 @@ class Renderer:
             n = rrset.to_wire(self.output, self.compress, self.origin, **kw)
         self.counts[section] += n
 
+    def add_rrsets(self, section, rrsets, **kw):
+        """Add as many of the rrsets as fit to the specified section, in
+        order, stopping at the first one which does not fit.
+
+        Any keyword arguments are passed on to the rdataset's to_wire()
+        routine.
+
+        Returns the number of rrsets added.  If it is less than the number
+        of rrsets, the caller will typically set the TC flag.
+        """
+
+        added = 0
+        for rrset in rrsets:
+            try:
+                self.add_rrset(section, rrset, **kw)
+            except dns.exception.TooBig:
+                break
+            added += 1
+        return added
+
     def add_rdataset(self, section, name, rdataset, **kw):
         """Add the rdataset to the specified section, using the specified
         name as the owner name.
@@ -24,7 +24,18 @@ import sys
 import threading
 import time
 import warnings
-from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union, cast
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+    cast,
+)
 from urllib.parse import urlparse
 
 import dns._ddr
@@ -627,6 +638,118 @@ class LRUCache(CacheBase):
                 self.data = {}
 
 
+class RetryPolicy:
+    """How the resolver retries when its nameservers do not answer.
+
+    The resolver sends the query to each of its nameservers in turn.  When it
+    has tried all of them without getting an answer, it waits and then starts
+    another round.  The wait before round *n* (where the second round is round
+    1) is *initial_backoff* multiplied by *multiplier* to the power *n - 1*,
+    capped at *max_backoff*.  If *jitter* is not zero, each wait is multiplied
+    by a random factor between ``1 - jitter`` and ``1 + jitter``, so that many
+    clients which failed at the same time do not retry in lockstep.
+
+    *max_attempts*, an ``int`` or ``None``, is the number of queries that may be
+    sent for each name before the resolver gives up with
+    ``dns.resolver.NoNameservers``.  If ``None``, only the lifetime limits
+    retries.  Retrying over TCP after a truncated UDP response does not count.
+
+    *retry_rcodes*, a set of ``dns.rcode.Rcode``, are the response codes after
+    which a nameserver is kept and asked again in the next round.  A nameserver
+    which answers with any other unhappy response code is not asked again.  The
+    resolver's ``retry_servfail`` attribute also keeps nameservers which answer
+    ``SERVFAIL``.
+    """
+
+    def __init__(
+        self,
+        initial_backoff: float = 0.10,
+        max_backoff: float = 2.0,
+        multiplier: float = 2.0,
+        jitter: float = 0.0,
+        max_attempts: Optional[int] = None,
+        retry_rcodes: Optional[Set[dns.rcode.Rcode]] = None,
+    ) -> None:
+        if initial_backoff < 0 or max_backoff < 0:
+            raise ValueError("backoff must not be negative")
+        if multiplier < 1:
+            raise ValueError("multiplier must be at least 1")
+        if jitter < 0 or jitter > 1:
+            raise ValueError("jitter must be between 0 and 1")
+        if max_attempts is not None and max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.max_attempts = max_attempts
+        self.retry_rcodes = frozenset(retry_rcodes or ())
+
+    @classmethod
+    def lan(cls) -> "RetryPolicy":
+        """Return a policy for nameservers on a low latency local network.
+
+        Retries start after 5 milliseconds and back off to at most 100
+        milliseconds, with 20% jitter, and ``SERVFAIL`` is retried as it is
+        often transient on a busy local resolver.
+        """
+        return cls(
+            initial_backoff=0.005,
+            max_backoff=0.1,
+            multiplier=2.0,
+            jitter=0.2,
+            retry_rcodes={dns.rcode.SERVFAIL},
+        )
+
+    @classmethod
+    def wan(cls) -> "RetryPolicy":
+        """Return a conservative policy for nameservers across a wide area
+        network.
+
+        Retries start after 250 milliseconds and back off by a factor of 3 to at
+        most 5 seconds, with 25% jitter, and at most 6 queries are sent for each
+        name.
+        """
+        return cls(
+            initial_backoff=0.25,
+            max_backoff=5.0,
+            multiplier=3.0,
+            jitter=0.25,
+            max_attempts=6,
+        )
+
+    def backoff(self, round_number: int) -> float:
+        """Return the number of seconds to wait before retry round *round_number*,
+        where the first retry round is 1.
+        """
+        if round_number < 1:
+            return 0.0
+        backoff = min(
+            self.initial_backoff * self.multiplier ** (round_number - 1),
+            self.max_backoff,
+        )
+        if self.jitter:
+            backoff *= random.uniform(1.0 - self.jitter, 1.0 + self.jitter)
+        return backoff
+
+    def retry_rcode(self, rcode: dns.rcode.Rcode) -> bool:
+        """Should a nameserver which answered with *rcode* be asked again?"""
+        return rcode in self.retry_rcodes
+
+
+# The policy used when the resolver does not specify one.
+_default_retry_policy = RetryPolicy()
+
+
+Request = Union[dns.message.QueryMessage, dns.message.QueryTemplate]
+
+
+def _query_of(request: Request) -> dns.message.QueryMessage:
+    if isinstance(request, dns.message.QueryTemplate):
+        return request.query
+    return request
+
+
 class _Resolution:
     """Helper class for dns.resolver.Resolver.resolve().
 
@@ -674,7 +797,75 @@ class _Resolution:
         self.tcp_attempt = False
         self.retry_with_tcp = False
         self.request: Optional[dns.message.QueryMessage] = None
-        self.backoff = 0.0
+        self.base_request: Optional[Request] = None
+        self.nameserver_request: Optional[Request] = None
+        self.retry_policy = resolver.retry_policy or _default_retry_policy
+        self.round = 0
+        self.attempts = 0
+        self.cookie_retries: List[dns.nameserver.Nameserver] = []
+
+    def _make_request(self, edns: int, payload: int) -> Request:
+        if self.resolver.query_templates:
+            return self.resolver._get_query_template(
+                self.qname, self.rdtype, self.rdclass, edns, payload
+            )
+        return self.resolver._make_query(
+            self.qname, self.rdtype, self.rdclass, edns, payload
+        )
+
+    def _capability_key(self) -> Optional[dns.nameserver.CapabilityKey]:
+        # Return the capability cache key of the current nameserver, or None
+        # if capabilities are not being tracked for it.
+        assert self.nameserver is not None
+        if self.resolver.capabilities is None or self.nameserver.is_always_max_size():
+            return None
+        return (self.nameserver.answer_nameserver(), self.nameserver.answer_port())
+
+    def _cookie_key(self) -> Optional[dns.nameserver.CapabilityKey]:
+        # Return the cookie jar key of the current nameserver, or None if the
+        # resolver is not sending cookies to it.  Nameservers with a jar of
+        # their own manage their cookies themselves.
+        assert self.nameserver is not None
+        if (
+            self.resolver.cookies is None
+            or not isinstance(self.nameserver, dns.nameserver.Do53Nameserver)
+            or self.nameserver.cookies is not None
+        ):
+            return None
+        return (self.nameserver.address, self.nameserver.port)
+
+    def _request_for_nameserver(self, tcp: bool) -> Request:
+        # Return the request to send to the current nameserver, with the EDNS
+        # settings adjusted to what we know about the server and its cookie
+        # attached.
+        request = self._edns_request_for_nameserver(tcp)
+        key = self._cookie_key()
+        if key is not None:
+            # Cookies differ for each server, so the shared request is copied.
+            cookie_request = self.resolver.cookies.attach(key, request)
+            if cookie_request is not None:
+                request = cookie_request
+        return request
+
+    def _edns_request_for_nameserver(self, tcp: bool) -> Request:
+        # Return the request to send to the current nameserver, adjusting the
+        # EDNS settings to what we know about the server.
+        assert self.request is not None and self.base_request is not None
+        key = self._capability_key()
+        if key is None or self.request.edns < 0:
+            return self.base_request
+        caps = self.resolver.capabilities.get(key)
+        if caps is None:
+            return self.base_request
+        edns = self.request.edns
+        payload = self.request.payload
+        if caps.edns is False:
+            edns = -1
+        elif not tcp and caps.payload is not None and payload > caps.payload:
+            payload = caps.payload
+        if edns == self.request.edns and payload == self.request.payload:
+            return self.base_request
+        return self._make_request(edns, payload)
 
     def next_request(
         self,
@@ -711,21 +902,7 @@ class _Resolution:
                     continue
 
             # Build the request
-            request = dns.message.make_query(self.qname, self.rdtype, self.rdclass)
-            if self.resolver.keyname is not None:
-                request.use_tsig(
-                    self.resolver.keyring,
-                    self.resolver.keyname,
-                    algorithm=self.resolver.keyalgorithm,
-                )
-            request.use_edns(
-                self.resolver.edns,
-                self.resolver.ednsflags,
-                self.resolver.payload,
-                options=self.resolver.ednsoptions,
-            )
-            if self.resolver.flags is not None:
-                request.flags = self.resolver.flags
+            request = self._make_request(self.resolver.edns, self.resolver.payload)
 
             self.nameservers = self.resolver._enrich_nameservers(
                 self.resolver._nameservers,
@@ -739,10 +916,14 @@ class _Resolution:
             self.nameserver = None
             self.tcp_attempt = False
             self.retry_with_tcp = False
-            self.request = request
-            self.backoff = 0.10
+            self.request = _query_of(request)
+            self.base_request = request
+            self.nameserver_request = request
+            self.round = 0
+            self.attempts = 0
+            self.cookie_retries = []
 
-            return (request, None)
+            return (self.request, None)
 
         #
         # We've tried everything and only gotten NXDOMAINs.  (We know
@@ -757,19 +938,30 @@ class _Resolution:
             assert not self.nameserver.is_always_max_size()
             self.tcp_attempt = True
             self.retry_with_tcp = False
+            self.nameserver_request = self._request_for_nameserver(True)
             return (self.nameserver, True, 0)
 
         backoff = 0.0
+        max_attempts = self.retry_policy.max_attempts
+        if max_attempts is not None and self.attempts >= max_attempts:
+            raise NoNameservers(request=self.request, errors=self.errors)
         if not self.current_nameservers:
             if len(self.nameservers) == 0:
                 # Out of things to try!
                 raise NoNameservers(request=self.request, errors=self.errors)
             self.current_nameservers = self.nameservers[:]
-            backoff = self.backoff
-            self.backoff = min(self.backoff * 2, 2)
+            self.round += 1
+            backoff = self.retry_policy.backoff(self.round)
+        self.attempts += 1
 
         self.nameserver = self.current_nameservers.pop(0)
         self.tcp_attempt = self.tcp or self.nameserver.is_always_max_size()
+        key = self._capability_key()
+        if key is not None and not self.tcp_attempt:
+            caps = self.resolver.capabilities.get(key)
+            if caps is not None and caps.tcp_only:
+                self.tcp_attempt = True
+        self.nameserver_request = self._request_for_nameserver(self.tcp_attempt)
         return (self.nameserver, self.tcp_attempt, backoff)
 
     def query_result(
@@ -805,11 +997,81 @@ class _Resolution:
                     self.nameservers.remove(self.nameserver)
                 else:
                     self.retry_with_tcp = True
+                    key = self._capability_key()
+                    if key is not None:
+                        self.resolver.capabilities.note_truncation(key)
+            elif isinstance(ex, dns.exception.Timeout) and not self.tcp_attempt:
+                key = self._capability_key()
+                assert self.nameserver_request is not None
+                request = _query_of(self.nameserver_request)
+                if key is not None and request.edns >= 0:
+                    self.resolver.capabilities.note_timeout(key, request.payload)
             return (None, False)
         # We got an answer!
         assert response is not None
         assert isinstance(response, dns.message.QueryMessage)
         rcode = response.rcode()
+        cookie_key = self._cookie_key()
+        if cookie_key is not None:
+            assert self.nameserver_request is not None
+            if _query_of(self.nameserver_request).edns >= 0:
+                if not self.resolver.cookies.note_response(cookie_key, response):
+                    # The client cookie is not ours, so the response is not an
+                    # answer to our query.
+                    self.errors.append(
+                        (
+                            str(self.nameserver),
+                            self.tcp_attempt,
+                            self.nameserver.answer_port(),
+                            dns.query.BadResponse(),
+                            response,
+                        )
+                    )
+                    return (None, False)
+                if (
+                    rcode == dns.rcode.BADCOOKIE
+                    and self.nameserver not in self.cookie_retries
+                ):
+                    # We now have the server's cookie, so ask it again right away.
+                    self.cookie_retries.append(self.nameserver)
+                    self.errors.append(
+                        (
+                            str(self.nameserver),
+                            self.tcp_attempt,
+                            self.nameserver.answer_port(),
+                            dns.rcode.to_text(rcode),
+                            response,
+                        )
+                    )
+                    self.current_nameservers.insert(0, self.nameserver)
+                    return (None, False)
+        key = self._capability_key()
+        if key is not None:
+            assert self.nameserver_request is not None
+            if (
+                _query_of(self.nameserver_request).edns >= 0
+                and response.opt is None
+                and rcode in (dns.rcode.FORMERR, dns.rcode.NOTIMP)
+            ):
+                # The server does not understand EDNS (RFC 6891 section 7).
+                # Remember that, and try it again right away without EDNS.  A
+                # SERVFAIL may well be transient, so it is not taken as a sign.
+                self.resolver.capabilities.note_no_edns(key)
+                self.errors.append(
+                    (
+                        str(self.nameserver),
+                        self.tcp_attempt,
+                        self.nameserver.answer_port(),
+                        dns.rcode.to_text(rcode),
+                        response,
+                    )
+                )
+                self.current_nameservers.insert(0, self.nameserver)
+                return (None, False)
+            if not self.tcp_attempt:
+                self.resolver.capabilities.note_udp_response(
+                    key, response.opt is not None
+                )
         if rcode == dns.rcode.NOERROR:
             try:
                 answer = Answer(
@@ -883,7 +1145,10 @@ class _Resolution:
             # We got a response, but we're not happy with the
             # rcode in it.
             #
-            if rcode != dns.rcode.SERVFAIL or not self.resolver.retry_servfail:
+            if not (
+                self.retry_policy.retry_rcode(rcode)
+                or (rcode == dns.rcode.SERVFAIL and self.resolver.retry_servfail)
+            ):
                 self.nameservers.remove(self.nameserver)
             self.errors.append(
                 (
@@ -897,6 +1162,10 @@ class _Resolution:
             return (None, False)
 
 
+# The maximum number of query templates a resolver keeps.
+_MAX_QUERY_TEMPLATES = 1000
+
+
 class BaseResolver:
     """DNS stub resolver."""
 
@@ -921,6 +1190,12 @@ class BaseResolver:
     cache: Any
     flags: Optional[int]
     retry_servfail: bool
+    retry_policy: Optional[RetryPolicy]
+    capabilities: Optional[dns.nameserver.CapabilityCache]
+    rate_limiter: Optional[dns.nameserver.RateLimiter]
+    cookies: Optional[dns.nameserver.CookieJar]
+    query_templates: bool
+    _query_templates: Dict[Any, dns.message.QueryTemplate]
     rotate: bool
     ndots: Optional[int]
     _nameservers: Sequence[Union[str, dns.nameserver.Nameserver]]
@@ -969,9 +1244,69 @@ class BaseResolver:
         self.cache = None
         self.flags = None
         self.retry_servfail = False
+        self.retry_policy = None
+        self.capabilities = None
+        self.rate_limiter = None
+        self.cookies = None
+        self.query_templates = False
+        self._query_templates = {}
+        self._query_templates_lock = threading.Lock()
         self.rotate = False
         self.ndots = None
 
+    def _make_query(
+        self,
+        qname: dns.name.Name,
+        rdtype: dns.rdatatype.RdataType,
+        rdclass: dns.rdataclass.RdataClass,
+        edns: int,
+        payload: int,
+    ) -> dns.message.QueryMessage:
+        request = dns.message.make_query(qname, rdtype, rdclass)
+        if self.keyname is not None:
+            request.use_tsig(self.keyring, self.keyname, algorithm=self.keyalgorithm)
+        request.use_edns(edns, self.ednsflags, payload, options=self.ednsoptions)
+        if self.flags is not None:
+            request.flags = self.flags
+        return request
+
+    def _get_query_template(
+        self,
+        qname: dns.name.Name,
+        rdtype: dns.rdatatype.RdataType,
+        rdclass: dns.rdataclass.RdataClass,
+        edns: int,
+        payload: int,
+    ) -> dns.message.QueryTemplate:
+        # The key covers every setting used by _make_query(), so changing
+        # the resolver configuration just makes new templates.
+        key = (
+            qname,
+            rdtype,
+            rdclass,
+            edns,
+            payload,
+            self.ednsflags,
+            tuple(option.to_wire() for option in self.ednsoptions or ()),
+            self.flags,
+            self.keyname,
+            self.keyalgorithm,
+            id(self.keyring),
+        )
+        with self._query_templates_lock:
+            template = self._query_templates.get(key)
+            if template is not None:
+                return template
+        template = dns.message.QueryTemplate(
+            self._make_query(qname, rdtype, rdclass, edns, payload)
+        )
+        with self._query_templates_lock:
+            if len(self._query_templates) >= _MAX_QUERY_TEMPLATES:
+                # Forget the oldest template.
+                del self._query_templates[next(iter(self._query_templates))]
+            self._query_templates[key] = template
+        return template
+
     def read_resolv_conf(self, f: Any) -> None:
         """Process *f* as a file in the /etc/resolv.conf format.  If f is
         a ``str``, it is used as the name of the file to open; otherwise it
@@ -1078,6 +1413,18 @@ class BaseResolver:
             raise LifetimeTimeout(timeout=duration, errors=errors)
         return min(lifetime - duration, self.timeout)
 
+    def _rate_limit_wait(
+        self,
+        nameserver: dns.nameserver.Nameserver,
+        start: float,
+        lifetime: Optional[float] = None,
+    ) -> Tuple[dns.nameserver.CapabilityKey, float]:
+        # Return the rate limiter key for *nameserver*, and how long we may
+        # wait for it without exceeding the lifetime.
+        lifetime = self.lifetime if lifetime is None else lifetime
+        key = (nameserver.answer_nameserver(), nameserver.answer_port())
+        return (key, max(lifetime - (time.time() - start), 0.0))
+
     def _get_qnames_to_try(
         self, qname: dns.name.Name, search: Optional[bool]
     ) -> List[dns.name.Name]:
@@ -1320,9 +1667,20 @@ class Resolver(BaseResolver):
                 if backoff:
                     time.sleep(backoff)
                 timeout = self._compute_timeout(start, lifetime, resolution.errors)
+                limiter = self.rate_limiter
+                if limiter is not None:
+                    # Wait for the nameserver to have capacity for another query.
+                    (key, wait) = self._rate_limit_wait(nameserver, start, lifetime)
+                    waited = limiter.acquire(key, wait)
+                    if waited is None:
+                        raise LifetimeTimeout(
+                            timeout=time.time() - start, errors=resolution.errors
+                        )
+                    timeout = min(timeout, wait - waited)
+                assert resolution.nameserver_request is not None
                 try:
                     response = nameserver.query(
-                        request,
+                        resolution.nameserver_request,
                         timeout=timeout,
                         source=source,
                         source_port=source_port,
@@ -1331,6 +1689,9 @@ class Resolver(BaseResolver):
                 except Exception as ex:
                     (_, done) = resolution.query_result(None, ex)
                     continue
+                finally:
+                    if limiter is not None:
+                        limiter.release(key)  # pyright: ignore
                 (answer, done) = resolution.query_result(response, None)
                 # Note we need to say "if answer is not None" and not just
                 # "if answer" because answer implements __len__, and python
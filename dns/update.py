@@ -99,7 +99,7 @@ class UpdateMessage(dns.message.Message):  # lgtm[py/missing-equals]
 
     @zone.setter
     def zone(self, v):
-        self.sections[0] = v
+        self._set_section(0, v)
 
     @property
     def prerequisite(self) -> List[dns.rrset.RRset]:
@@ -108,7 +108,7 @@ class UpdateMessage(dns.message.Message):  # lgtm[py/missing-equals]
 
     @prerequisite.setter
     def prerequisite(self, v):
-        self.sections[1] = v
+        self._set_section(1, v)
 
     @property
     def update(self) -> List[dns.rrset.RRset]:
@@ -117,7 +117,7 @@ class UpdateMessage(dns.message.Message):  # lgtm[py/missing-equals]
 
     @update.setter
     def update(self, v):
-        self.sections[2] = v
+        self._set_section(2, v)
 
     def _add_rr(self, name, ttl, rd, deleting=None, section=None):
         """Add a single RR to the update section."""
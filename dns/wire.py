@@ -2,54 +2,83 @@
 
 import contextlib
 import struct
-from typing import Iterator, Optional, Tuple
+from typing import Dict, Iterator, Optional, Tuple, Union
 
 import dns.exception
 import dns.name
 
 
+_uint16 = struct.Struct("!H")
+_uint32 = struct.Struct("!I")
+
+
 class Parser:
-    def __init__(self, wire: bytes, current: int = 0):
+    def __init__(self, wire: Union[bytes, bytearray, memoryview], current: int = 0):
+        # The wire may be any bytes-like object, e.g. a receive buffer or an
+        # mmap, and is not copied.  Integers are decoded in place, and only
+        # the fields returned by get_bytes() and the like are copied into
+        # bytes.
+        if isinstance(wire, memoryview) and wire.format != "B":
+            wire = wire.cast("B")
         self.wire = wire
         self.current = 0
         self.end = len(self.wire)
         if current:
             self.seek(current)
         self.furthest = current
+        # Names already decoded from this wire, indexed by the offset they start
+        # at, so that compression pointers to the same offset are only followed
+        # once.
+        self.names: Dict[int, "dns.name.Name"] = {}
 
     def remaining(self) -> int:
         return self.end - self.current
 
+    def _advance(self, size: int) -> int:
+        # Move past the next *size* octets, returning where they start.
+        start = self.current
+        end = start + size
+        if end > self.end:
+            raise dns.exception.FormError
+        self.current = end
+        if end > self.furthest:
+            self.furthest = end
+        return start
+
     def get_bytes(self, size: int) -> bytes:
         assert size >= 0
-        if size > self.remaining():
-            raise dns.exception.FormError
-        output = self.wire[self.current : self.current + size]
-        self.current += size
-        self.furthest = max(self.furthest, self.current)
+        start = self._advance(size)
+        output = self.wire[start : start + size]
+        if not isinstance(output, bytes):
+            output = bytes(output)
         return output
 
     def get_counted_bytes(self, length_size: int = 1) -> bytes:
-        length = int.from_bytes(self.get_bytes(length_size), "big")
+        if length_size == 1:
+            length = self.get_uint8()
+        else:
+            length = int.from_bytes(self.get_bytes(length_size), "big")
         return self.get_bytes(length)
 
     def get_remaining(self) -> bytes:
         return self.get_bytes(self.remaining())
 
     def get_uint8(self) -> int:
-        return struct.unpack("!B", self.get_bytes(1))[0]
+        return self.wire[self._advance(1)]
 
     def get_uint16(self) -> int:
-        return struct.unpack("!H", self.get_bytes(2))[0]
+        return _uint16.unpack_from(self.wire, self._advance(2))[0]
 
     def get_uint32(self) -> int:
-        return struct.unpack("!I", self.get_bytes(4))[0]
+        return _uint32.unpack_from(self.wire, self._advance(4))[0]
 
     def get_uint48(self) -> int:
         return int.from_bytes(self.get_bytes(6), "big")
 
     def get_struct(self, format: str) -> Tuple:
-        return struct.unpack(format, self.get_bytes(struct.calcsize(format)))
+        return struct.unpack_from(
+            format, self.wire, self._advance(struct.calcsize(format))
+        )
 
     def get_name(self, origin: Optional["dns.name.Name"] = None) -> "dns.name.Name":
         name = dns.name.from_wire_parser(self)
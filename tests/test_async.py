@@ -21,9 +21,12 @@ import socket
 import time
 import unittest
 
+import dns._asyncio_backend
+import dns._features
 import dns.asyncbackend
 import dns.asyncquery
 import dns.asyncresolver
+import dns.exception
 import dns.message
 import dns.name
 import dns.query
@@ -32,8 +35,20 @@ import dns.rcode
 import dns.rdataclass
 import dns.rdatatype
 import dns.resolver
+import dns.rrset
 import tests.util
 
+try:
+    from .nanonameserver import ConnectionType, Server
+
+    _nanonameserver_available = True
+except ImportError:
+    _nanonameserver_available = False
+
+    class Server:  # type: ignore
+        pass
+
+
 # Some tests require TLS so skip those if it's not there.
 ssl = dns.query.ssl
 try:
@@ -988,3 +1003,240 @@ class IgnoreErrors(unittest.TestCase):
             self.async_run(abad)
 
         self.assertRaises(dns.message.TrailingJunk, bad)
+
+
+class PoolNanoNameserver(Server):
+    def handle(self, request):
+        r = dns.message.make_response(request.message)
+        if request.qname.to_text().startswith("timeout"):
+            return None
+        r.answer.append(dns.rrset.from_text(request.qname, 300, "IN", "A", "10.0.0.1"))
+        return r
+
+
+class ReversingServer:
+    """A TCP server which reads *count* queries on a connection, and then
+    answers them in the reverse order."""
+
+    def __init__(self, count):
+        self.count = count
+        self.connections = 0
+
+    async def serve(self, reader, writer):
+        self.connections += 1
+        queries = []
+        for _ in range(self.count):
+            ldata = await reader.readexactly(2)
+            wire = await reader.readexactly(int.from_bytes(ldata, "big"))
+            queries.append(dns.message.from_wire(wire))
+        for q in reversed(queries):
+            r = dns.message.make_response(q)
+            r.answer.append(
+                dns.rrset.from_text(q.question[0].name, 300, "IN", "A", "10.0.0.2")
+            )
+            writer.write(r.to_wire(prepend_length=True))
+        await writer.drain()
+        writer.close()
+
+
+@unittest.skipIf(not _nanonameserver_available, "nanonameserver required")
+class ConnectionPoolTests(unittest.TestCase):
+    def setUp(self):
+        self.backend = dns.asyncbackend.get_backend("asyncio")
+
+    def async_run(self, afunc):
+        return asyncio.run(afunc())
+
+    def check_response(self, q, r, address="10.0.0.1"):
+        self.assertTrue(q.is_response(r))
+        self.assertEqual(r.answer[0][0].address, address)
+
+    def test_tcp_pipelined(self):
+        async def run(ns):
+            (address, port) = ns.tcp_address
+            queries = [dns.message.make_query(f"q{i}.example.", "A") for i in range(20)]
+            async with dns.asyncquery.ConnectionPool(self.backend) as pool:
+                responses = await asyncio.gather(
+                    *[pool.tcp(q, address, 2, port) for q in queries]
+                )
+                for q, r in zip(queries, responses):
+                    self.check_response(q, r)
+                self.assertEqual(pool.connections(), 1)
+                # The connection is reused by later queries.
+                q = dns.message.make_query("again.example.", "A")
+                self.check_response(q, await pool.tcp(q, address, 2, port))
+                self.assertEqual(pool.connections(), 1)
+            self.assertEqual(pool.connections(), 0)
+
+        with PoolNanoNameserver() as ns:
+            self.async_run(lambda: run(ns))
+
+    @unittest.skipUnless(_ssl_available, "SSL not available")
+    def test_tls(self):
+        async def run(ns):
+            (address, port) = ns.get_address(ConnectionType.DOT)
+            queries = [dns.message.make_query(f"q{i}.example.", "A") for i in range(5)]
+            async with dns.asyncquery.ConnectionPool(
+                self.backend, verify=False
+            ) as pool:
+                responses = await asyncio.gather(
+                    *[pool.tls(q, address, 2, port) for q in queries]
+                )
+                for q, r in zip(queries, responses):
+                    self.check_response(q, r)
+                self.assertEqual(pool.connections(), 1)
+
+        with PoolNanoNameserver() as ns:
+            self.async_run(lambda: run(ns))
+
+    def test_responses_dispatched_by_id(self):
+        async def run():
+            handler = ReversingServer(3)
+            server = await asyncio.start_server(handler.serve, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            # Two of the queries have the same ID, so one must be given a new ID.
+            queries = [
+                dns.message.make_query(f"q{i}.example.", "A", id=i // 2)
+                for i in range(3)
+            ]
+            async with server:
+                async with dns.asyncquery.ConnectionPool(self.backend) as pool:
+                    responses = await asyncio.gather(
+                        *[pool.tcp(q, "127.0.0.1", 2, port) for q in queries]
+                    )
+            self.assertEqual(handler.connections, 1)
+            # The queries are not changed.
+            self.assertEqual([q.id for q in queries], [0, 0, 1])
+            for q, r in zip(queries, responses):
+                self.check_response(q, r, "10.0.0.2")
+                self.assertEqual(r.question, q.question)
+
+        self.async_run(run)
+
+    def test_max_connections(self):
+        async def run():
+            handler = ReversingServer(2)
+            server = await asyncio.start_server(handler.serve, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            queries = [dns.message.make_query(f"q{i}.example.", "A") for i in range(4)]
+            async with server:
+                async with dns.asyncquery.ConnectionPool(
+                    self.backend, max_connections=2, max_in_flight=2
+                ) as pool:
+                    responses = await asyncio.gather(
+                        *[pool.tcp(q, "127.0.0.1", 2, port) for q in queries]
+                    )
+            self.assertEqual(handler.connections, 2)
+            for q, r in zip(queries, responses):
+                self.check_response(q, r, "10.0.0.2")
+
+        self.async_run(run)
+
+    def test_timeout(self):
+        async def run(ns):
+            (address, port) = ns.tcp_address
+            async with dns.asyncquery.ConnectionPool(self.backend) as pool:
+                q = dns.message.make_query("timeout.example.", "A")
+                with self.assertRaises(dns.exception.Timeout):
+                    await pool.tcp(q, address, 0.2, port)
+                # The connection is still usable.
+                q = dns.message.make_query("ok.example.", "A")
+                self.check_response(q, await pool.tcp(q, address, 2, port))
+                self.assertEqual(pool.connections(), 1)
+
+        with PoolNanoNameserver() as ns:
+            self.async_run(lambda: run(ns))
+
+    def test_connection_closed_by_server(self):
+        async def run():
+            handler = ReversingServer(1)
+            server = await asyncio.start_server(handler.serve, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                async with dns.asyncquery.ConnectionPool(self.backend) as pool:
+                    for name in ("a.example.", "b.example."):
+                        q = dns.message.make_query(name, "A")
+                        r = await pool.tcp(q, "127.0.0.1", 2, port)
+                        self.check_response(q, r, "10.0.0.2")
+                        # Let the reader see the server close the connection.
+                        while pool.connections() > 0:
+                            await asyncio.sleep(0.01)
+            self.assertEqual(handler.connections, 2)
+
+        self.async_run(run)
+
+    def test_uses_backend(self):
+        class Backend(dns._asyncio_backend.Backend):
+            def __init__(self):
+                self.calls = []
+
+            def make_lock(self):
+                self.calls.append("lock")
+                return super().make_lock()
+
+            def make_event(self):
+                self.calls.append("event")
+                return super().make_event()
+
+            def task_group(self):
+                self.calls.append("task_group")
+                return super().task_group()
+
+        async def run(ns):
+            (address, port) = ns.tcp_address
+            backend = Backend()
+            async with dns.asyncquery.ConnectionPool(backend) as pool:
+                q = dns.message.make_query("q.example.", "A")
+                self.check_response(q, await pool.tcp(q, address, 2, port))
+            self.assertEqual(backend.calls, ["task_group", "lock", "event"])
+
+        with PoolNanoNameserver() as ns:
+            self.async_run(lambda: run(ns))
+
+    def test_requires_context_manager(self):
+        async def run():
+            pool = dns.asyncquery.ConnectionPool(self.backend)
+            q = dns.message.make_query("example.", "A")
+            with self.assertRaises(RuntimeError):
+                await pool.tcp(q, "127.0.0.1")
+
+        self.async_run(run)
+
+    def test_bad_limits(self):
+        with self.assertRaises(ValueError):
+            dns.asyncquery.ConnectionPool(self.backend, max_connections=0)
+        with self.assertRaises(ValueError):
+            dns.asyncquery.ConnectionPool(self.backend, max_in_flight=0)
+
+
+@unittest.skipIf(
+    not (_nanonameserver_available and dns._features.have("trio")),
+    "nanonameserver and trio required",
+)
+class TrioConnectionPoolTests(unittest.TestCase):
+    def test_tcp_pipelined(self):
+        import trio  # pylint: disable=import-outside-toplevel
+
+        async def run(ns):
+            (address, port) = ns.tcp_address
+            backend = dns.asyncbackend.get_backend("trio")
+            responses = {}
+            async with dns.asyncquery.ConnectionPool(backend) as pool:
+
+                async def one(i):
+                    q = dns.message.make_query(f"q{i}.example.", "A")
+                    r = await pool.tcp(q, address, 2, port)
+                    self.assertTrue(q.is_response(r))
+                    responses[i] = r
+
+                async with trio.open_nursery() as nursery:
+                    for i in range(10):
+                        nursery.start_soon(one, i)
+                self.assertEqual(pool.connections(), 1)
+                with self.assertRaises(dns.exception.Timeout):
+                    q = dns.message.make_query("timeout.example.", "A")
+                    await pool.tcp(q, address, 0.2, port)
+            self.assertEqual(len(responses), 10)
+
+        with PoolNanoNameserver() as ns:
+            trio.run(run, ns)
@@ -17,6 +17,7 @@
 import random
 import socket
 import unittest
+import unittest.mock
 
 import dns.exception
 
@@ -29,10 +30,13 @@ except Exception:
 
 import dns.edns
 import dns.message
+import dns.nameserver
 import dns.query
 import dns.quic
 import dns.rdatatype
 import dns.resolver
+import dns.rrset
+import dns.tsigkeyring
 
 if dns.query._have_httpx:
     import httpx
@@ -260,5 +264,109 @@ class DNSOverHTTP3TestCase(unittest.TestCase):
             self.assertTrue(q.is_response(r))
 
 
+class HTTPCacheTestCase(unittest.TestCase):
+    url = "https://127.0.0.1:443/dns-query"
+
+    def make_response(self, q):
+        r = dns.message.make_response(q)
+        r.answer.append(
+            dns.rrset.from_text(q.question[0].name, 300, "IN", "A", "10.0.0.1")
+        )
+        r.id = 0
+        return r.to_wire()
+
+    def test_freshness(self):
+        freshness = dns.query.HTTPCache.freshness
+        self.assertEqual(freshness("max-age=300", None), 300.0)
+        self.assertEqual(freshness("public, max-age=300", "100"), 200.0)
+        self.assertEqual(freshness("max-age=300", "400"), 0.0)
+        self.assertEqual(freshness("no-store, max-age=300", None), 0.0)
+        self.assertEqual(freshness("max-age=300, no-cache", None), 0.0)
+        self.assertEqual(freshness("public", None), 0.0)
+        self.assertEqual(freshness("max-age=bogus", None), 0.0)
+        self.assertEqual(freshness(None, None), 0.0)
+
+    def test_key(self):
+        q1 = dns.message.make_query("example.com.", "A")
+        q2 = dns.message.make_query("example.com.", "A")
+        k1 = dns.query.HTTPCache.key(self.url, q1, q1.to_wire())
+        k2 = dns.query.HTTPCache.key(self.url, q2, q2.to_wire())
+        self.assertEqual(k1, k2)
+        self.assertEqual(k1[1][:2], b"\x00\x00")
+        q3 = dns.message.make_query("example.com.", "AAAA")
+        self.assertNotEqual(k1, dns.query.HTTPCache.key(self.url, q3, q3.to_wire()))
+        keyring = dns.tsigkeyring.from_text({"name": "tDz6cfXXGtNivRpQ98hr6A=="})
+        q1.use_tsig(keyring, "name")
+        self.assertIsNone(dns.query.HTTPCache.key(self.url, q1, q1.to_wire()))
+
+    def test_https_hit(self):
+        cache = dns.query.HTTPCache()
+        q = dns.message.make_query("example.com.", "A")
+        key = cache.key(self.url, q, q.to_wire())
+        cache.put(key, self.make_response(q), "max-age=60")
+        # No request is made, so this works without httpx or a server.
+        r = dns.query.https(q, "127.0.0.1", http_cache=cache)
+        self.assertTrue(q.is_response(r))
+        self.assertEqual(r.answer[0][0].address, "10.0.0.1")
+        self.assertEqual(cache.hits, 1)
+        ns = dns.nameserver.DoHNameserver(self.url, http_cache=cache)
+        q = dns.message.make_query("example.com.", "A")
+        r = ns.query(q, 2.0, None, 0)
+        self.assertTrue(q.is_response(r))
+        self.assertEqual(cache.hits, 2)
+
+    def test_https_renders_once(self):
+        cache = dns.query.HTTPCache()
+        q = dns.message.make_query("example.com.", "A")
+        template = dns.message.QueryTemplate(q)
+        instantiate = template.instantiate
+        with (
+            unittest.mock.patch.object(
+                template, "instantiate", side_effect=instantiate
+            ) as mocked,
+            unittest.mock.patch.object(dns.query, "_http3") as http3,
+        ):
+            dns.query.https(
+                template,
+                "127.0.0.1",
+                http_cache=cache,
+                http_version=dns.query.HTTPVersion.H3,
+            )
+        # The query rendered for the cache key is the one sent.
+        self.assertEqual(mocked.call_count, 1)
+        (sent, wire) = (http3.call_args.args[0], http3.call_args.kwargs["wire"])
+        self.assertEqual(sent.id, 0)
+        self.assertEqual(wire, b"\x00\x00" + template.wire[2:])
+        self.assertEqual(http3.call_args.kwargs["cache_key"], (self.url, wire))
+
+    def test_ttl_aging(self):
+        cache = dns.query.HTTPCache()
+        q = dns.message.make_query("example.com.", "A")
+        key = cache.key(self.url, q, q.to_wire())
+        cache.put(key, self.make_response(q), "max-age=60")
+        (expiration, stored, content) = cache.data[key]
+        cache.data[key] = (expiration, stored - 100, content)
+        r = dns.query.https(q, "127.0.0.1", http_cache=cache)
+        self.assertEqual(r.answer[0].ttl, 200)
+
+    def test_expiry_and_size(self):
+        cache = dns.query.HTTPCache(max_size=2)
+        queries = [dns.message.make_query(f"{i}.example.com.", "A") for i in range(3)]
+        keys = [cache.key(self.url, q, q.to_wire()) for q in queries]
+        for q, key in zip(queries, keys):
+            cache.put(key, self.make_response(q), "max-age=60")
+        self.assertEqual(len(cache.data), 2)
+        self.assertIsNone(cache.get(keys[0]))
+        self.assertIsNotNone(cache.get(keys[2]))
+        cache.put(keys[0], self.make_response(queries[0]), "no-store")
+        self.assertIsNone(cache.get(keys[0]))
+        cache = dns.query.HTTPCache()
+        cache.put(keys[0], self.make_response(queries[0]), "max-age=0")
+        self.assertIsNone(cache.get(keys[0]))
+        cache.put(keys[1], self.make_response(queries[1]), "max-age=60")
+        cache.flush()
+        self.assertIsNone(cache.get(keys[1]))
+
+
 if __name__ == "__main__":
     unittest.main()
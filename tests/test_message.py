@@ -17,6 +17,8 @@
 # OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
 import binascii
+import concurrent.futures
+import copy
 import unittest
 
 import dns.edns
@@ -24,10 +26,14 @@ import dns.exception
 import dns.flags
 import dns.message
 import dns.name
+import dns.opcode
+import dns.rcode
+import dns.rdata
 import dns.rdataclass
 import dns.rdatatype
 import dns.rdtypes.ANY.OPT
 import dns.rdtypes.ANY.TSIG
+import dns.renderer
 import dns.rrset
 import dns.tsig
 import dns.tsigkeyring
@@ -273,6 +279,172 @@ class MessageTestCase(unittest.TestCase):
         self.assertTrue(len(r.authority) == 1 and q.authority == r.authority)
         self.assertTrue(len(r.additional) == 1 and q.additional == r.additional)
 
+    def test_to_wire_cached(self):
+        q = dns.message.make_query("www.example.", "A", use_edns=0)
+        wire = q.to_wire()
+        # The fingerprint is only made once the message is rendered again.
+        self.assertIsNone(q._wire_cache[0])
+        self.assertEqual(q.to_wire(), wire)
+        wire = q.to_wire()
+        self.assertIs(q.to_wire(), wire)
+        self.assertEqual(
+            q.to_wire(prepend_length=True), len(wire).to_bytes(2, "big") + wire
+        )
+        q.id = (q.id + 1) % 65536
+        patched = q.to_wire()
+        self.assertEqual(patched[2:], wire[2:])
+        self.assertEqual(dns.message.from_wire(patched).id, q.id)
+        self.assertIs(q.to_wire(), patched)
+        self.assertIs(q.wire, patched)
+
+    def test_to_wire_cache_invalidation(self):
+        q = dns.message.make_query("www.example.", "A", use_edns=0)
+        rrset = dns.rrset.from_text("www.example.", 300, "IN", "A", "10.0.0.1")
+        changes = [
+            lambda: setattr(q, "flags", q.flags | dns.flags.CD),
+            lambda: q.answer.append(rrset),
+            lambda: rrset.add(dns.rdata.from_text("IN", "A", "10.0.0.2")),
+            lambda: rrset.update_ttl(30),
+            lambda: setattr(q, "answer", []),
+            lambda: q.use_edns(0, payload=4096),
+            lambda: q.use_edns(0, options=[dns.edns.ECSOption("10.0.0.0", 8)]),
+            lambda: q.use_edns(False),
+        ]
+        for change in changes:
+            wire = q.to_wire()
+            change()
+            self.assertNotEqual(q.to_wire(), wire)
+            expected = q._render(None, 65535, False, {}).get_wire()
+            self.assertEqual(
+                dns.message.from_wire(q.to_wire()), dns.message.from_wire(expected)
+            )
+        wire = q.to_wire()
+        self.assertIsNot(q.to_wire(want_shuffle=False), wire)
+        self.assertIsNot(q.to_wire(origin=dns.name.root), wire)
+
+    def test_to_wire_cache_shuffle(self):
+        q = dns.message.make_query("www.example.", "A")
+        r = dns.message.make_response(q)
+        r.answer.append(
+            dns.rrset.from_text_list(
+                "www.example.", 300, "IN", "A", [f"10.0.0.{i}" for i in range(8)]
+            )
+        )
+        wires = {r.to_wire() for _ in range(50)}
+        self.assertGreater(len(wires), 2)
+        wire = r.to_wire(want_shuffle=False)
+        self.assertIs(r.to_wire(want_shuffle=False), wire)
+
+    def test_to_wire_cache_case(self):
+        q = dns.message.make_query("www.example.", "A")
+        r = dns.message.make_response(q)
+        r.answer.append(
+            dns.rrset.from_text("www.example.", 300, "IN", "CNAME", "host.example.")
+        )
+        r.to_wire()
+        r.to_wire()
+        changes = [
+            lambda: setattr(r.question[0], "name", dns.name.from_text("wWw.ExAmPlE.")),
+            lambda: setattr(
+                r,
+                "question",
+                [dns.rrset.RRset(dns.name.from_text("WWW.example."), 1, 1)],
+            ),
+            lambda: r.answer[0].clear(),
+            lambda: r.answer[0].add(
+                dns.rdata.from_text("IN", "CNAME", "HOST.example."), 300
+            ),
+        ]
+        for change in changes:
+            change()
+            expected = r._render(None, 65535, False, {}).get_wire()
+            self.assertEqual(r.to_wire(), expected)
+            self.assertEqual(r.to_wire(), expected)
+
+    def test_query_template_with_options(self):
+        keyring = dns.tsigkeyring.from_text({"key.": "MTIzNDU2Nzg5MDEyMzQ1Ng=="})
+        nsid = dns.edns.NSIDOption(b"")
+        cookie = dns.edns.CookieOption(b"\x01" * 8, b"")
+        for pad in (0, 128):
+            for signed in (False, True):
+                q = dns.message.make_query(
+                    "www.example.", "A", use_edns=0, options=[nsid], pad=pad
+                )
+                if signed:
+                    q.use_tsig(keyring, "key.")
+                template = dns.message.QueryTemplate(q)
+                wire = template.wire
+                t = template.with_options([cookie])
+                self.assertEqual(template.wire, wire)
+                self.assertEqual(template.query.options, (nsid,))
+                (m, wire) = t.instantiate(1)
+                self.assertEqual(m.options, (nsid, cookie))
+                r = dns.message.from_wire(wire, keyring=keyring)
+                self.assertEqual(r.options[:2], (nsid, cookie))
+                self.assertEqual(r.question, q.question)
+                if pad:
+                    self.assertEqual(len(wire) % pad, 0)
+                # Replacing an option.
+                t = t.with_options([dns.edns.NSIDOption(b"x")])
+                (m, wire) = t.instantiate(1)
+                r = dns.message.from_wire(wire, keyring=keyring)
+                self.assertEqual(r.options[:2], (cookie, dns.edns.NSIDOption(b"x")))
+        template = dns.message.QueryTemplate(dns.message.make_query("www.", "A"))
+        with self.assertRaises(ValueError):
+            template.with_options([cookie])
+
+    def test_to_wire_tsig_not_cached(self):
+        keyring = dns.tsigkeyring.from_text({"key.": "MTIzNDU2Nzg5MDEyMzQ1Ng=="})
+        q = dns.message.make_query("www.example.", "A")
+        q.use_tsig(keyring, "key.")
+        wire = q.to_wire()
+        self.assertIsNot(q.to_wire(), wire)
+        self.assertIsNone(q._wire_cache)
+
+    def test_MakeResponseRenderer(self):
+        q = dns.message.make_query("wWw.Example.", "A", use_edns=0)
+        q = dns.message.from_wire(q.to_wire())
+        answer = dns.rrset.from_text("www.example.", 300, "IN", "A", "10.0.0.1")
+        expected = dns.message.make_response(q, recursion_available=True)
+        expected.answer.append(answer)
+        expected.use_edns(0, 0, 1232)
+        r = dns.message.make_response_renderer(q, recursion_available=True)
+        r.add_rrset(dns.renderer.ANSWER, answer)
+        r.add_edns(0, 0, 1232)
+        r.write_header()
+        wire = r.get_wire()
+        self.assertEqual(wire, expected.to_wire())
+        # The question is copied, with its case, and the answer is compressed
+        # against it.
+        self.assertEqual(wire[12:29], q.wire[12:29])
+        self.assertEqual(wire[29:31], b"\xc0\x0c")
+
+    def test_MakeResponseRendererNotFromWire(self):
+        q = dns.message.make_query("www.example.", "A")
+        q.set_opcode(dns.opcode.NOTIFY)
+        for query in (q, dns.message.from_text(q.to_text())):
+            self.assertIsNone(query.wire)
+            r = dns.message.make_response_renderer(query)
+            r.write_header()
+            response = dns.message.from_wire(r.get_wire())
+            self.assertEqual(response.question, q.question)
+            self.assertEqual(response.opcode(), dns.opcode.NOTIFY)
+            self.assertTrue(query.is_response(response))
+
+    def test_MakeResponseRendererChangedQuestion(self):
+        q = dns.message.from_wire(dns.message.make_query("www.example.", "A").to_wire())
+        q.question = [dns.rrset.RRset(dns.name.from_text("wwx.example."), 1, 28)]
+        r = dns.message.make_response_renderer(q)
+        r.write_header()
+        response = dns.message.from_wire(r.get_wire())
+        self.assertEqual(response.question, q.question)
+
+    def test_MakeResponseRendererOfResponse(self):
+        q = dns.message.make_query("www.example.", "A")
+        r = dns.message.make_response(q)
+        with self.assertRaises(dns.exception.FormError):
+            dns.message.make_response_renderer(r)
+
     def test_ExtendedRcodeSetting(self):
         m = dns.message.make_query("foo", "A")
         m.set_rcode(4095)
@@ -358,6 +530,42 @@ class MessageTestCase(unittest.TestCase):
         rrs2 = a.get_rrset("ANSWER", "dnspython.org.", "IN", "SOA")
         self.assertEqual(rrs1, rrs2)
 
+    def test_IndexFollowsSectionSetters(self):
+        a = dns.message.from_text(answer_text)
+        n = dns.name.from_text("dnspython.org.")
+        authority = [dns.rrset.from_text(n, 300, "IN", "NS", "ns.example.")]
+        a.authority = authority
+        rrset = a.find_rrset(a.authority, n, "IN", "NS", create=True)
+        self.assertIs(rrset, authority[0])
+        self.assertEqual(len(a.authority), 1)
+        a.answer = []
+        with self.assertRaises(KeyError):
+            a.find_rrset(a.answer, n, "IN", "SOA")
+        a.sections = [[], [], [], list(authority)]
+        with self.assertRaises(KeyError):
+            a.find_rrset(a.authority, n, "IN", "NS")
+        self.assertIs(a.find_rrset(a.additional, n, "IN", "NS"), authority[0])
+
+    def test_IndexFollowsSectionSettersLazy(self):
+        wire = dns.message.from_text(answer_text).to_wire()
+        a = dns.message.from_wire(wire, lazy=True)
+        answer = [dns.rrset.from_text("dnspython.org.", 300, "IN", "TXT", "foo")]
+        a.answer = answer
+        self.assertIs(a.answer, answer)
+        self.assertEqual(len(a.authority), 1)
+        self.assertIs(a.get_rrset(a.answer, answer[0].name, "IN", "TXT"), answer[0])
+        self.assertIsNone(a.get_rrset(a.answer, answer[0].name, "IN", "SOA"))
+
+    def test_IndexCopiedSections(self):
+        q = dns.message.from_text(answer_text)
+        q.flags = 0
+        r = dns.message.make_response(q, copy_mode=dns.message.CopyMode.EVERYTHING)
+        n = dns.name.from_text("dnspython.org.")
+        rrset = r.find_rrset(r.answer, n, "IN", "SOA", create=True)
+        self.assertIs(rrset, r.answer[0])
+        self.assertEqual(len(r.answer), 1)
+        self.assertEqual(len(r.index), 4)
+
     def test_CleanTruncated(self):
         def bad():
             a = dns.message.from_text(answer_text)
@@ -885,6 +1093,300 @@ www.dnspython.org. 300 IN A 1.2.3.4
         )
         self.assertEqual(m, expected_message)
 
+    def batch_test_wires(self):
+        good = self.lazy_test_message().to_wire()
+        # change the A record's rdlen to 5 and add a byte to the end
+        m = dns.message.from_text(
+            """id 1
+flags QR
+;QUESTION
+www.dnspython.org. IN A
+;ANSWER
+www.dnspython.org. 300 IN A 1.2.3.4
+"""
+        )
+        bad_rdata = m.to_wire()[:-6] + b"\x00\x05\x01\x02\x03\x04\x05"
+        return [good, b"\x00\x01", bad_rdata, good]
+
+    def test_from_wire_batch(self):
+        wires = self.batch_test_wires()
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            results = list(
+                dns.message.from_wire_batch(wires * 3, executor=executor, chunksize=2)
+            )
+        self.assertEqual(len(results), 12)
+        for i in range(0, 12, 4):
+            self.assertEqual(results[i], dns.message.from_wire(wires[0]))
+            self.assertIsInstance(results[i + 1], dns.message.ShortHeader)
+            self.assertIsInstance(results[i + 2], dns.exception.FormError)
+            self.assertEqual(results[i + 3], results[i])
+
+    def test_from_wire_batch_continue_on_error(self):
+        wires = self.batch_test_wires()
+        with concurrent.futures.ThreadPoolExecutor(1) as executor:
+            results = list(
+                dns.message.from_wire_batch(
+                    wires, executor=executor, continue_on_error=True
+                )
+            )
+        self.assertIsInstance(results[1], dns.message.ShortHeader)
+        self.assertEqual(len(results[2].errors), 1)
+        self.assertEqual(results[2].answer, [])
+
+    def test_from_wire_batch_records(self):
+        wires = self.batch_test_wires()
+        with concurrent.futures.ThreadPoolExecutor(1) as executor:
+            results = list(
+                dns.message.from_wire_batch(wires, records=True, executor=executor)
+            )
+            raw = list(
+                dns.message.from_wire_batch(
+                    wires, records=True, raw_rdata=True, executor=executor
+                )
+            )
+        self.assertEqual(results[0], list(dns.message.records_from_wire(wires[0])))
+        self.assertIsInstance(results[1], dns.message.ShortHeader)
+        self.assertIsInstance(results[2], dns.exception.FormError)
+        self.assertEqual(raw[2][1][5], b"\x01\x02\x03\x04\x05")
+        self.assertIsNone(raw[0][0][5])
+        self.assertIsInstance(raw[0][1][5], bytes)
+
+    def test_from_wire_batch_processes(self):
+        wires = self.batch_test_wires()
+        results = list(dns.message.from_wire_batch(wires, processes=2, chunksize=1))
+        self.assertEqual(results[0], dns.message.from_wire(wires[0]))
+        self.assertIsInstance(results[1], dns.message.ShortHeader)
+        self.assertIsInstance(results[2], dns.exception.FormError)
+        self.assertEqual(results[3], results[0])
+        with self.assertRaises(ValueError):
+            list(dns.message.from_wire_batch(wires, chunksize=0))
+        with self.assertRaises(ValueError):
+            list(dns.message.from_wire_batch(wires, processes=1, lazy=True))
+
+    def test_common_rdata_fast_path(self):
+        m = dns.message.from_text(
+            """id 1234
+flags QR
+;QUESTION
+www.dnspython.org. IN A
+;ANSWER
+www.dnspython.org. 300 IN CNAME web.dnspython.org.
+web.dnspython.org. 300 IN A 1.2.3.4
+web.dnspython.org. 300 IN AAAA 2001:db8::1
+;AUTHORITY
+dnspython.org. 300 IN NS ns1.dnspython.org.
+dnspython.org. 300 CH NS ns1.dnspython.org.
+"""
+        )
+        wire = m.to_wire()
+        parsed = dns.message.from_wire(wire)
+        self.assertEqual(parsed, m)
+        for rrset in parsed.answer + parsed.authority:
+            rd = rrset[0]
+            expected = dns.rdata.get_rdata_class(rd.rdclass, rd.rdtype)
+            self.assertIs(type(rd), expected)
+            self.assertIsInstance(rd.rdclass, dns.rdataclass.RdataClass)
+            self.assertIsInstance(rd.rdtype, dns.rdatatype.RdataType)
+            self.assertIsNone(rd.rdcomment)
+            self.assertEqual(
+                rd, dns.rdata.from_text(rd.rdclass, rd.rdtype, rd.to_text())
+            )
+            self.assertEqual(hash(rd), hash(rd.replace()))
+        origin = dns.name.from_text("dnspython.org.")
+        parsed = dns.message.from_wire(wire, origin=origin)
+        self.assertEqual(parsed.answer[0][0].target, dns.name.from_text("web", None))
+
+    def test_common_rdata_fast_path_bad_name_length(self):
+        m = dns.message.from_text(
+            """id 1234
+flags QR
+;QUESTION
+www.dnspython.org. IN CNAME
+;ANSWER
+www.dnspython.org. 300 IN CNAME web.dnspython.org.
+"""
+        )
+        wire = bytearray(m.to_wire())
+        # The CNAME's target is 6 octets long, but claims to be 7.
+        self.assertEqual(wire[-8:-6], b"\x00\x06")
+        wire[-7] = 7
+        wire += b"\x00"
+        with self.assertRaises(dns.exception.FormError):
+            dns.message.from_wire(bytes(wire))
+
+    def lazy_test_message(self):
+        m = dns.message.from_text(
+            """id 1234
+opcode QUERY
+rcode NXDOMAIN
+flags QR AA RD
+edns 0
+payload 1232
+;QUESTION
+www.dnspython.org. IN A
+;ANSWER
+www.dnspython.org. 300 IN CNAME web.dnspython.org.
+web.dnspython.org. 300 IN A 1.2.3.4
+web.dnspython.org. 300 IN A 1.2.3.5
+;AUTHORITY
+dnspython.org. 300 IN NS ns1.dnspython.org.
+dnspython.org. 300 IN NS ns2.dnspython.org.
+;ADDITIONAL
+ns1.dnspython.org. 300 IN A 10.0.0.1
+ns2.dnspython.org. 300 IN AAAA ::1
+"""
+        )
+        m.use_edns(0, 0, 1232, options=[dns.edns.NSIDOption(b"ns1")])
+        return m
+
+    def test_lazy(self):
+        expected = self.lazy_test_message()
+        wire = expected.to_wire()
+        m = dns.message.from_wire(wire, lazy=True)
+        self.assertIsNotNone(m._lazy_reader)
+        # The header, question, and OPT record are available without reading
+        # the rest of the message.
+        self.assertEqual(m.rcode(), dns.rcode.NXDOMAIN)
+        self.assertEqual(m.edns, 0)
+        self.assertEqual(m.payload, 1232)
+        self.assertEqual(m.options[0].nsid, b"ns1")
+        self.assertEqual(m.question, expected.question)
+        self.assertIsNotNone(m._lazy_reader)
+        self.assertEqual(len(m.answer), 2)
+        self.assertIsNone(m._lazy_reader)
+        self.assertEqual(m, expected)
+        self.assertEqual(m.opt, expected.opt)
+        self.assertEqual(dns.message.from_wire(m.to_wire()), expected)
+        rrset = m.find_rrset(
+            dns.message.ADDITIONAL,
+            dns.name.from_text("ns2.dnspython.org."),
+            dns.rdataclass.IN,
+            dns.rdatatype.AAAA,
+        )
+        self.assertEqual(rrset[0].address, "::1")
+
+    def test_lazy_section_assignment(self):
+        wire = self.lazy_test_message().to_wire()
+        m = dns.message.from_wire(wire, lazy=True)
+        m.sections = [[], [], [], []]
+        self.assertIsNone(m._lazy_reader)
+        self.assertEqual(m.answer, [])
+
+    def test_lazy_copy(self):
+        expected = self.lazy_test_message()
+        m = dns.message.from_wire(expected.to_wire(), lazy=True)
+        c = copy.copy(m)
+        self.assertIsNone(m._lazy_reader)
+        self.assertIsNone(c._lazy_reader)
+        self.assertEqual(len(c.answer), 2)
+        self.assertEqual(c, expected)
+        self.assertEqual(m, expected)
+        self.assertEqual(c.opt, expected.opt)
+
+    def test_lazy_framing_errors_are_immediate(self):
+        wire = self.lazy_test_message().to_wire()
+        with self.assertRaises(dns.message.TrailingJunk):
+            dns.message.from_wire(wire + b"\x00", lazy=True)
+        m = dns.message.from_wire(wire + b"\x00", lazy=True, ignore_trailing=True)
+        self.assertEqual(len(m.additional), 2)
+        with self.assertRaises(dns.exception.FormError):
+            dns.message.from_wire(wire[:-4], lazy=True)
+
+    def test_lazy_rdata_errors_are_deferred(self):
+        m = self.lazy_test_message()
+        m.use_edns(False)
+        wire = m.to_wire()
+        # Make the AAAA rdata 2 bytes long, keeping the message framing valid.
+        bad_wire = wire[:-18] + b"\x00\x02" + b"\x00" * 2
+        m = dns.message.from_wire(bad_wire, lazy=True)
+        self.assertEqual(m.rcode(), dns.rcode.NXDOMAIN)
+        for _ in range(2):
+            with self.assertRaises(dns.exception.FormError):
+                m.additional
+            self.assertEqual(len(m.question), 1)
+            self.assertEqual(len(m.index), 1)
+
+    def test_lazy_tsig_is_eager(self):
+        keyring = dns.tsigkeyring.from_text({"keyname.": "NjHwPsMKjdN++dOfE5iAiQ=="})
+        m = self.lazy_test_message()
+        m.use_tsig(keyring, "keyname.")
+        wire = m.to_wire()
+        m = dns.message.from_wire(wire, keyring=keyring, lazy=True)
+        self.assertIsNone(m._lazy_reader)
+        self.assertIsNotNone(m.tsig)
+        self.assertEqual(len(m.answer), 2)
+
+    def test_records_from_wire(self):
+        m = self.lazy_test_message()
+        wire = m.to_wire()
+        records = list(dns.message.records_from_wire(wire))
+        qname = dns.name.from_text("www.dnspython.org.")
+        self.assertEqual(
+            records[0],
+            (dns.message.QUESTION, qname, dns.rdatatype.A, dns.rdataclass.IN, 0, None),
+        )
+        self.assertEqual(
+            [record[0] for record in records],
+            [dns.message.QUESTION]
+            + [dns.message.ANSWER] * 3
+            + [dns.message.AUTHORITY] * 2
+            + [dns.message.ADDITIONAL] * 3,
+        )
+        (section, name, rdtype, rdclass, ttl, rdata) = records[1]
+        self.assertEqual(name, qname)
+        self.assertEqual(rdtype, dns.rdatatype.CNAME)
+        self.assertEqual(rdclass, dns.rdataclass.IN)
+        self.assertEqual(ttl, 300)
+        self.assertEqual(rdata.target, dns.name.from_text("web.dnspython.org."))
+        # The OPT record is returned like any other record.
+        self.assertEqual(records[-1][2], dns.rdatatype.OPT)
+        self.assertEqual(records[-1][1], dns.name.root)
+        for section, name, rdtype, rdclass, ttl, rdata in records[1:-1]:
+            rrset = m.find_rrset(section, name, rdclass, rdtype)
+            self.assertIn(rdata, rrset)
+            self.assertEqual(ttl, rrset.ttl)
+
+    def test_records_from_wire_raw(self):
+        wire = self.lazy_test_message().to_wire()
+        records = list(dns.message.records_from_wire(wire, raw_rdata=True))
+        self.assertEqual(len(records), 9)
+        self.assertIsNone(records[0][5])
+        (_, name, rdtype, _, _, rdata) = records[2]
+        self.assertEqual(name, dns.name.from_text("web.dnspython.org."))
+        self.assertEqual(rdtype, dns.rdatatype.A)
+        self.assertIsInstance(rdata, memoryview)
+        self.assertIn(bytes(rdata), {b"\x01\x02\x03\x04", b"\x01\x02\x03\x05"})
+        # Owner names after raw rdata are still decoded correctly.
+        self.assertEqual(records[4][1], dns.name.from_text("dnspython.org."))
+        self.assertEqual(records[7][1], dns.name.from_text("ns2.dnspython.org."))
+
+    def test_records_from_wire_buffer(self):
+        wire = self.lazy_test_message().to_wire()
+        expected = list(dns.message.records_from_wire(wire))
+        buffer = bytearray(wire)
+        self.assertEqual(list(dns.message.records_from_wire(buffer)), expected)
+        self.assertEqual(
+            list(dns.message.records_from_wire(memoryview(buffer))), expected
+        )
+        # Raw rdata are views of the caller's buffer, not copies.
+        records = list(dns.message.records_from_wire(buffer, raw_rdata=True))
+        rdata = records[2][5]
+        self.assertIs(rdata.obj, buffer)
+
+    def test_records_from_wire_errors(self):
+        wire = self.lazy_test_message().to_wire()
+        with self.assertRaises(dns.message.ShortHeader):
+            list(dns.message.records_from_wire(wire[:10]))
+        for raw_rdata in (False, True):
+            with self.assertRaises(dns.exception.FormError):
+                list(dns.message.records_from_wire(wire[:-4], raw_rdata=raw_rdata))
+        with self.assertRaises(dns.message.TrailingJunk):
+            list(dns.message.records_from_wire(wire + b"\x00"))
+        records = list(
+            dns.message.records_from_wire(wire + b"\x00", ignore_trailing=True)
+        )
+        self.assertEqual(len(records), 9)
+
     def test_padding_basic(self):
         q = dns.message.make_query("www.example", "a", use_edns=0, pad=0)
         w = q.to_wire()
@@ -1054,6 +1556,38 @@ www.dnspython.org. 300 IN A 1.2.3.4
         r.flags |= dns.flags.QR
         self.assertEqual(r.extended_errors(), options)
 
+    def test_query_template(self):
+        q = dns.message.make_query("www.dnspython.org.", "A", use_edns=0, pad=128)
+        template = dns.message.QueryTemplate(q)
+        self.assertEqual(template.question, q.question)
+        (m, wire) = template.instantiate(1234)
+        self.assertEqual(m.id, 1234)
+        self.assertEqual(m.wire, wire)
+        self.assertEqual(len(wire), 128)
+        q.id = 1234
+        self.assertEqual(wire, q.to_wire())
+        self.assertEqual(m.to_wire(), dns.message.from_wire(wire).to_wire())
+        r = dns.message.make_response(m)
+        self.assertTrue(m.is_response(r))
+        ids = set(template.instantiate()[0].id for _ in range(20))
+        self.assertTrue(len(ids) > 1)
+
+    def test_query_template_tsig(self):
+        keyring = dns.tsigkeyring.from_text({"keyname.": "NjHwPsMKjdN++dOfE5iAiQ=="})
+        q = dns.message.make_query("www.dnspython.org.", "A")
+        q.use_tsig(keyring, "keyname.")
+        template = dns.message.QueryTemplate(q)
+        (m1, wire1) = template.instantiate()
+        (m2, wire2) = template.instantiate()
+        for m, wire in ((m1, wire1), (m2, wire2)):
+            r = dns.message.from_wire(wire, keyring)
+            self.assertTrue(r.had_tsig)
+            self.assertEqual(r.id, m.id)
+            self.assertEqual(r.tsig[0].original_id, m.id)
+            self.assertEqual(r.mac, m.mac)
+            self.assertEqual(r.question, q.question)
+        self.assertNotEqual(m1.mac, m2.mac)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -21,11 +21,11 @@ import operator
 import pickle
 import unittest
 from io import BytesIO
-from typing import Dict  # pylint: disable=unused-import
 
 import dns.e164
 import dns.name
 import dns.reversename
+import dns.wire
 
 # pylint: disable=line-too-long,unsupported-assignment-operation
 
@@ -193,6 +193,28 @@ class NameTestCase(unittest.TestCase):
         n2 = dns.name.from_text("foo.com")
         self.assertEqual(hash(n1), hash(n2))
 
+    def testHashCached(self):
+        n = dns.name.from_text("fOo.COM")
+        h = hash(n)
+        self.assertEqual(n._hash, h)
+        self.assertEqual(n._canonical, (b"foo", b"com", b""))
+        self.assertEqual(hash(n), h)
+        # The cached values are not part of the name's state.
+        self.assertEqual(n.__getstate__(), {"labels": (b"fOo", b"COM", b"")})
+        n2 = pickle.loads(pickle.dumps(n))
+        self.assertEqual(n2.labels, n.labels)
+        self.assertEqual(hash(n2), h)
+        with self.assertRaises(TypeError):
+            n._hash = 0  # type: ignore
+
+    def testEqualCaseInsensitive(self):
+        self.assertEqual(dns.name.from_text("fOo.COM."), dns.name.from_text("foo.com."))
+        self.assertNotEqual(
+            dns.name.from_text("foo.com", None), dns.name.from_text("foo.com.")
+        )
+        self.assertFalse(dns.name.from_text("foo.") != dns.name.from_text("FOO."))
+        self.assertTrue(dns.name.from_text("foo.") != "foo.")
+
     def testCompare1(self):
         n1 = dns.name.from_text("a")
         n2 = dns.name.from_text("b")
@@ -456,14 +478,14 @@ class NameTestCase(unittest.TestCase):
     def testToWire1(self):
         n = dns.name.from_text("FOO.bar")
         f = BytesIO()
-        compress = {}  # type: Dict[dns.name.Name,int]
+        compress = {}  # type: dns.name.CompressType
         n.to_wire(f, compress)
         self.assertEqual(f.getvalue(), b"\x03FOO\x03bar\x00")
 
     def testToWire2(self):
         n = dns.name.from_text("FOO.bar")
         f = BytesIO()
-        compress = {}  # type: Dict[dns.name.Name,int]
+        compress = {}  # type: dns.name.CompressType
         n.to_wire(f, compress)
         n.to_wire(f, compress)
         self.assertEqual(f.getvalue(), b"\x03FOO\x03bar\x00\xc0\x00")
@@ -472,7 +494,7 @@ class NameTestCase(unittest.TestCase):
         n1 = dns.name.from_text("FOO.bar")
         n2 = dns.name.from_text("foo.bar")
         f = BytesIO()
-        compress = {}  # type: Dict[dns.name.Name,int]
+        compress = {}  # type: dns.name.CompressType
         n1.to_wire(f, compress)
         n2.to_wire(f, compress)
         self.assertEqual(f.getvalue(), b"\x03FOO\x03bar\x00\xc0\x00")
@@ -481,7 +503,7 @@ class NameTestCase(unittest.TestCase):
         n1 = dns.name.from_text("FOO.bar")
         n2 = dns.name.from_text("a.foo.bar")
         f = BytesIO()
-        compress = {}  # type: Dict[dns.name.Name,int]
+        compress = {}  # type: dns.name.CompressType
         n1.to_wire(f, compress)
         n2.to_wire(f, compress)
         self.assertEqual(f.getvalue(), b"\x03FOO\x03bar\x00\x01\x61\xc0\x00")
@@ -490,11 +512,49 @@ class NameTestCase(unittest.TestCase):
         n1 = dns.name.from_text("FOO.bar")
         n2 = dns.name.from_text("a.foo.bar")
         f = BytesIO()
-        compress = {}  # type: Dict[dns.name.Name,int]
+        compress = {}  # type: dns.name.CompressType
         n1.to_wire(f, compress)
         n2.to_wire(f, None)
         self.assertEqual(f.getvalue(), b"\x03FOO\x03bar\x00\x01\x61\x03foo\x03bar\x00")
 
+    def testToWireCompressRelative(self):
+        n1 = dns.name.from_text("foo.bar.")
+        n2 = dns.name.from_text("A.FOO", None)
+        o = dns.name.from_text("BAR.")
+        f = BytesIO()
+        compress = {}  # type: dns.name.CompressType
+        n1.to_wire(f, compress)
+        n2.to_wire(f, compress, o)
+        self.assertEqual(f.getvalue(), b"\x03foo\x03bar\x00\x01A\xc0\x00")
+        self.assertEqual(
+            compress,
+            {
+                (b"foo", b"bar", b""): 0,
+                (b"bar", b""): 4,
+                (b"a", b"foo", b"bar", b""): 9,
+            },
+        )
+
+    def testToWireCompressCanonicalize(self):
+        n = dns.name.from_text("A.FOO.bar.")
+        f = BytesIO()
+        compress = {}  # type: dns.name.CompressType
+        n.to_wire(f, compress, canonicalize=True)
+        n.to_wire(f, compress, canonicalize=True)
+        self.assertEqual(f.getvalue(), b"\x01a\x03foo\x03bar\x00\xc0\x00")
+
+    def testToWireCompressNameKeys(self):
+        # Tables keyed by names, as before 2.8, are converted.
+        f = BytesIO()
+        f.write(b"\x00" * 12)
+        compress = {dns.name.from_text("Example.COM."): 12}
+        dns.name.from_text("www.example.com.").to_wire(f, compress)
+        self.assertEqual(f.getvalue()[12:], b"\x03www\xc0\x0c")
+        self.assertEqual(
+            list(compress),
+            [(b"example", b"com", b""), (b"www", b"example", b"com", b"")],
+        )
+
     def testToWire6(self):
         n = dns.name.from_text("FOO.bar")
         v = n.to_wire()
@@ -518,7 +578,7 @@ class NameTestCase(unittest.TestCase):
         def bad():
             n = dns.name.from_text("FOO.bar", None)
             f = BytesIO()
-            compress = {}  # type: Dict[dns.name.Name,int]
+            compress = {}  # type: dns.name.CompressType
             n.to_wire(f, compress)
 
         self.assertRaises(dns.name.NeedAbsoluteNameOrOrigin, bad)
@@ -526,7 +586,7 @@ class NameTestCase(unittest.TestCase):
     def testGiantCompressionTable(self):
         # Only the first 16KiB of a message can have compression pointers.
         f = BytesIO()
-        compress = {}  # type: Dict[dns.name.Name,int]
+        compress = {}  # type: dns.name.CompressType
         # exactly 16 bytes encoded
         n = dns.name.from_text("0000000000.com.")
         n.to_wire(f, compress)
@@ -540,7 +600,7 @@ class NameTestCase(unittest.TestCase):
         # There are now 1025 entries in the compression table with
         # the last entry at offset 16368.
         self.assertEqual(len(compress), 1025)
-        self.assertEqual(compress[n], 16368)
+        self.assertEqual(compress[n.canonicalize().labels], 16368)
         # Adding another name should not increase the size of the compression
         # table, as the pointer would be at offset 16384, which is too big.
         n = dns.name.from_text("toobig.com.")
@@ -711,6 +771,46 @@ class NameTestCase(unittest.TestCase):
         self.assertEqual(n3, en3)
         self.assertEqual(cused3, ecused3)
 
+    def testFromWireParserMemoizes(self):
+        # foo. at 0, a.foo. at 5, b.a.foo. at 9, a.foo. again at 13, foo. at 15
+        w = b"\x03foo\x00\x01a\xc0\x00\x01b\xc0\x05\xc0\x05\xc0\x00"
+        parser = dns.wire.Parser(w)
+        names = [parser.get_name() for _ in range(5)]
+        self.assertEqual(parser.remaining(), 0)
+        self.assertEqual(
+            names,
+            [
+                dns.name.from_text("foo."),
+                dns.name.from_text("a.foo."),
+                dns.name.from_text("b.a.foo."),
+                dns.name.from_text("a.foo."),
+                dns.name.from_text("foo."),
+            ],
+        )
+        # Pointers to names already decoded return the same object.
+        self.assertIs(names[3], names[1])
+        self.assertIs(names[4], names[0])
+        self.assertEqual(set(parser.names), {0, 5, 9, 13, 15})
+
+    def testFromWireParserMemoizesSuffix(self):
+        # a pointer into the middle of b.a.foo. at 0
+        w = b"\x01b\x01a\x03foo\x00\x01c\xc0\x02\xc0\x02"
+        parser = dns.wire.Parser(w)
+        names = [parser.get_name() for _ in range(3)]
+        self.assertEqual(names[1], dns.name.from_text("c.a.foo."))
+        self.assertEqual(names[2], dns.name.from_text("a.foo."))
+        self.assertIs(parser.names[2], names[2])
+
+    def testBadFromWireMemoized(self):
+        # A memoized name must not let a pointer point forward.
+        w = b"\x03foo\x00\xc0\x07\x03bar\x00"
+        parser = dns.wire.Parser(w)
+        parser.get_name()
+        parser.seek(7)
+        parser.get_name()
+        parser.seek(5)
+        self.assertRaises(dns.name.BadPointer, parser.get_name)
+
     def testBadFromWire1(self):
         def bad():
             w = b"\x03foo\xc0\x04"
@@ -1284,5 +1384,83 @@ class NameTestCase(unittest.TestCase):
             name.predecessor(origin, True)
 
 
+class TextCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        dns.name.text_cache.set_max_size(2)
+        dns.name.text_cache.flush()
+        dns.name.text_cache.reset_statistics()
+
+    def tearDown(self):
+        dns.name.text_cache.set_max_size(0)
+        dns.name.text_cache.flush()
+        dns.name.text_cache.reset_statistics()
+
+    def testCached(self):
+        cache = dns.name.text_cache
+        n1 = dns.name.from_text("www.example")
+        self.assertIs(dns.name.from_text("www.example"), n1)
+        self.assertEqual((cache.hits(), cache.misses(), len(cache)), (1, 1, 1))
+        # The origin and IDNA codec are part of the key.
+        n2 = dns.name.from_text("www.example", None)
+        self.assertFalse(n2.is_absolute())
+        n3 = dns.name.from_unicode("www.example", idna_codec=dns.name.IDNA_2008)
+        self.assertEqual(n3, n1)
+        self.assertIsNot(n3, n1)
+        self.assertEqual(len(cache), 2)
+        # The least recently used name was dropped.
+        self.assertIsNot(dns.name.from_text("www.example"), n1)
+        self.assertIs(
+            dns.name.from_text("www.example"), dns.name.from_text("www.example")
+        )
+
+    def testOriginCase(self):
+        for convert in (dns.name.from_text, dns.name.from_unicode):
+            upper = convert("www", dns.name.from_text("EXAMPLE."))
+            lower = convert("www", dns.name.from_text("example."))
+            self.assertEqual(upper.labels, (b"www", b"EXAMPLE", b""))
+            self.assertEqual(lower.labels, (b"www", b"example", b""))
+            self.assertIs(convert("www", dns.name.from_text("example.")), lower)
+
+    def testUnicodeCached(self):
+        n1 = dns.name.from_text("Königsgäßchen.example")
+        self.assertIs(dns.name.from_text("Königsgäßchen.example"), n1)
+        n2 = dns.name.from_unicode("Königsgäßchen.example")
+        self.assertEqual(n2, n1)
+        self.assertIs(dns.name.from_unicode("Königsgäßchen.example"), n2)
+
+    def testDisabled(self):
+        cache = dns.name.text_cache
+        cache.set_max_size(0)
+        self.assertIsNot(
+            dns.name.from_text("www.example"), dns.name.from_text("www.example")
+        )
+        self.assertEqual((cache.hits(), cache.misses(), len(cache)), (0, 0, 0))
+
+    def testSetMaxSize(self):
+        cache = dns.name.text_cache
+        cache.set_max_size(10)
+        for i in range(5):
+            dns.name.from_text(f"host{i}.example")
+        cache.set_max_size(3)
+        self.assertEqual(len(cache), 3)
+        # The most recently used names are kept.
+        cache.reset_statistics()
+        dns.name.from_text("host4.example")
+        self.assertEqual(cache.hits(), 1)
+        cache.flush()
+        self.assertEqual(len(cache), 0)
+        with self.assertRaises(ValueError):
+            cache.set_max_size(-1)
+
+    def testErrorsNotCached(self):
+        with self.assertRaises(dns.name.EmptyLabel):
+            dns.name.from_text("a..b")
+        with self.assertRaises(ValueError):
+            dns.name.from_text("a.b", [])
+        with self.assertRaises(ValueError):
+            dns.name.from_text("a.b", "b")
+        self.assertEqual(len(dns.name.text_cache), 0)
+
+
 if __name__ == "__main__":
     unittest.main()
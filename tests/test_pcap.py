@@ -0,0 +1,288 @@
+# Copyright (C) Dnspython Contributors, see LICENSE for text of ISC license
+
+import io
+import os
+import struct
+import tempfile
+import unittest
+
+import dns.message
+import dns.pcap
+import dns.rrset
+
+CLIENT4 = ("10.0.0.1", 12345)
+SERVER4 = ("10.0.0.53", 53)
+CLIENT6 = ("2001:db8::1", 23456)
+SERVER6 = ("2001:db8::53", 53)
+
+
+def query(name="www.example.", rdtype="A"):
+    return dns.message.make_query(name, rdtype).to_wire()
+
+
+def frames(capture):
+    # The (timestamp, frame) tuples of a pcap file written by dns.pcap.Writer.
+    data = capture.getvalue()
+    offset = 24
+    result = []
+    while offset < len(data):
+        (seconds, microseconds, caplen, _) = struct.unpack_from("!IIII", data, offset)
+        offset += 16
+        result.append((seconds + microseconds / 1e6, data[offset : offset + caplen]))
+        offset += caplen
+    return result
+
+
+def pcap(records, endian="<", magic=0xA1B2C3D4, linktype=dns.pcap.LINKTYPE_ETHERNET):
+    # Make a pcap file from (seconds, fraction, frame) tuples.
+    data = struct.pack(endian + "IHHiIII", magic, 2, 4, 0, 0, 65535, linktype)
+    for seconds, fraction, frame in records:
+        data += struct.pack(endian + "IIII", seconds, fraction, len(frame), len(frame))
+        data += frame
+    return data
+
+
+def pcapng_block(block_type, body):
+    body += b"\x00" * (-len(body) % 4)
+    length = len(body) + 12
+    return struct.pack("<II", block_type, length) + body + struct.pack("<I", length)
+
+
+def tcp_segment(source, destination, seq, data, flags=0x18):
+    # Make an Ethernet frame carrying a TCP segment, using the writer's code.
+    capture = io.BytesIO()
+    writer = dns.pcap.Writer(capture)
+    writer._write_packet(0.0, source, destination, 6, data, seq)
+    frame = frames(capture)[0][1]
+    # Set the flags; the reader doesn't check checksums.
+    return frame[:47] + bytes([flags]) + frame[48:]
+
+
+class PcapTestCase(unittest.TestCase):
+    def write(self, messages):
+        capture = io.BytesIO()
+        with dns.pcap.Writer(capture) as writer:
+            for message in messages:
+                writer.write(*message)
+        capture.seek(0)
+        return capture
+
+    def test_udp_round_trip(self):
+        q4 = query()
+        q6 = query("www.example.", "AAAA")
+        capture = self.write(
+            [(q4, CLIENT4, SERVER4, 1000.25), (q6, CLIENT6, SERVER6, 1001.5)]
+        )
+        messages = list(dns.pcap.read(capture))
+        self.assertEqual(
+            messages,
+            [
+                (1000.25, "udp", CLIENT4, SERVER4, q4),
+                (1001.5, "udp", CLIENT6, SERVER6, q6),
+            ],
+        )
+        self.assertEqual(
+            dns.message.from_wire(messages[1][4]), dns.message.from_wire(q6)
+        )
+
+    def test_tcp_round_trip(self):
+        q = query()
+        r = dns.message.make_response(dns.message.from_wire(q))
+        r.answer.append(
+            dns.rrset.from_text(
+                "www.example.",
+                300,
+                "IN",
+                "TXT",
+                *[f'"{i}{"x" * 200}"' for i in range(20)],
+            )
+        )
+        response = r.to_wire()
+        self.assertGreater(len(response), 2000)
+        capture = self.write(
+            [
+                (q, CLIENT6, SERVER6, 1.0, True),
+                (response, SERVER6, CLIENT6, 2.0, True),
+                (q, CLIENT6, SERVER6, 3.0, True),
+            ]
+        )
+        self.assertEqual(len(frames(capture)), 5)
+        capture.seek(0)
+        self.assertEqual(
+            list(dns.pcap.read(capture)),
+            [
+                (1.0, "tcp", CLIENT6, SERVER6, q),
+                (2.0, "tcp", SERVER6, CLIENT6, response),
+                (3.0, "tcp", CLIENT6, SERVER6, q),
+            ],
+        )
+
+    def test_checksums(self):
+        for client, server in ((CLIENT4, SERVER4), (CLIENT6, SERVER6)):
+            for tcp in (False, True):
+                capture = self.write([(query(), client, server, 0.0, tcp)])
+                frame = frames(capture)[0][1]
+                if client is CLIENT4:
+                    self.assertEqual(dns.pcap._checksum(frame[14:34]), 0)
+                    pseudo_header = frame[26:34] + struct.pack(
+                        "!BBH", 0, frame[23], len(frame) - 34
+                    )
+                    segment = frame[34:]
+                else:
+                    pseudo_header = frame[22:54] + struct.pack(
+                        "!I3xB", len(frame) - 54, frame[20]
+                    )
+                    segment = frame[54:]
+                self.assertEqual(dns.pcap._checksum(pseudo_header + segment), 0)
+
+    def test_read_file(self):
+        q = query()
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "dns.pcap")
+            with dns.pcap.Writer(filename) as writer:
+                writer.write(q, CLIENT4, SERVER4, 5.0)
+                writer.write(q, CLIENT4, SERVER4, 6.0, tcp=True)
+            expected = [
+                (5.0, "udp", CLIENT4, SERVER4, q),
+                (6.0, "tcp", CLIENT4, SERVER4, q),
+            ]
+            self.assertEqual(list(dns.pcap.read(filename)), expected)
+            with open(filename, "rb") as f:
+                self.assertEqual(list(dns.pcap.read(f)), expected)
+
+    def test_ports(self):
+        q = query()
+        capture = self.write(
+            [(q, CLIENT4, ("10.0.0.53", 5353), 0.0), (q, CLIENT4, SERVER4, 1.0)]
+        )
+        self.assertEqual([m[0] for m in dns.pcap.read(capture)], [1.0])
+        capture.seek(0)
+        self.assertEqual(
+            [m[0] for m in dns.pcap.read(capture, ports=(53, 5353))], [0.0, 1.0]
+        )
+
+    def test_big_endian_and_nanoseconds(self):
+        q = query()
+        frame = frames(self.write([(q, CLIENT4, SERVER4, 0.0)]))[0][1]
+        data = pcap([(7, 500000000, frame)], ">", 0xA1B23C4D)
+        self.assertEqual(
+            list(dns.pcap.read(io.BytesIO(data))),
+            [(7.5, "udp", CLIENT4, SERVER4, q)],
+        )
+
+    def test_link_types(self):
+        q = query()
+        frame = frames(self.write([(q, CLIENT4, SERVER4, 0.0)]))[0][1]
+        ip = frame[14:]
+        vlan = frame[:12] + b"\x81\x00\x00\x01" + frame[12:]
+        cases = [
+            (dns.pcap.LINKTYPE_ETHERNET, vlan),
+            (dns.pcap.LINKTYPE_RAW, ip),
+            (dns.pcap.LINKTYPE_NULL, b"\x02\x00\x00\x00" + ip),
+            (dns.pcap.LINKTYPE_LINUX_SLL, b"\x00" * 14 + b"\x08\x00" + ip),
+            (dns.pcap.LINKTYPE_LINUX_SLL2, b"\x08\x00" + b"\x00" * 18 + ip),
+        ]
+        for linktype, frame in cases:
+            data = pcap([(1, 0, frame)], linktype=linktype)
+            self.assertEqual(
+                list(dns.pcap.read(io.BytesIO(data))),
+                [(1.0, "udp", CLIENT4, SERVER4, q)],
+            )
+
+    def test_ignored_packets(self):
+        q = query()
+        frame = frames(self.write([(q, CLIENT4, SERVER4, 0.0)]))[0][1]
+        fragment = frame[:20] + b"\x20\x00" + frame[22:]
+        arp = frame[:12] + b"\x08\x06" + frame[14:]
+        truncated = frame[:-1]
+        data = pcap([(1, 0, fragment), (2, 0, arp), (3, 0, truncated), (4, 0, frame)])
+        # The last packet of an interrupted capture is ignored too.
+        data += data[-(len(frame) + 16) : -1]
+        self.assertEqual([m[0] for m in dns.pcap.read(io.BytesIO(data))], [4.0])
+
+    def test_tcp_reassembly(self):
+        q1 = query("one.example.")
+        q2 = query("two.example.")
+        stream = len(q1).to_bytes(2, "big") + q1 + len(q2).to_bytes(2, "big") + q2
+        split = len(q1) + 10
+        records = [
+            # The handshake, then the second part arriving before the first,
+            # then a retransmission of the first part which includes some
+            # already seen data.
+            (1, 0, tcp_segment(CLIENT4, SERVER4, 999, b"", 0x02)),
+            (2, 0, tcp_segment(CLIENT4, SERVER4, 1000 + split, stream[split:])),
+            (3, 0, tcp_segment(CLIENT4, SERVER4, 1000, stream[:5])),
+            (4, 0, tcp_segment(CLIENT4, SERVER4, 1000, stream[: split + 4])),
+            (5, 0, tcp_segment(CLIENT4, SERVER4, 1000, stream)),
+            (6, 0, tcp_segment(CLIENT4, SERVER4, 1000 + len(stream), b"", 0x11)),
+        ]
+        self.assertEqual(
+            list(dns.pcap.read(io.BytesIO(pcap(records)))),
+            [(4.0, "tcp", CLIENT4, SERVER4, q1), (4.0, "tcp", CLIENT4, SERVER4, q2)],
+        )
+
+    def test_tcp_sequence_wraps(self):
+        q = query()
+        data = len(q).to_bytes(2, "big") + q
+        seq = 0xFFFFFFFF - 5
+        records = [
+            (1, 0, tcp_segment(CLIENT4, SERVER4, seq, data[:10])),
+            (2, 0, tcp_segment(CLIENT4, SERVER4, (seq + 10) & 0xFFFFFFFF, data[10:])),
+        ]
+        self.assertEqual(
+            list(dns.pcap.read(io.BytesIO(pcap(records)))),
+            [(2.0, "tcp", CLIENT4, SERVER4, q)],
+        )
+
+    def test_pcapng(self):
+        q = query()
+        frame = frames(self.write([(q, CLIENT6, SERVER6, 0.0)]))[0][1]
+        shb = pcapng_block(0x0A0D0D0A, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1))
+        # An interface with millisecond timestamps, and one with the default.
+        idb_ms = pcapng_block(
+            1,
+            struct.pack("<HHI", dns.pcap.LINKTYPE_ETHERNET, 0, 65535)
+            + struct.pack("<HHB3x", 9, 1, 3)
+            + struct.pack("<HH", 0, 0),
+        )
+        idb_raw = pcapng_block(1, struct.pack("<HHI", dns.pcap.LINKTYPE_RAW, 0, 0))
+        ip = frame[14:]
+        epb0 = pcapng_block(
+            6, struct.pack("<IIIII", 0, 0, 2500, len(frame), len(frame)) + frame
+        )
+        epb1 = pcapng_block(
+            6, struct.pack("<IIIII", 1, 0, 3000000, len(ip), len(ip)) + ip
+        )
+        spb = pcapng_block(3, struct.pack("<I", len(frame)) + frame)
+        unknown = pcapng_block(5, b"ignored")
+        data = shb + idb_ms + idb_raw + epb0 + unknown + epb1 + spb
+        self.assertEqual(
+            list(dns.pcap.read(io.BytesIO(data))),
+            [
+                (2.5, "udp", CLIENT6, SERVER6, q),
+                (3.0, "udp", CLIENT6, SERVER6, q),
+                (0.0, "udp", CLIENT6, SERVER6, q),
+            ],
+        )
+
+    def test_bad_capture(self):
+        with self.assertRaises(dns.pcap.BadCapture):
+            list(dns.pcap.read(io.BytesIO(b"not a capture file")))
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "empty.pcap")
+            open(filename, "wb").close()
+            with self.assertRaises(dns.pcap.BadCapture):
+                list(dns.pcap.read(filename))
+        shb = pcapng_block(0x0A0D0D0A, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1))
+        epb = pcapng_block(6, struct.pack("<IIIII", 0, 0, 0, 0, 0))
+        with self.assertRaises(dns.pcap.BadCapture):
+            list(dns.pcap.read(io.BytesIO(shb + epb)))
+
+    def test_write_mixed_families(self):
+        writer = dns.pcap.Writer(io.BytesIO())
+        with self.assertRaises(ValueError):
+            writer.write(query(), CLIENT4, SERVER6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,217 @@
+# Copyright (C) Dnspython Contributors, see LICENSE for text of ISC license
+
+import asyncio
+import contextlib
+import io
+import sys
+import time
+import unittest
+import unittest.mock
+
+import dns.asyncbackend
+import dns.asyncquery
+import dns.message
+import dns.name
+import dns.perf
+import dns.rcode
+import dns.rdatatype
+import dns.rrset
+
+try:
+    from .nanonameserver import Server
+
+    _nanonameserver_available = True
+except ImportError:
+    _nanonameserver_available = False
+
+    class Server:  # type: ignore
+        pass
+
+
+class PerfNanoNameserver(Server):
+    def handle(self, request):
+        response = dns.message.make_response(request.message)
+        if request.qtype == dns.rdatatype.A:
+            response.answer.append(
+                dns.rrset.from_text(request.qname, 300, "IN", "A", "10.0.0.1")
+            )
+        else:
+            response.set_rcode(dns.rcode.NXDOMAIN)
+        return response
+
+
+QUERIES = """
+; comment
+# another comment
+www.example. A
+mail.example. MX
+
+ns.example.
+"""
+
+
+class ReadQueriesTestCase(unittest.TestCase):
+    def test_read_queries(self):
+        queries = dns.perf.read_queries(io.StringIO(QUERIES))
+        self.assertEqual(
+            queries,
+            [
+                (dns.name.from_text("www.example."), dns.rdatatype.A),
+                (dns.name.from_text("mail.example."), dns.rdatatype.MX),
+                (dns.name.from_text("ns.example."), dns.rdatatype.A),
+            ],
+        )
+
+    def test_read_queries_bad(self):
+        with self.assertRaises(dns.exception.SyntaxError):
+            dns.perf.read_queries(io.StringIO("www.example. A extra\n"))
+
+    def test_percentile(self):
+        statistics = dns.perf.Statistics()
+        self.assertIsNone(statistics.percentile(50))
+        statistics.latencies = [float(i) for i in range(100, 0, -1)]
+        self.assertEqual(statistics.percentile(50), 50.0)
+        self.assertEqual(statistics.percentile(99), 99.0)
+        self.assertEqual(statistics.percentile(100), 100.0)
+        self.assertEqual(statistics.percentile(0), 1.0)
+
+
+@unittest.skipIf(not _nanonameserver_available, "nanonameserver required")
+class PerfTestCase(unittest.TestCase):
+    def run_perf(self, ns, protocol, **kwargs):
+        queries = dns.perf.read_queries(io.StringIO(QUERIES))
+        if protocol == "udp":
+            (address, port) = ns.udp_address
+        else:
+            (address, port) = ns.tcp_address
+        return asyncio.run(
+            dns.perf.run(
+                queries,
+                address,
+                port=port,
+                protocol=protocol,
+                backend=dns.asyncbackend.get_backend("asyncio"),
+                **kwargs,
+            )
+        )
+
+    def test_udp(self):
+        with PerfNanoNameserver() as ns:
+            statistics = self.run_perf(ns, "udp", concurrency=2, runs=3)
+        self.assertEqual(statistics.sent, 9)
+        self.assertEqual(statistics.completed, 9)
+        self.assertEqual(statistics.timeouts, 0)
+        self.assertEqual(
+            statistics.rcodes, {dns.rcode.NOERROR: 6, dns.rcode.NXDOMAIN: 3}
+        )
+        self.assertEqual(len(statistics.latencies), 9)
+        self.assertGreater(statistics.qps(), 0)
+
+    def test_tcp(self):
+        with PerfNanoNameserver() as ns:
+            statistics = self.run_perf(ns, "tcp", concurrency=3)
+        self.assertEqual(statistics.sent, 3)
+        self.assertEqual(statistics.completed, 3)
+
+    def test_rate_and_duration(self):
+        with PerfNanoNameserver() as ns:
+            statistics = self.run_perf(ns, "udp", rate=50, duration=0.2)
+        # At 50 qps, 0.2 seconds is about 10 queries.
+        self.assertGreater(statistics.sent, 3)
+        self.assertLess(statistics.sent, 20)
+        self.assertEqual(statistics.completed, statistics.sent)
+
+    def test_timeouts(self):
+        with PerfNanoNameserver() as ns:
+            (address, port) = ns.udp_address
+        # The server is gone, so nothing answers.
+        queries = dns.perf.read_queries(io.StringIO("www.example.\n"))
+        statistics = asyncio.run(
+            dns.perf.run(
+                queries,
+                address,
+                port=port,
+                timeout=0.1,
+                backend=dns.asyncbackend.get_backend("asyncio"),
+            )
+        )
+        self.assertEqual(statistics.sent, 1)
+        self.assertEqual(statistics.completed, 0)
+        self.assertEqual(statistics.timeouts + sum(statistics.errors.values()), 1)
+        self.assertIn("Queries sent:         1", statistics.to_text())
+
+    def test_transport_timeouts(self):
+        async def query(q, where, **kwargs):
+            raise TimeoutError
+
+        queries = dns.perf.read_queries(io.StringIO("www.example.\n"))
+        with unittest.mock.patch.object(dns.asyncquery, "udp", query):
+            statistics = asyncio.run(
+                dns.perf.run(
+                    queries,
+                    "127.0.0.1",
+                    runs=2,
+                    backend=dns.asyncbackend.get_backend("asyncio"),
+                )
+            )
+        self.assertEqual(statistics.sent, 2)
+        self.assertEqual(statistics.timeouts, 2)
+        self.assertEqual(statistics.errors, {})
+
+    def test_https_backend(self):
+        queries = dns.perf.read_queries(io.StringIO("www.example.\n"))
+        with self.assertRaises(ValueError):
+            asyncio.run(
+                dns.perf.run(
+                    queries,
+                    "https://127.0.0.1/dns-query",
+                    protocol="https",
+                    backend=dns.asyncbackend.Backend(),
+                )
+            )
+
+    def test_run_workers(self):
+        backend = dns.asyncbackend.get_backend("asyncio")
+        finished = []
+
+        async def worker():
+            await backend.sleep(0.01)
+            finished.append(True)
+
+        async def failing_worker():
+            # The first worker would run for a minute, but is cancelled when
+            # the second one fails.
+            finished.append(False)
+            if len(finished) == 1:
+                await backend.sleep(60)
+            raise ValueError
+
+        asyncio.run(dns.perf._run_workers(backend, worker, 3))
+        self.assertEqual(finished, [True, True, True])
+        finished.clear()
+        start = time.monotonic()
+        with self.assertRaises(ValueError):
+            asyncio.run(dns.perf._run_workers(backend, failing_worker, 2))
+        self.assertLess(time.monotonic() - start, 10)
+
+    def test_main(self):
+        with PerfNanoNameserver() as ns:
+            (address, port) = ns.udp_address
+            output = io.StringIO()
+            saved_stdin = sys.stdin
+            sys.stdin = io.StringIO(QUERIES)
+            try:
+                with contextlib.redirect_stdout(output):
+                    status = dns.perf.main(["-s", address, "-p", str(port), "-n", "2"])
+            finally:
+                sys.stdin = saved_stdin
+        self.assertEqual(status, 0)
+        text = output.getvalue()
+        self.assertIn("Queries sent:         6", text)
+        self.assertIn("Queries completed:    6 (100.00%)", text)
+        self.assertIn("NOERROR 4, NXDOMAIN 2", text)
+        self.assertIn("Latency percentiles", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -15,9 +15,11 @@
 # ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT
 # OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
+import asyncio
 import contextlib
 import socket
 import sys
+import threading
 import time
 import unittest
 
@@ -28,11 +30,14 @@ try:
 except Exception:
     have_ssl = False
 
+import dns.asyncbackend
+import dns.asyncquery
 import dns.exception
 import dns.flags
 import dns.inet
 import dns.message
 import dns.name
+import dns.nameserver
 import dns.query
 import dns.rcode
 import dns.rdataclass
@@ -624,6 +629,97 @@ class TsigTests(unittest.TestCase):
             seen = set([rdata.address for rdata in rrs])
             self.assertTrue("1.2.3.4" in seen)
 
+    def test_tsig_template(self):
+        with TSIGNanoNameserver(keyring=keyring) as ns:
+            qname = dns.name.from_text("example.com")
+            q = dns.message.make_query(qname, "A")
+            q.use_tsig(keyring=keyring, keyname="name")
+            template = dns.message.QueryTemplate(q)
+            for _ in range(2):
+                response = dns.query.udp(
+                    template, ns.udp_address[0], port=ns.udp_address[1]
+                )
+                self.assertTrue(response.had_tsig)
+                self.assertEqual(response.rcode(), dns.rcode.NOERROR)
+            response = dns.query.tcp(
+                template, ns.tcp_address[0], port=ns.tcp_address[1]
+            )
+            self.assertTrue(response.had_tsig)
+            self.assertEqual(response.rcode(), dns.rcode.NOERROR)
+
+
+class Tracer:
+    def __init__(self):
+        self.phases = []
+        self.times = []
+
+    def __call__(self, phase, when):
+        self.phases.append(phase)
+        self.times.append(when)
+
+
+@unittest.skipIf(not _nanonameserver_available, "nanonameserver required")
+class TraceTests(unittest.TestCase):
+    def test_udp(self):
+        with Server() as ns:
+            q = dns.message.make_query("example.com", "A")
+            tracer = Tracer()
+            dns.query.udp(q, ns.udp_address[0], port=ns.udp_address[1], trace=tracer)
+            P = dns.query.TracePhase
+            self.assertEqual(
+                tracer.phases, [P.START, P.SOCKET, P.SENT, P.RECEIVED, P.PARSED]
+            )
+            self.assertEqual(tracer.times, sorted(tracer.times))
+
+    def test_tcp(self):
+        with Server() as ns:
+            q = dns.message.make_query("example.com", "A")
+            tracer = Tracer()
+            dns.query.tcp(q, ns.tcp_address[0], port=ns.tcp_address[1], trace=tracer)
+            P = dns.query.TracePhase
+            self.assertEqual(
+                tracer.phases,
+                [
+                    P.START,
+                    P.SOCKET,
+                    P.CONNECTED,
+                    P.SENT,
+                    P.FIRST_BYTE,
+                    P.RECEIVED,
+                    P.PARSED,
+                ],
+            )
+            self.assertEqual(tracer.times, sorted(tracer.times))
+
+    def test_async_udp(self):
+        with Server() as ns:
+            q = dns.message.make_query("example.com", "A")
+            tracer = Tracer()
+
+            async def run():
+                await dns.asyncquery.udp(
+                    q,
+                    ns.udp_address[0],
+                    port=ns.udp_address[1],
+                    backend=dns.asyncbackend.get_backend("asyncio"),
+                    trace=tracer,
+                )
+
+            asyncio.run(run())
+            P = dns.query.TracePhase
+            self.assertEqual(
+                tracer.phases, [P.START, P.SOCKET, P.SENT, P.RECEIVED, P.PARSED]
+            )
+
+    def test_nameserver(self):
+        with Server() as ns:
+            q = dns.message.make_query("example.com", "A")
+            tracer = Tracer()
+            nameserver = dns.nameserver.Do53Nameserver(*ns.tcp_address)
+            nameserver.query(q, 2.0, None, 0, True, trace=tracer)
+            self.assertEqual(tracer.phases[0], dns.query.TracePhase.START)
+            self.assertEqual(tracer.phases[-1], dns.query.TracePhase.PARSED)
+
 
 @unittest.skipIf(sys.platform == "win32", "low level tests do not work on win32")
 class LowLevelWaitTests(unittest.TestCase):
@@ -642,6 +738,27 @@ class LowLevelWaitTests(unittest.TestCase):
             l.close()
             r.close()
 
+    def test_net_read(self):
+        (l, r) = socket.socketpair()
+        with l, r:
+            l.setblocking(False)
+            r.sendall(b"abcdef")
+            # Everything at once is returned as it was received.
+            data = dns.query._net_read(l, 6, time.time() + 2)
+            self.assertEqual(data, b"abcdef")
+            self.assertIsInstance(data, bytes)
+            r.sendall(b"abc")
+            timer = threading.Timer(0.05, r.sendall, (b"def",))
+            timer.start()
+            data = dns.query._net_read(l, 6, time.time() + 2)
+            timer.join()
+            self.assertEqual(data, b"abcdef")
+            self.assertIsInstance(data, bytes)
+            self.assertEqual(dns.query._net_read(l, 0, None), b"")
+            r.close()
+            with self.assertRaises(EOFError):
+                dns.query._net_read(l, 1, time.time() + 2)
+
 
 class MiscTests(unittest.TestCase):
     def test_matches_destination(self):
@@ -291,6 +291,47 @@ class RdataTestCase(unittest.TestCase):
         r4 = pickle.loads(p)
         self.assertEqual(r3, r4)
 
+    def test_cached_canonical_form(self):
+        r = dns.rdata.from_text(dns.rdataclass.IN, dns.rdatatype.MX, "10 MAIL.example.")
+        h = hash(r)
+        self.assertEqual(r._canonical, (b"\x00\x0a\x04mail\x07example\x00", False))
+        self.assertEqual(r._hash, h)
+        self.assertEqual(hash(r), h)
+        self.assertEqual(r.to_digestable(), r._canonical[0])
+        self.assertEqual(r.to_digestable(dns.name.from_text("other.")), r._canonical[0])
+        # The cached values are not part of the rdata's state.
+        self.assertNotIn("_canonical", r.__getstate__())
+        self.assertNotIn("_hash", r.__getstate__())
+        r2 = pickle.loads(pickle.dumps(r))
+        self.assertEqual(r2, r)
+        self.assertEqual(hash(r2), h)
+        with self.assertRaises(TypeError):
+            r._hash = 0  # type: ignore
+
+    def test_cached_canonical_form_relative(self):
+        r = dns.rdata.from_text(
+            dns.rdataclass.IN, dns.rdatatype.MX, "10 mail", relativize_to=None
+        )
+        with self.assertRaises(dns.name.NeedAbsoluteNameOrOrigin):
+            r.to_digestable()
+        self.assertEqual(r.to_digestable(dns.name.root), b"\x00\x0a\x04mail\x00")
+        origin = dns.name.from_text("Example.")
+        expected = b"\x00\x0a\x04mail\x07example\x00"
+        self.assertEqual(r.to_digestable(origin), expected)
+        self.assertEqual(r._digestable, (origin, expected))
+        self.assertEqual(r.to_digestable(dns.name.from_text("example.")), expected)
+        self.assertEqual(
+            r.to_digestable(dns.name.from_text("other.")),
+            b"\x00\x0a\x04mail\x05other\x00",
+        )
+        with self.assertRaises(dns.name.NeedAbsoluteNameOrOrigin):
+            r.to_digestable()
+        # A relative rdata is not equal to the absolute rdata with the same
+        # digestable form.
+        absolute = dns.rdata.from_text(dns.rdataclass.IN, dns.rdatatype.MX, "10 mail.")
+        self.assertEqual(hash(r), hash(absolute))
+        self.assertNotEqual(r, absolute)
+
     def test_AFSDB_properties(self):
         rd = dns.rdata.from_text(
             dns.rdataclass.IN, dns.rdatatype.AFSDB, "0 afsdb.example."
@@ -6,6 +6,7 @@ import dns.exception
 import dns.flags
 import dns.message
 import dns.renderer
+import dns.rrset
 import dns.tsig
 import dns.tsigkeyring
 
@@ -114,3 +115,76 @@ class RendererTestCase(unittest.TestCase):
             r.reserve(-1)
         with self.assertRaises(ValueError):
             r.reserve(513)
+
+    def test_rollback_compression_table(self):
+        r = dns.renderer.Renderer(flags=dns.flags.QR, max_size=100)
+        qname = dns.name.from_text("foo.example")
+        r.add_question(qname, dns.rdatatype.A)
+        compress = dict(r.compress)
+        big = dns.rdataset.from_text("in", "txt", 30, '"' + "a" * 80 + '"')
+        with self.assertRaises(dns.exception.TooBig):
+            r.add_rdataset(dns.renderer.ANSWER, dns.name.from_text("bar.example"), big)
+        # The entries for bar.example were removed, and the question's remain.
+        self.assertEqual(r.compress, compress)
+        r.add_rdataset(
+            dns.renderer.ANSWER,
+            qname,
+            dns.rdataset.from_text("in", "a", 30, "10.0.0.1"),
+        )
+        r.write_header()
+        message = dns.message.from_wire(r.get_wire())
+        self.assertEqual(message.answer[0].name, qname)
+
+    def test_reset(self):
+        r = dns.renderer.Renderer(id=1, flags=dns.flags.QR, max_size=512)
+        qname = dns.name.from_text("foo.example")
+        r.add_question(qname, dns.rdatatype.A)
+        r.add_rdataset(
+            dns.renderer.ANSWER,
+            qname,
+            dns.rdataset.from_text("in", "a", 30, "10.0.0.1"),
+        )
+        r.write_header()
+        r.reset(id=2)
+        self.assertEqual(r.compress, {})
+        self.assertEqual(r.counts, [0, 0, 0, 0])
+        self.assertEqual(r.get_wire(), b"\x00" * 12)
+        r.add_question(dns.name.from_text("bar.example"), dns.rdatatype.AAAA)
+        r.write_header()
+        message = dns.message.from_wire(r.get_wire())
+        self.assertEqual(message.id, 2)
+        self.assertEqual(message.flags, 0)
+        self.assertEqual(message.question[0].name, dns.name.from_text("bar.example"))
+        self.assertEqual(message.question[0].rdtype, dns.rdatatype.AAAA)
+
+    def test_add_question_wire(self):
+        qname = dns.name.from_text("Foo.Example.")
+        question = qname.to_wire() + b"\x00\x10\x00\x01"
+        r = dns.renderer.Renderer(id=1, flags=dns.flags.QR)
+        r.add_question_wire(qname, question)
+        expected = dns.renderer.Renderer(id=1, flags=dns.flags.QR)
+        expected.add_question(qname, dns.rdatatype.TXT)
+        self.assertEqual(r.compress, expected.compress)
+        rrset = dns.rrset.from_text("bar.foo.example.", 30, "in", "txt", "x")
+        for renderer in (r, expected):
+            renderer.add_rrset(dns.renderer.ANSWER, rrset)
+            renderer.write_header()
+        self.assertEqual(r.get_wire(), expected.get_wire())
+
+    def test_add_rrsets(self):
+        r = dns.renderer.Renderer(flags=dns.flags.QR, max_size=150)
+        qname = dns.name.from_text("foo.example")
+        r.add_question(qname, dns.rdatatype.TXT)
+        rrsets = [
+            dns.rrset.from_text(
+                f"{i}.foo.example.", 30, "in", "txt", '"' + "a" * 30 + '"'
+            )
+            for i in range(5)
+        ]
+        self.assertEqual(r.add_rrsets(dns.renderer.ANSWER, rrsets), 2)
+        self.assertEqual(r.counts[dns.renderer.ANSWER], 2)
+        r.write_header()
+        wire = r.get_wire()
+        self.assertLessEqual(len(wire), 150)
+        message = dns.message.from_wire(wire)
+        self.assertEqual(message.answer, rrsets[:2])
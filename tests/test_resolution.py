@@ -1,10 +1,16 @@
 # Copyright (C) Dnspython Contributors, see LICENSE for text of ISC license
 
+import asyncio
 import unittest
 
+import dns.asyncbackend
+import dns.edns
+import dns.exception
 import dns.flags
 import dns.message
 import dns.name
+import dns.nameserver
+import dns.query
 import dns.rcode
 import dns.rdataclass
 import dns.rdatatype
@@ -510,6 +516,392 @@ class ResolutionTestCase(unittest.TestCase):
         self.assertFalse(done)
         self.assertTrue(nameserver not in self.resn.nameservers)
 
+    def test_capabilities_tcp_only(self):
+        self.resolver.capabilities = dns.nameserver.CapabilityCache(truncation_limit=2)
+        (_, _) = self.resn.next_request()
+        (nameserver, tcp, _) = self.resn.next_nameserver()
+        self.assertFalse(tcp)
+        (answer, done) = self.resn.query_result(None, dns.message.Truncated())
+        self.assertTrue(self.resn.retry_with_tcp)
+        (_, tcp, _) = self.resn.next_nameserver()
+        self.assertTrue(tcp)
+        self.resolver.capabilities.note_truncation(("10.0.0.1", 53))
+        self.resn.current_nameservers = self.resn.nameservers[:]
+        (nameserver, tcp, _) = self.resn.next_nameserver()
+        self.assertEqual(nameserver.answer_nameserver(), "10.0.0.1")
+        self.assertTrue(tcp)
+        (nameserver, tcp, _) = self.resn.next_nameserver()
+        self.assertEqual(nameserver.answer_nameserver(), "10.0.0.2")
+        self.assertFalse(tcp)
+
+    def test_capabilities_udp_response_resets_truncations(self):
+        cache = dns.nameserver.CapabilityCache(truncation_limit=2)
+        key = ("10.0.0.1", 53)
+        cache.note_truncation(key)
+        cache.note_udp_response(key, False)
+        cache.note_truncation(key)
+        self.assertFalse(cache.get(key).tcp_only)
+        cache.note_truncation(key)
+        self.assertTrue(cache.get(key).tcp_only)
+
+    def test_capabilities_no_edns(self):
+        self.resolver.capabilities = dns.nameserver.CapabilityCache()
+        self.resolver.use_edns(0, 0, 1232)
+        (request, _) = self.resn.next_request()
+        (nameserver, _, _) = self.resn.next_nameserver()
+        self.assertIs(self.resn.nameserver_request, request)
+        r = dns.message.make_response(request)
+        r.use_edns(False)
+        r.set_rcode(dns.rcode.FORMERR)
+        (answer, done) = self.resn.query_result(r, None)
+        self.assertTrue(answer is None)
+        self.assertFalse(done)
+        self.assertTrue(nameserver in self.resn.nameservers)
+        (retry_nameserver, tcp, backoff) = self.resn.next_nameserver()
+        self.assertIs(retry_nameserver, nameserver)
+        self.assertFalse(tcp)
+        self.assertEqual(backoff, 0.0)
+        self.assertEqual(self.resn.nameserver_request.edns, -1)
+        self.assertEqual(self.resn.nameserver_request.question, request.question)
+        # The other nameserver still gets EDNS.
+        (_, _, _) = self.resn.next_nameserver()
+        self.assertIs(self.resn.nameserver_request, request)
+        # A SERVFAIL may be transient, so it doesn't mean EDNS isn't supported.
+        r = dns.message.make_response(request)
+        r.use_edns(False)
+        r.set_rcode(dns.rcode.SERVFAIL)
+        (answer, done) = self.resn.query_result(r, None)
+        self.assertIsNone(self.resolver.capabilities.get(self.resn._capability_key()))
+        # A FORMERR without EDNS in the request is just a bad response.
+        r = dns.message.make_response(self.resn.nameserver_request)
+        r.set_rcode(dns.rcode.FORMERR)
+        self.resn.nameserver = nameserver
+        self.resn.nameserver_request = self.resn._request_for_nameserver(False)
+        (answer, done) = self.resn.query_result(r, None)
+        self.assertTrue(nameserver not in self.resn.nameservers)
+
+    def test_capabilities_edns_response(self):
+        self.resolver.capabilities = dns.nameserver.CapabilityCache()
+        self.resolver.use_edns(0, 0, 1232)
+        (request, _) = self.resn.next_request()
+        (_, _, _) = self.resn.next_nameserver()
+        r = self.make_address_response(request)
+        (answer, done) = self.resn.query_result(r, None)
+        self.assertTrue(answer is not None)
+        self.assertTrue(self.resolver.capabilities.get(("10.0.0.1", 53)).edns)
+
+    def test_capabilities_timeout_reduces_payload(self):
+        self.resolver.capabilities = dns.nameserver.CapabilityCache()
+        self.resolver.use_edns(0, 0, 4096)
+        (request, _) = self.resn.next_request()
+        (nameserver, _, _) = self.resn.next_nameserver()
+        (answer, done) = self.resn.query_result(None, dns.exception.Timeout())
+        self.assertFalse(done)
+        caps = self.resolver.capabilities.get(("10.0.0.1", 53))
+        self.assertEqual(caps.payload, dns.message.DEFAULT_EDNS_PAYLOAD)
+        (_, _, _) = self.resn.next_nameserver()
+        self.assertIs(self.resn.nameserver_request, request)
+        (retry_nameserver, _, _) = self.resn.next_nameserver()
+        self.assertIs(retry_nameserver, nameserver)
+        self.assertEqual(
+            self.resn.nameserver_request.payload, dns.message.DEFAULT_EDNS_PAYLOAD
+        )
+
+    def test_capabilities_expire(self):
+        cache = dns.nameserver.CapabilityCache(ttl=0)
+        key = ("10.0.0.1", 53)
+        cache.note_no_edns(key)
+        self.assertIsNone(cache.get(key))
+        cache = dns.nameserver.CapabilityCache()
+        cache.note_no_edns(key)
+        self.assertFalse(cache.get(key).edns)
+        cache.flush(key)
+        self.assertIsNone(cache.get(key))
+
+    def test_capabilities_expire_in_use(self):
+        # Responses from a downgraded server don't keep the downgrade alive.
+        cache = dns.nameserver.CapabilityCache(ttl=60)
+        key = ("10.0.0.1", 53)
+        for note in (
+            lambda: cache.note_no_edns(key),
+            lambda: cache.note_timeout(key, 4096),
+            lambda: cache.note_truncation(key),
+        ):
+            note()
+            expiration = cache.get(key).expiration
+            for _ in range(3):
+                cache.note_udp_response(key, False)
+                note()
+            self.assertEqual(cache.get(key).expiration, expiration)
+            cache.get(key).expiration = 0.0
+            self.assertIsNone(cache.get(key))
+
+    def test_cookie_jar(self):
+        jar = dns.nameserver.CookieJar(b"secret", ttl=60)
+        key = ("10.0.0.1", 53)
+        client = jar.client_cookie(key)
+        self.assertEqual(len(client), 8)
+        self.assertEqual(client, dns.nameserver.CookieJar(b"secret").client_cookie(key))
+        self.assertNotEqual(client, jar.client_cookie(("10.0.0.2", 53)))
+        self.assertNotEqual(client, jar.client_cookie(("10.0.0.1", 5353)))
+        self.assertNotEqual(client, dns.nameserver.CookieJar().client_cookie(key))
+        q = dns.message.make_query(self.qname, dns.rdatatype.A)
+        self.assertIsNone(jar.attach(key, q))
+        q.use_edns(0, 0, 1232, options=[dns.edns.NSIDOption(b"")])
+        wire = q.to_wire()
+        c = jar.attach(key, q)
+        # The query itself is not changed.
+        self.assertEqual(len(q.options), 1)
+        self.assertEqual(q.to_wire(), wire)
+        self.assertEqual(c.id, q.id)
+        self.assertEqual(c.question, q.question)
+        self.assertEqual(c.payload, 1232)
+        self.assertEqual(c.options[0].otype, dns.edns.OptionType.NSID)
+        self.assertEqual(c.options[1].client, client)
+        self.assertEqual(c.options[1].server, b"")
+        server = b"\x01" * 16
+        r = dns.message.make_response(c)
+        r.use_edns(0, 0, 1232, options=[dns.edns.CookieOption(client, server)])
+        self.assertTrue(jar.note_response(key, r))
+        self.assertEqual(jar.server_cookie(key), server)
+        # Attaching again replaces the cookie.
+        c = jar.attach(key, c)
+        self.assertEqual(len(c.options), 2)
+        self.assertEqual(c.options[1].server, server)
+        # Templates get a template with the cookie spliced in.
+        template = dns.message.QueryTemplate(q)
+        t = jar.attach(key, template)
+        self.assertIsInstance(t, dns.message.QueryTemplate)
+        self.assertEqual(template.query.options, q.options)
+        (m, wire) = t.instantiate()
+        self.assertEqual(dns.message.from_wire(wire).options, c.options)
+        self.assertEqual(m.options, c.options)
+        r.use_edns(0, 0, 1232, options=[dns.edns.CookieOption(b"\x00" * 8, server)])
+        self.assertFalse(jar.note_response(key, r))
+        jar.flush(key)
+        self.assertEqual(jar.server_cookie(key), b"")
+
+    def test_cookie_jar_expires(self):
+        jar = dns.nameserver.CookieJar(ttl=0)
+        key = ("10.0.0.1", 53)
+        r = dns.message.make_query(self.qname, dns.rdatatype.A)
+        r.use_edns(
+            0,
+            options=[dns.edns.CookieOption(jar.client_cookie(key), b"\x01" * 8)],
+        )
+        self.assertTrue(jar.note_response(key, r))
+        self.assertEqual(jar.server_cookie(key), b"")
+
+    def make_cookie_response(self, request, server, rcode=dns.rcode.NOERROR):
+        r = self.make_address_response(request)
+        client = request.options[0].client
+        r.use_edns(0, 0, 1232, options=[dns.edns.CookieOption(client, server)])
+        r.set_rcode(rcode)
+        return r
+
+    def test_cookies_badcookie_retry(self):
+        self.resolver.cookies = dns.nameserver.CookieJar()
+        self.resolver.use_edns(0, 0, 1232)
+        (request, _) = self.resn.next_request()
+        (nameserver, _, _) = self.resn.next_nameserver()
+        first = self.resn.nameserver_request
+        self.assertIsNot(first, request)
+        self.assertEqual(first.question, request.question)
+        self.assertEqual(len(first.options), 1)
+        self.assertEqual(first.options[0].server, b"")
+        server = b"\x02" * 8
+        r = self.make_cookie_response(first, server, dns.rcode.BADCOOKIE)
+        (answer, done) = self.resn.query_result(r, None)
+        self.assertTrue(answer is None)
+        self.assertFalse(done)
+        (retry_nameserver, _, backoff) = self.resn.next_nameserver()
+        self.assertIs(retry_nameserver, nameserver)
+        self.assertEqual(backoff, 0.0)
+        second = self.resn.nameserver_request
+        self.assertEqual(second.options[0].server, server)
+        # A second BADCOOKIE is not retried.
+        r = self.make_cookie_response(second, server, dns.rcode.BADCOOKIE)
+        (answer, done) = self.resn.query_result(r, None)
+        self.assertTrue(nameserver not in self.resn.nameservers)
+        # The other nameserver gets its own client cookie.
+        (_, _, _) = self.resn.next_nameserver()
+        third = self.resn.nameserver_request
+        self.assertNotEqual(third.options[0].client, first.options[0].client)
+        r = self.make_cookie_response(third, server)
+        (answer, done) = self.resn.query_result(r, None)
+        self.assertTrue(answer is not None)
+        self.assertTrue(done)
+
+    def test_cookies_with_templates(self):
+        self.resolver.cookies = dns.nameserver.CookieJar()
+        self.resolver.query_templates = True
+        self.resolver.use_edns(0, 0, 1232)
+        (request, _) = self.resn.next_request()
+        (_, _, _) = self.resn.next_nameserver()
+        template = self.resn.base_request
+        sent = self.resn.nameserver_request
+        self.assertIsInstance(sent, dns.message.QueryTemplate)
+        self.assertIsNot(sent, template)
+        self.assertEqual(template.query.options, ())
+        (query, wire) = sent.instantiate()
+        self.assertEqual(dns.message.from_wire(wire).options, query.options)
+        self.assertEqual(query.options[0].otype, dns.edns.OptionType.COOKIE)
+
+    def test_cookies_wrong_client_cookie(self):
+        self.resolver.cookies = dns.nameserver.CookieJar()
+        self.resolver.use_edns(0, 0, 1232)
+        (_, _) = self.resn.next_request()
+        (nameserver, _, _) = self.resn.next_nameserver()
+        r = self.make_address_response(self.resn.nameserver_request)
+        r.use_edns(0, 0, 1232, options=[dns.edns.CookieOption(b"\x00" * 8, b"")])
+        (answer, done) = self.resn.query_result(r, None)
+        self.assertTrue(answer is None)
+        self.assertFalse(done)
+        self.assertTrue(nameserver in self.resn.nameservers)
+        self.assertIsInstance(self.resn.errors[-1][3], dns.query.BadResponse)
+
+    def test_cookies_need_edns(self):
+        self.resolver.cookies = dns.nameserver.CookieJar()
+        (request, _) = self.resn.next_request()
+        (_, _, _) = self.resn.next_nameserver()
+        self.assertIs(self.resn.nameserver_request, request)
+
+    def test_retry_policy_backoff(self):
+        policy = dns.resolver.RetryPolicy(
+            initial_backoff=0.001, max_backoff=0.01, multiplier=3
+        )
+        self.assertEqual(policy.backoff(0), 0.0)
+        self.assertAlmostEqual(policy.backoff(1), 0.001)
+        self.assertAlmostEqual(policy.backoff(2), 0.003)
+        self.assertAlmostEqual(policy.backoff(3), 0.009)
+        self.assertAlmostEqual(policy.backoff(4), 0.01)
+        policy = dns.resolver.RetryPolicy(initial_backoff=1.0, jitter=0.5)
+        for _ in range(20):
+            backoff = policy.backoff(1)
+            self.assertGreaterEqual(backoff, 0.5)
+            self.assertLessEqual(backoff, 1.5)
+        with self.assertRaises(ValueError):
+            dns.resolver.RetryPolicy(multiplier=0.5)
+        with self.assertRaises(ValueError):
+            dns.resolver.RetryPolicy(jitter=2)
+        with self.assertRaises(ValueError):
+            dns.resolver.RetryPolicy(max_attempts=0)
+
+    def test_retry_policy_presets(self):
+        lan = dns.resolver.RetryPolicy.lan()
+        wan = dns.resolver.RetryPolicy.wan()
+        self.assertLess(lan.max_backoff, wan.initial_backoff)
+        self.assertTrue(lan.retry_rcode(dns.rcode.SERVFAIL))
+        self.assertFalse(wan.retry_rcode(dns.rcode.SERVFAIL))
+        self.assertEqual(wan.max_attempts, 6)
+
+    def test_retry_policy_next_nameserver(self):
+        self.resolver.retry_policy = dns.resolver.RetryPolicy(
+            initial_backoff=0.5, max_backoff=1.0, max_attempts=5
+        )
+        resn = dns.resolver._Resolution(
+            self.resolver, self.qname, "A", "IN", False, True, False
+        )
+        (_, _) = resn.next_request()
+        backoffs = [resn.next_nameserver()[2] for _ in range(5)]
+        self.assertEqual(backoffs, [0.0, 0.0, 0.5, 0.0, 1.0])
+        with self.assertRaises(dns.resolver.NoNameservers):
+            resn.next_nameserver()
+
+    def test_retry_policy_rcodes(self):
+        self.resolver.retry_policy = dns.resolver.RetryPolicy(
+            retry_rcodes={dns.rcode.REFUSED}
+        )
+        resn = dns.resolver._Resolution(
+            self.resolver, self.qname, "A", "IN", False, True, False
+        )
+        q = dns.message.make_query(self.qname, dns.rdatatype.A)
+        r = self.make_address_response(q)
+        r.set_rcode(dns.rcode.REFUSED)
+        (_, _) = resn.next_request()
+        (nameserver, _, _) = resn.next_nameserver()
+        (answer, done) = resn.query_result(r, None)
+        self.assertIsNone(answer)
+        self.assertFalse(done)
+        self.assertIn(nameserver, resn.nameservers)
+        r.set_rcode(dns.rcode.SERVFAIL)
+        (nameserver, _, _) = resn.next_nameserver()
+        (answer, done) = resn.query_result(r, None)
+        self.assertNotIn(nameserver, resn.nameservers)
+
+    def test_rate_limiter_in_flight(self):
+        limiter = dns.nameserver.RateLimiter(max_in_flight=2)
+        key = ("10.0.0.1", 53)
+        self.assertEqual(limiter.acquire(key), 0.0)
+        self.assertEqual(limiter.acquire(key), 0.0)
+        self.assertEqual(limiter.in_flight(key), 2)
+        # Other servers are not affected.
+        self.assertIsNotNone(limiter.acquire(("10.0.0.2", 53), 0))
+        self.assertIsNone(limiter.acquire(key, 0.05))
+        limiter.release(key)
+        self.assertEqual(limiter.in_flight(key), 1)
+        self.assertIsNotNone(limiter.acquire(key, 0))
+        self.assertEqual(limiter.acquired, 4)
+        self.assertEqual(limiter.delayed, 0)
+
+    def test_rate_limiter_rate(self):
+        limiter = dns.nameserver.RateLimiter(rate=20, burst=2)
+        key = ("10.0.0.1", 53)
+        self.assertEqual(limiter.acquire(key), 0.0)
+        self.assertEqual(limiter.acquire(key), 0.0)
+        # The burst is used up, so the next query has to wait for a token.
+        self.assertIsNone(limiter.acquire(key, 0))
+        waited = limiter.acquire(key)
+        self.assertGreater(waited, 0.02)
+        self.assertEqual(limiter.delayed, 1)
+        self.assertEqual(limiter.queue_time, waited)
+        self.assertEqual(limiter.max_queue_time, waited)
+
+    def test_rate_limiter_async(self):
+        limiter = dns.nameserver.RateLimiter(max_in_flight=1, poll_interval=0.01)
+        key = ("10.0.0.1", 53)
+        backend = dns.asyncbackend.get_backend("asyncio")
+
+        async def run():
+            self.assertEqual(await limiter.async_acquire(key, backend), 0.0)
+            self.assertIsNone(await limiter.async_acquire(key, backend, 0.03))
+            limiter.release(key)
+            self.assertIsNotNone(await limiter.async_acquire(key, backend, 0.03))
+
+        asyncio.run(run())
+
+    def test_rate_limiter_bad_parameters(self):
+        with self.assertRaises(ValueError):
+            dns.nameserver.RateLimiter(rate=0)
+        with self.assertRaises(ValueError):
+            dns.nameserver.RateLimiter(rate=1, burst=0)
+        with self.assertRaises(ValueError):
+            dns.nameserver.RateLimiter(max_in_flight=0)
+
+    def test_query_templates(self):
+        self.resolver.query_templates = True
+        self.resolver.use_edns(0, 0, 1232)
+        (request, _) = self.resn.next_request()
+        (_, _, _) = self.resn.next_nameserver()
+        template = self.resn.nameserver_request
+        self.assertIsInstance(template, dns.message.QueryTemplate)
+        self.assertIs(template.query, request)
+        resn = dns.resolver._Resolution(
+            self.resolver, self.qname, "A", "IN", False, True, False
+        )
+        (_, _) = resn.next_request()
+        (_, _, _) = resn.next_nameserver()
+        self.assertIs(resn.nameserver_request, template)
+        # Changing the configuration makes a new template.
+        self.resolver.use_edns(0, 0, 4096)
+        resn = dns.resolver._Resolution(
+            self.resolver, self.qname, "A", "IN", False, True, False
+        )
+        (request, _) = resn.next_request()
+        (_, _, _) = resn.next_nameserver()
+        self.assertIsNot(resn.nameserver_request, template)
+        self.assertEqual(request.payload, 4096)
+
     def test_no_metaqueries(self):
         def bad1():
             self.resn = dns.resolver._Resolution(
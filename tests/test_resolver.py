@@ -15,6 +15,7 @@
 # ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT
 # OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
+import asyncio
 import selectors
 import socket
 import sys
@@ -25,14 +26,20 @@ from unittest.mock import patch
 
 import pytest
 
+import dns.asyncbackend
+import dns.asyncresolver
 import dns.e164
+import dns.edns
 import dns.message
 import dns.name
+import dns.nameserver
 import dns.quic
 import dns.rdataclass
+import dns.rcode
 import dns.rdatatype
 import dns.resolver
 import dns.reversename
+import dns.rrset
 import dns.tsig
 import dns.tsigkeyring
 import tests.util
@@ -1216,6 +1223,188 @@ def testResolverNoNameservers():
                 assert error[3] == "FORMERR"
 
 
+@pytest.mark.skipif(not _nanonameserver_available, reason="NanoAuth required")
+def testResolverRateLimiter():
+    with AlwaysNoErrorNoDataNanoNameserver() as na:
+        res = dns.resolver.Resolver(configure=False)
+        res.port = na.udp_address[1]
+        res.nameservers = [na.udp_address[0]]
+        res.rate_limiter = dns.nameserver.RateLimiter(rate=20, burst=1)
+        for _ in range(3):
+            res.resolve("www.example.", raise_on_no_answer=False)
+        key = (na.udp_address[0], na.udp_address[1])
+        assert res.rate_limiter.acquired == 3
+        assert res.rate_limiter.delayed == 2
+        assert res.rate_limiter.queue_time > 0.05
+        assert res.rate_limiter.in_flight(key) == 0
+
+
+@pytest.mark.skipif(not _nanonameserver_available, reason="NanoAuth required")
+def testResolverRateLimiterLifetimeTimeout():
+    with AlwaysNoErrorNoDataNanoNameserver() as na:
+        res = dns.resolver.Resolver(configure=False)
+        res.port = na.udp_address[1]
+        res.nameservers = [na.udp_address[0]]
+        res.rate_limiter = dns.nameserver.RateLimiter(max_in_flight=1)
+        key = (na.udp_address[0], na.udp_address[1])
+        res.rate_limiter.acquire(key)
+        with pytest.raises(dns.resolver.LifetimeTimeout):
+            res.resolve("www.example.", lifetime=0.1)
+
+
+class FlakyNanoNameserver(Server):
+    """Answer SERVFAIL to the first *failures* queries, and then NOERROR."""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+        self.queries = 0
+
+    def handle(self, request):
+        self.queries += 1
+        response = dns.message.make_response(request.message)
+        if self.queries <= self.failures:
+            response.set_rcode(dns.rcode.SERVFAIL)
+        else:
+            rrs = dns.rrset.from_text(request.qname, 300, "IN", "A", "10.0.0.1")
+            response.answer.append(rrs)
+        return response
+
+
+@pytest.mark.skipif(not _nanonameserver_available, reason="NanoAuth required")
+def testResolverRetryPolicyLAN():
+    with FlakyNanoNameserver(3) as na:
+        res = dns.resolver.Resolver(configure=False)
+        res.port = na.udp_address[1]
+        res.nameservers = [na.udp_address[0]]
+        res.retry_policy = dns.resolver.RetryPolicy.lan()
+        start = time.time()
+        answer = res.resolve("www.example.")
+        assert answer[0].address == "10.0.0.1"
+        assert na.queries == 4
+        # The LAN backoffs are 5, 10, and 20 milliseconds, plus jitter.
+        assert time.time() - start < 0.5
+
+
+@pytest.mark.skipif(not _nanonameserver_available, reason="NanoAuth required")
+def testResolverRetryPolicyWAN():
+    with FlakyNanoNameserver(1) as na:
+        res = dns.resolver.Resolver(configure=False)
+        res.port = na.udp_address[1]
+        res.nameservers = [na.udp_address[0]]
+        res.retry_policy = dns.resolver.RetryPolicy.wan()
+        # SERVFAIL is not retried by the WAN policy.
+        with pytest.raises(dns.resolver.NoNameservers):
+            res.resolve("www.example.")
+        assert na.queries == 1
+        res.retry_servfail = True
+        answer = res.resolve("www.example.")
+        assert answer[0].address == "10.0.0.1"
+
+
+@pytest.mark.skipif(not _nanonameserver_available, reason="NanoAuth required")
+def testAsyncResolverRetryPolicy():
+    with FlakyNanoNameserver(2) as na:
+        res = dns.asyncresolver.Resolver(configure=False)
+        res.port = na.udp_address[1]
+        res.nameservers = [na.udp_address[0]]
+        res.retry_policy = dns.resolver.RetryPolicy(
+            initial_backoff=0.01, retry_rcodes={dns.rcode.SERVFAIL}, max_attempts=2
+        )
+
+        async def run():
+            return await res.resolve(
+                "www.example.", backend=dns.asyncbackend.get_backend("asyncio")
+            )
+
+        with pytest.raises(dns.resolver.NoNameservers):
+            asyncio.run(run())
+        assert na.queries == 2
+        answer = asyncio.run(run())
+        assert answer[0].address == "10.0.0.1"
+
+
+class CookieNanoNameserver(Server):
+    """Answer BADCOOKIE to queries without the right server cookie."""
+
+    def __init__(self):
+        super().__init__()
+        self.queries = 0
+        self.cookies = []
+        self.server_cookie = b"\x05" * 16
+
+    def handle(self, request):
+        self.queries += 1
+        response = dns.message.make_response(request.message)
+        cookies = request.message.get_options(dns.edns.OptionType.COOKIE)
+        if not cookies:
+            response.set_rcode(dns.rcode.REFUSED)
+            return response
+        cookie = cookies[0]
+        self.cookies.append(cookie)
+        response.use_edns(
+            0,
+            0,
+            1232,
+            options=[dns.edns.CookieOption(cookie.client, self.server_cookie)],
+        )
+        if cookie.server != self.server_cookie:
+            response.set_rcode(dns.rcode.BADCOOKIE)
+        else:
+            rrs = dns.rrset.from_text(request.qname, 300, "IN", "A", "10.0.0.1")
+            response.answer.append(rrs)
+        return response
+
+
+@pytest.mark.skipif(not _nanonameserver_available, reason="NanoAuth required")
+def testResolverCookies():
+    with CookieNanoNameserver() as na:
+        res = dns.resolver.Resolver(configure=False)
+        res.port = na.udp_address[1]
+        res.nameservers = [na.udp_address[0]]
+        res.use_edns(0, 0, 1232)
+        res.cookies = dns.nameserver.CookieJar()
+        answer = res.resolve("www.example.")
+        assert answer[0].address == "10.0.0.1"
+        assert na.queries == 2
+        # Later queries send the server cookie straight away.
+        answer = res.resolve("www2.example.")
+        assert answer[0].address == "10.0.0.1"
+        assert na.queries == 3
+        client = res.cookies.client_cookie(na.udp_address)
+        assert all(cookie.client == client for cookie in na.cookies)
+
+
+@pytest.mark.skipif(not _nanonameserver_available, reason="NanoAuth required")
+def testNameserverCookies():
+    with CookieNanoNameserver() as na:
+        nameserver = dns.nameserver.Do53Nameserver(
+            na.udp_address[0], na.udp_address[1], dns.nameserver.CookieJar()
+        )
+        q = dns.message.make_query("www.example.", "A", use_edns=0)
+        response = nameserver.query(q, 2.0, None, 0, False)
+        assert response.rcode() == dns.rcode.NOERROR
+        assert na.queries == 2
+
+        async def run():
+            q = dns.message.make_query("www.example.", "A", use_edns=0)
+            return await nameserver.async_query(
+                q, 2.0, None, 0, True, dns.asyncbackend.get_backend("asyncio")
+            )
+
+        response = asyncio.run(run())
+        assert response.rcode() == dns.rcode.NOERROR
+        assert na.queries == 3
+        # A resolver with a jar of its own leaves the cookies to the nameserver.
+        res = dns.resolver.Resolver(configure=False)
+        res.nameservers = [nameserver]
+        res.use_edns(0, 0, 1232)
+        res.cookies = dns.nameserver.CookieJar()
+        answer = res.resolve("www2.example.")
+        assert answer[0].address == "10.0.0.1"
+        assert na.queries == 4
+
+
 class SlowAlwaysType3NXDOMAINNanoNameserver(Server):
     def handle(self, request):
         response = dns.message.make_response(request.message)
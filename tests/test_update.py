@@ -18,9 +18,11 @@
 import unittest
 import binascii
 
+import dns.name
 import dns.update
 import dns.rdata
 import dns.rdataset
+import dns.rrset
 import dns.tsigkeyring
 
 
@@ -197,6 +199,16 @@ class UpdateTestCase(unittest.TestCase):
         u2 = dns.message.from_text(update_text, origin=origin)
         self.assertEqual(u1, u2)
 
+    def test_section_setters_update_index(self):
+        u = dns.update.UpdateMessage("example.")
+        name = dns.name.from_text("foo.example.")
+        rrset = dns.rrset.from_text(name, 300, "IN", "A", "10.0.0.1")
+        u.update = [rrset]
+        self.assertIs(u.find_rrset(u.update, name, "IN", "A"), rrset)
+        u.zone = []
+        with self.assertRaises(KeyError):
+            u.find_rrset(u.zone, dns.name.from_text("example."), "IN", "SOA")
+
     def test_good_explicit_delete_wire(self):
         name = dns.name.from_text("foo.example")
         u = dns.message.from_wire(goodwirenone)
@@ -1,5 +1,6 @@
 # Copyright (C) Dnspython Contributors, see LICENSE for text of ISC license
 
+import mmap
 import unittest
 
 import dns.exception
@@ -85,3 +86,38 @@ class BinaryTestCase(unittest.TestCase):
         with self.assertRaises(NotImplementedError):
             with p.restrict_to(5):
                 raise NotImplementedError
+
+    def test_buffers(self):
+        wire = b"\x03www\x09dnspython\x03org\x00\x00\x02\x00\x01\x02ab"
+        expected = dns.name.from_text("www.dnspython.org")
+        m = mmap.mmap(-1, len(wire))
+        m.write(wire)
+        for buffer in (
+            bytearray(wire),
+            memoryview(wire),
+            memoryview(bytearray(wire)),
+            memoryview(wire).cast("H"),
+            m,
+        ):
+            p = dns.wire.Parser(buffer)
+            self.assertEqual(p.get_name(), expected)
+            self.assertEqual(p.get_struct("!HH"), (2, 1))
+            value = p.get_counted_bytes()
+            self.assertIsInstance(value, bytes)
+            self.assertEqual(value, b"ab")
+            self.assertEqual(p.remaining(), 0)
+        m.close()
+
+    def test_furthest(self):
+        wire = bytes.fromhex("0102010203040102")
+        p = dns.wire.Parser(wire)
+        p.get_uint32()
+        p.seek(0)
+        p.get_uint16()
+        self.assertEqual(p.furthest, 4)
+        self.assertEqual(p.get_struct("!HBB"), (0x0102, 3, 4))
+        self.assertEqual(p.furthest, 6)
+        self.assertEqual(p.get_uint16(), 0x0102)
+        self.assertEqual(p.furthest, 8)
+        with self.assertRaises(dns.exception.FormError):
+            p.get_struct("!B")
@@ -0,0 +1,180 @@
+# Copyright (C) Dnspython Contributors, see LICENSE for text of ISC license
+
+# Benchmark dns.message wire format parsing and rendering on large responses.
+#
+# Run from the top of the source tree with "python util/benchmark-message.py".
+
+import base64
+import timeit
+
+import dns.message
+import dns.name
+import dns.rrset
+
+SIGNATURE = base64.b64encode(bytes(range(256))).decode()
+KEY = base64.b64encode(bytes(range(256)) * 2).decode()
+
+
+def rrsig(covered, name, labels):
+    return (
+        f"{covered} 13 {labels} 300 20300101000000 20200101000000 12345 "
+        f"{name} {SIGNATURE}"
+    )
+
+
+def referral():
+    # A TLD style referral with 13 nameservers and glue for each of them.
+    q = dns.message.make_query("www.example.com.", "A", want_dnssec=True)
+    r = dns.message.make_response(q)
+    nameservers = [f"{chr(ord('a') + i)}.gtld-servers.net." for i in range(13)]
+    r.authority.append(
+        dns.rrset.from_text_list("com.", 172800, "IN", "NS", nameservers)
+    )
+    r.authority.append(
+        dns.rrset.from_text("com.", 86400, "IN", "DS", "19718 13 2 " + "ab" * 32)
+    )
+    r.authority.append(
+        dns.rrset.from_text("com.", 86400, "IN", "RRSIG", rrsig("DS", ".", 1))
+    )
+    for i, ns in enumerate(nameservers):
+        r.additional.append(dns.rrset.from_text(ns, 172800, "IN", "A", f"192.0.2.{i}"))
+        r.additional.append(
+            dns.rrset.from_text(ns, 172800, "IN", "AAAA", f"2001:db8::{i}")
+        )
+    return r.to_wire(max_size=65535)
+
+
+def dnssec():
+    # A signed answer with the zone's keys and signed nameservers.
+    q = dns.message.make_query("example.com.", "DNSKEY", want_dnssec=True)
+    r = dns.message.make_response(q)
+    r.answer.append(
+        dns.rrset.from_text_list(
+            "example.com.",
+            3600,
+            "IN",
+            "DNSKEY",
+            [f"{flags} 3 13 {KEY}" for flags in (256, 257, 256, 257)],
+        )
+    )
+    for _ in range(2):
+        r.answer.append(
+            dns.rrset.from_text(
+                "example.com.", 3600, "IN", "RRSIG", rrsig("DNSKEY", "example.com.", 2)
+            )
+        )
+    r.authority.append(
+        dns.rrset.from_text_list(
+            "example.com.", 3600, "IN", "NS", [f"ns{i}.example.com." for i in range(4)]
+        )
+    )
+    r.authority.append(
+        dns.rrset.from_text(
+            "example.com.", 3600, "IN", "RRSIG", rrsig("NS", "example.com.", 2)
+        )
+    )
+    for i in range(4):
+        name = f"ns{i}.example.com."
+        r.additional.append(dns.rrset.from_text(name, 3600, "IN", "A", f"192.0.2.{i}"))
+        r.additional.append(
+            dns.rrset.from_text(
+                name, 3600, "IN", "RRSIG", rrsig("A", "example.com.", 3)
+            )
+        )
+    return r.to_wire(max_size=65535)
+
+
+def axfr():
+    # A zone transfer message with many names under one origin.
+    q = dns.message.make_query("example.com.", "AXFR")
+    r = dns.message.make_response(q)
+    for i in range(500):
+        name = f"host{i}.example.com."
+        r.answer.append(
+            dns.rrset.from_text(name, 3600, "IN", "A", f"10.0.{i // 256}.{i % 256}")
+        )
+        r.answer.append(
+            dns.rrset.from_text(name, 3600, "IN", "MX", f"10 mail{i % 4}.example.com.")
+        )
+        r.answer.append(
+            dns.rrset.from_text(f"www{i}.example.com.", 3600, "IN", "CNAME", name)
+        )
+    return r.to_wire(max_size=65535)
+
+
+def txt():
+    # A TXT heavy response, as for SPF and domain verification records.
+    q = dns.message.make_query("example.com.", "TXT")
+    r = dns.message.make_response(q)
+    r.answer.append(
+        dns.rrset.from_text_list(
+            "example.com.",
+            3600,
+            "IN",
+            "TXT",
+            [
+                f'"v=spf1 include:_spf{i}.example.com ~all" "{KEY[:200]}"'
+                for i in range(40)
+            ],
+        )
+    )
+    return r.to_wire(max_size=65535)
+
+
+def large():
+    # A response close to 64KB with thousands of distinct RRsets, as an ANY
+    # style response or a big additional section has.
+    q = dns.message.make_query("example.com.", "ANY")
+    r = dns.message.make_response(q)
+    for i in range(1050):
+        name = f"host{i}.example.com."
+        r.additional.append(
+            dns.rrset.from_text(name, 3600, "IN", "A", f"10.0.{i // 256}.{i % 256}")
+        )
+        r.additional.append(
+            dns.rrset.from_text(name, 3600, "IN", "AAAA", f"2001:db8::{i:x}")
+        )
+    return r.to_wire(max_size=65535)
+
+
+def run(label, statement, number):
+    seconds = min(timeit.repeat(statement, number=number, repeat=5))
+    print(f"  {label:<34} {seconds / number * 1e6:8.2f} us")
+
+
+def main():
+    for name, wire, number in (
+        ("referral", referral(), 200),
+        ("dnssec", dnssec(), 200),
+        ("txt", txt(), 200),
+        ("axfr", axfr(), 10),
+        ("large", large(), 10),
+    ):
+        print(f"{name} ({len(wire)} bytes)")
+        run("from_wire()", lambda: dns.message.from_wire(wire), number)
+        run(
+            "from_wire(lazy=True), rcode",
+            lambda: dns.message.from_wire(wire, lazy=True).rcode(),
+            number,
+        )
+        run(
+            "from_wire(lazy=True), answer",
+            lambda: dns.message.from_wire(wire, lazy=True).answer,
+            number,
+        )
+        run(
+            "records_from_wire()",
+            lambda: list(dns.message.records_from_wire(wire)),
+            number,
+        )
+        run(
+            "records_from_wire(raw_rdata=True)",
+            lambda: list(dns.message.records_from_wire(wire, raw_rdata=True)),
+            number,
+        )
+        message = dns.message.from_wire(wire)
+        run("to_wire()", lambda: message.to_wire(max_size=65535), number)
+
+
+if __name__ == "__main__":
+    main()
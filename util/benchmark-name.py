@@ -0,0 +1,97 @@
+# Copyright (C) Dnspython Contributors, see LICENSE for text of ISC license
+
+# Benchmark the dns.name.Name operations that dictionaries keyed by names depend
+# on, i.e. hashing and comparison.
+#
+# Run from the top of the source tree with "python util/benchmark-name.py".
+
+import timeit
+
+import dns.message
+import dns.name
+import dns.rdata
+import dns.rdataclass
+import dns.rdatatype
+import dns.resolver
+import dns.rrset
+import dns.zone
+
+ORIGIN = dns.name.from_text("example.com.")
+NAMES = [dns.name.from_text(f"host{i}.subdomain", ORIGIN) for i in range(1000)]
+
+
+def run(label, statement, number):
+    seconds = min(timeit.repeat(statement, number=number, repeat=5))
+    print(f"  {label:<28} {seconds / number * 1e6:8.2f} us")
+
+
+def zone_lookups():
+    zone = dns.zone.Zone(ORIGIN)
+    with zone.writer() as txn:
+        for name in NAMES:
+            txn.add(name, 300, dns.rdata.from_text("IN", "A", "10.0.0.1"))
+    # Look the names up with different objects, in a different case, as a
+    # query would.
+    names = [dns.name.from_text(name.to_text().upper()) for name in NAMES]
+
+    def lookups():
+        for name in names:
+            zone.get_node(name)
+
+    run(f"{len(names)} zone lookups", lookups, 20)
+
+
+def cache_hits():
+    cache = dns.resolver.Cache()
+    for name in NAMES:
+        q = dns.message.make_query(name, dns.rdatatype.A)
+        r = dns.message.make_response(q)
+        r.answer.append(dns.rrset.from_text(name, 300, "IN", "A", "10.0.0.1"))
+        answer = dns.resolver.Answer(name, dns.rdatatype.A, dns.rdataclass.IN, r)
+        cache.put((name, dns.rdatatype.A, dns.rdataclass.IN), answer)
+    # The resolver builds a new key for each query, but the name is often
+    # one the application already has.
+    keys = [(name, dns.rdatatype.A, dns.rdataclass.IN) for name in NAMES]
+
+    def hits():
+        for key in keys:
+            assert cache.get(key) is not None
+
+    run(f"{len(keys)} cache lookups", hits, 20)
+
+
+def comparisons():
+    names = sorted(NAMES, key=lambda name: name.labels[0])
+
+    def compare():
+        for name in names:
+            name == ORIGIN
+            name.is_subdomain(ORIGIN)
+
+    run(f"{len(names)} comparisons", compare, 20)
+
+
+def from_text():
+    texts = [name.to_text() for name in NAMES]
+
+    def convert():
+        for text in texts:
+            dns.name.from_text(text)
+
+    run(f"{len(texts)} from_text()", convert, 20)
+    dns.name.text_cache.set_max_size(len(texts))
+    try:
+        run(f"{len(texts)} cached from_text()", convert, 20)
+    finally:
+        dns.name.text_cache.set_max_size(0)
+
+
+def main():
+    zone_lookups()
+    cache_hits()
+    comparisons()
+    from_text()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# Copyright (C) Dnspython Contributors, see LICENSE for text of ISC license
+
+# Benchmark answering queries as a server does, from the query's wire format
+# to the response's, with make_response() and to_wire(), and with
+# make_response_renderer().
+#
+# Run from the top of the source tree with "python util/benchmark-response.py".
+
+import timeit
+
+import dns.message
+import dns.name
+import dns.renderer
+import dns.rrset
+
+NAMES = [dns.name.from_text(f"host{i}.example.com.") for i in range(100)]
+QUERIES = [dns.message.make_query(name, "A", use_edns=0).to_wire() for name in NAMES]
+ANSWERS = {
+    name: [dns.rrset.from_text_list(name, 300, "IN", "A", ["10.0.0.1", "10.0.0.2"])]
+    for name in NAMES
+}
+
+
+def respond_with_message(wire):
+    q = dns.message.from_wire(wire)
+    r = dns.message.make_response(q, our_payload=1232)
+    r.answer.extend(ANSWERS[q.question[0].name])
+    return r.to_wire()
+
+
+def respond_with_renderer(wire):
+    q = dns.message.from_wire(wire)
+    r = dns.message.make_response_renderer(q)
+    r.add_rrsets(dns.renderer.ANSWER, ANSWERS[q.question[0].name])
+    if q.edns >= 0:
+        r.add_edns(0, 0, 1232)
+    r.write_header()
+    return r.get_wire()
+
+
+def run(label, respond):
+    def answer_all():
+        for wire in QUERIES:
+            respond(wire)
+
+    seconds = min(timeit.repeat(answer_all, number=20, repeat=5))
+    print(f"  {label:<28} {len(QUERIES) * 20 / seconds:10.0f} qps")
+
+
+def main():
+    run("make_response()", respond_with_message)
+    run("make_response_renderer()", respond_with_renderer)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# Copyright (C) Dnspython Contributors, see LICENSE for text of ISC license
+
+# Benchmark loading a zone and the canonical form work DNSSEC does on it.
+#
+# Run from the top of the source tree with "python util/benchmark-zone.py".
+
+import timeit
+
+import dns.rdataset
+import dns.zone
+
+ORIGIN = "example.com."
+
+
+def zone_text():
+    lines = [
+        "@ 3600 IN SOA ns1 hostmaster 1 7200 900 1209600 3600",
+        "@ 3600 IN NS ns1",
+        "@ 3600 IN NS ns2",
+        "@ 3600 IN MX 10 mail",
+    ]
+    for i in range(1000):
+        lines.append(f"host{i} 3600 IN A 10.0.{i // 256}.{i % 256}")
+        lines.append(f"host{i} 3600 IN A 10.1.{i // 256}.{i % 256}")
+        lines.append(f"host{i} 3600 IN AAAA 2001:db8::{i:x}")
+        lines.append(f'host{i} 3600 IN TXT "host number {i}"')
+        lines.append(f"www{i} 3600 IN CNAME host{i}")
+    return "\n".join(lines) + "\n"
+
+
+def run(label, statement, number):
+    seconds = min(timeit.repeat(statement, number=number, repeat=5))
+    print(f"  {label:<28} {seconds / number * 1e3:8.2f} ms")
+
+
+def main():
+    text = zone_text()
+    zone = dns.zone.from_text(text, ORIGIN)
+    rdatasets = [rdataset for (_, rdataset) in zone.iterate_rdatasets()]
+
+    def merge():
+        # Adding rdatas which are already present, as happens when a zone is
+        # updated or rdatasets are unioned.
+        for rdataset in rdatasets:
+            copy = dns.rdataset.Rdataset(rdataset.rdclass, rdataset.rdtype)
+            copy.update(rdataset)
+            copy.update(rdataset)
+
+    print(f"zone with {len(rdatasets)} rdatasets")
+    run("from_text()", lambda: dns.zone.from_text(text, ORIGIN), 5)
+    run("rdataset merges", merge, 5)
+    run(
+        "compute_digest()",
+        lambda: zone.compute_digest(dns.zone.DigestHashAlgorithm.SHA384),
+        5,
+    )
+    run("sorted rdatasets", lambda: [sorted(rdataset) for rdataset in rdatasets], 5)
+
+
+if __name__ == "__main__":
+    main()